@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Access Log for the MoMo SMS REST API
+
+One JSON object per line instead of a formatted print per request:
+
+- requests are sampled (--log-sample, default 1 in 10); error responses
+  and server messages are always written
+- lines are buffered and written in batches, when the buffer fills or
+  every flush interval, so a request never waits on the terminal or a pipe
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from typing import Dict, Any
+
+DEFAULT_SAMPLE_RATE = 0.1
+
+# Lines buffered before a write, and the longest a line waits (seconds)
+BUFFER_LINES = 256
+FLUSH_INTERVAL = 1.0
+
+class AccessLog:
+    """Buffered, sampled JSON lines log"""
+
+    def __init__(self, stream=None, sample_rate: float = DEFAULT_SAMPLE_RATE, buffer_lines: int = BUFFER_LINES,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.stream = stream if stream is not None else sys.stdout
+        self.sample_rate = sample_rate
+        self.buffer_lines = buffer_lines
+        self._lock = threading.Lock()
+        # Keeps batches in order when two threads flush at once
+        self._write_lock = threading.Lock()
+        self._lines = []
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, args=(flush_interval,),
+                                         name='access-log', daemon=True)
+        self._flusher.start()
+
+    def request(self, record: Dict[str, Any]):
+        """Log a finished request (sampled unless it failed)"""
+        if record.get('status', 0) < 400 and random.random() >= self.sample_rate:
+            return
+        self._append(record)
+
+    def message(self, record: Dict[str, Any]):
+        """Log a server message (never sampled)"""
+        self._append(record)
+
+    def _append(self, record: Dict[str, Any]):
+        line = json.dumps({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), **record}, separators=(',', ':'))
+        with self._lock:
+            self._lines.append(line)
+            full = len(self._lines) >= self.buffer_lines
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write out the buffered lines"""
+        with self._write_lock:
+            with self._lock:
+                lines, self._lines = self._lines, []
+            if lines:
+                self.stream.write('\n'.join(lines) + '\n')
+                self.stream.flush()
+
+    def _flush_periodically(self, interval: float):
+        while not self._stopped.wait(interval):
+            self.flush()
+
+    def close(self):
+        """Stop the background flushes and write what is left"""
+        self._stopped.set()
+        self.flush()
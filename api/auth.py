@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Authentication for the MoMo SMS REST API
+
+- Credentials are loaded once from a JSON file of salted PBKDF2 password
+  hashes (data/credentials.json) instead of plaintext in the handler
+- A verified Basic Authorization header is remembered in a small TTL/LRU
+  cache, so only the first request of a client pays for the slow hash. A
+  rejected header is remembered too, and a client with too many failed
+  password checks is refused without hashing until its window passes
+- Bearer tokens (POST /auth/token, which takes Basic credentials only)
+  carry the user name and expiry signed with HMAC-SHA256 and keyed to the
+  user's password hash, so changing the password revokes them
+
+Add or change a user with:
+    python api/auth.py USERNAME [--credentials FILE]
+"""
+
+import argparse
+import base64
+import getpass
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+DEFAULT_CREDENTIALS_FILE = 'data/credentials.json'
+
+HASH_ALGORITHM = 'pbkdf2_sha256'
+
+# About 0.1 s per hash: cheap once per client thanks to the cache, slow for guessing
+HASH_ITERATIONS = 200_000
+
+SALT_BYTES = 16
+
+# Verified Authorization headers kept, and for how long (seconds)
+AUTH_CACHE_SIZE = 1024
+AUTH_CACHE_TTL = 300.0
+
+# Rejected Authorization headers are remembered for this long (seconds)
+FAILED_AUTH_CACHE_TTL = 60.0
+
+# Failed password checks allowed per client address in each window (seconds)
+AUTH_MAX_FAILURES = 10
+AUTH_FAILURE_WINDOW = 60.0
+
+# Lifetime of issued bearer tokens (seconds)
+TOKEN_TTL = 3600
+
+def hash_password(password: str, salt: Optional[bytes] = None, iterations: int = HASH_ITERATIONS) -> str:
+    """Salted hash of a password, as 'pbkdf2_sha256$iterations$salt$hash' (hex)"""
+    salt = salt if salt is not None else os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f"{HASH_ALGORITHM}${iterations}${salt.hex()}${digest.hex()}"
+
+def verify_password(password: str, encoded: str) -> bool:
+    """Whether a password matches a hash from hash_password()"""
+    try:
+        algorithm, iterations, salt, expected = encoded.split('$')
+        if algorithm != HASH_ALGORITHM:
+            return False
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), bytes.fromhex(salt), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+class CredentialStore:
+    """User name -> password hash, loaded from a JSON file"""
+
+    # Checked for unknown users, so they take as long to reject as wrong passwords
+    _DUMMY_HASH = hash_password('', b'\0' * SALT_BYTES)
+
+    def __init__(self, users: Optional[Dict[str, str]] = None):
+        self.users = dict(users or {})
+
+    @classmethod
+    def load(cls, credentials_file: str = DEFAULT_CREDENTIALS_FILE) -> 'CredentialStore':
+        """Read a credentials file ({"users": {name: hash}})"""
+        with open(credentials_file, 'r', encoding='utf-8') as f:
+            return cls(json.load(f)['users'])
+
+    def save(self, credentials_file: str = DEFAULT_CREDENTIALS_FILE):
+        """Write the credentials file"""
+        with open(credentials_file, 'w', encoding='utf-8') as f:
+            json.dump({'users': self.users}, f, indent=2)
+            f.write('\n')
+
+    def set_password(self, username: str, password: str):
+        """Add a user or change their password"""
+        self.users[username] = hash_password(password)
+
+    def verify(self, username: str, password: str) -> bool:
+        """Whether the user exists and the password is theirs"""
+        encoded = self.users.get(username)
+        if encoded is None:
+            verify_password(password, self._DUMMY_HASH)
+            return False
+        return verify_password(password, encoded)
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+class AuthCache:
+    """TTL/LRU cache of verified Authorization headers -> user name
+
+    Keys are SHA-256 digests of the header, so passwords are not kept in memory.
+    """
+
+    def __init__(self, max_entries: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # digest -> (user name, expiry), least recently used first
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(header: str) -> bytes:
+        return hashlib.sha256(header.encode('utf-8')).digest()
+
+    def get(self, key: bytes) -> Optional[str]:
+        """Value cached for a header digest, or None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            username, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return username
+
+    def put(self, key: bytes, username: str):
+        """Remember a verified header digest"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (username, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class FailureLimiter:
+    """Counts failed password checks per client in fixed windows
+
+    Clients are kept least recently failed first, up to max_clients.
+    """
+
+    def __init__(self, max_failures: int = AUTH_MAX_FAILURES, window: float = AUTH_FAILURE_WINDOW,
+                 max_clients: int = AUTH_CACHE_SIZE):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        # client -> (failures, window start)
+        self._clients = OrderedDict()
+
+    def retry_after(self, client) -> float:
+        """Seconds until a client may be checked again (0 if it may now)"""
+        with self._lock:
+            entry = self._clients.get(client)
+            if entry is None:
+                return 0.0
+            failures, start = entry
+            remaining = start + self.window - time.monotonic()
+            if remaining <= 0:
+                del self._clients[client]
+                return 0.0
+            return remaining if failures >= self.max_failures else 0.0
+
+    def failed(self, client):
+        """Record a failed password check"""
+        now = time.monotonic()
+        with self._lock:
+            failures, start = self._clients.get(client, (0, now))
+            if start + self.window <= now:
+                failures, start = 0, now
+            self._clients[client] = (failures + 1, start)
+            self._clients.move_to_end(client)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+
+class TooManyFailures(Exception):
+    """A client has failed too many password checks; retry_after is in seconds"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many failed attempts; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class TokenSigner:
+    """Issues and verifies HMAC-SHA256 signed bearer tokens
+
+    A token is 'user.expiry.signature' (user and signature base64url
+    encoded). The signature also covers a binding string that is not part
+    of the token (the user's password hash, for Authenticator), so a token
+    stops verifying when the binding changes.
+    """
+
+    def __init__(self, secret: Optional[bytes] = None, ttl: int = TOKEN_TTL):
+        # A random secret means tokens stop working when the server restarts
+        self.secret = secret if secret is not None else os.urandom(32)
+        self.ttl = ttl
+        # Keyed once; each signature starts from a copy
+        self._mac = hmac.new(self.secret, digestmod=hashlib.sha256)
+
+    def _signature(self, payload: str, binding: str) -> str:
+        mac = self._mac.copy()
+        mac.update(payload.encode('ascii'))
+        mac.update(b'\0' + binding.encode('utf-8'))
+        return _b64encode(mac.digest())
+
+    def issue(self, username: str, binding: str = '') -> str:
+        """A token for a user, valid for ttl seconds"""
+        payload = f"{_b64encode(username.encode('utf-8'))}.{int(time.time()) + self.ttl}"
+        return f"{payload}.{self._signature(payload, binding)}"
+
+    def verify(self, token: str, binding_of: Optional[Callable[[str], Optional[str]]] = None) -> Optional[str]:
+        """User name of a valid, unexpired token, or None
+
+        binding_of(user) returns the binding the token was issued with, or
+        None to reject the user outright.
+        """
+        if not token.isascii():
+            return None
+        payload, _, signature = token.rpartition('.')
+        encoded_user, _, expires = payload.partition('.')
+        if not payload or not expires.isdigit():
+            return None
+        try:
+            username = _b64decode(encoded_user).decode('utf-8')
+        except ValueError:
+            return None
+        binding = binding_of(username) if binding_of else ''
+        if binding is None:
+            return None
+        if not hmac.compare_digest(signature, self._signature(payload, binding)):
+            return None
+        if int(expires) < time.time():
+            return None
+        return username
+
+class Authenticator:
+    """Checks Authorization headers: Basic against the credential store
+    (through the caches and the failure limiter), Bearer against the token
+    signature"""
+
+    def __init__(self, credentials: CredentialStore, tokens: Optional[TokenSigner] = None,
+                 cache: Optional[AuthCache] = None, limiter: Optional[FailureLimiter] = None):
+        self.credentials = credentials
+        self.tokens = tokens if tokens is not None else TokenSigner()
+        self.cache = cache if cache is not None else AuthCache()
+        # Rejected header digests, cached as ''
+        self.failed_cache = AuthCache(self.cache.max_entries, FAILED_AUTH_CACHE_TTL)
+        self.limiter = limiter if limiter is not None else FailureLimiter()
+
+    def issue_token(self, username: str) -> str:
+        """A bearer token for a user, revoked when their password changes"""
+        return self.tokens.issue(username, self.credentials.users[username])
+
+    def authenticate(self, header: Optional[str], client=None, allow_bearer: bool = True) -> Optional[str]:
+        """User name the Authorization header proves, or None
+
+        Raises:
+            TooManyFailures: the header needs a password check and the
+                client has failed too many recently
+        """
+        if not header:
+            return None
+        scheme, _, value = header.partition(' ')
+        scheme = scheme.lower()
+
+        if scheme == 'bearer':
+            return self.tokens.verify(value.strip(), self.credentials.users.get) if allow_bearer else None
+        if scheme != 'basic':
+            return None
+
+        key = self.cache.key(header)
+        username = self.cache.get(key)
+        if username is not None:
+            return username
+        if self.failed_cache.get(key) is not None:
+            return None
+
+        retry_after = self.limiter.retry_after(client)
+        if retry_after:
+            raise TooManyFailures(retry_after)
+
+        try:
+            username, password = base64.b64decode(value.strip(), validate=True).decode('utf-8').split(':', 1)
+        except ValueError:
+            return None
+        if not self.credentials.verify(username, password):
+            self.failed_cache.put(key, '')
+            self.limiter.failed(client)
+            return None
+        self.cache.put(key, username)
+        return username
+
+def main():
+    """Add a user to (or change a password in) a credentials file"""
+    arg_parser = argparse.ArgumentParser(description='Set a password in the API credentials file')
+    arg_parser.add_argument('username')
+    arg_parser.add_argument('--credentials', default=DEFAULT_CREDENTIALS_FILE,
+                            help='Credentials file (created if missing)')
+    args = arg_parser.parse_args()
+
+    credentials = (CredentialStore.load(args.credentials) if os.path.exists(args.credentials)
+                   else CredentialStore())
+    password = getpass.getpass(f"Password for {args.username}: ")
+    if password != getpass.getpass("Repeat password: "):
+        print("Passwords do not match")
+        return
+    credentials.set_password(args.username, password)
+    credentials.save(args.credentials)
+    print(f"Saved {args.username} to {args.credentials}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Idle Keep-Alive Connections for the MoMo SMS REST API
+
+A persistent HTTP/1.1 connection spends most of its life waiting for the
+client's next request. ThreadPoolSMSAPIServer does not let that wait hold
+a worker thread: once a response is written and no further request has
+arrived, the connection is parked here. One thread watches every parked
+connection with a selector and hands it back to the worker pool when its
+next request arrives, or closes it when the keep-alive timeout passes.
+"""
+
+import heapq
+import itertools
+import selectors
+import socket
+import threading
+import time
+from typing import Callable
+
+class IdleConnections:
+    """Parked request handlers, watched by one selector thread
+
+    resume(handler) is called when a parked connection becomes readable (a
+    new request, or the client closing it) and expire(handler) when it has
+    been idle for the handler's timeout or the watcher is closed. Both run
+    on the watcher thread and must return quickly.
+    """
+
+    def __init__(self, resume: Callable, expire: Callable):
+        self.resume = resume
+        self.expire = expire
+        self._lock = threading.Lock()
+        # Handlers parked since the watcher last woke up; only the watcher
+        # thread touches the selector
+        self._pending = []
+        self._closed = False
+        self._selector = selectors.DefaultSelector()
+        # (deadline, sequence, handler), stale once the handler is resumed
+        self._deadlines = []
+        # handler -> sequence of its current parking
+        self._parked = {}
+        self._sequence = itertools.count()
+        # Written to wake the watcher when a connection is parked
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._watch, name='idle-connections', daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self._parked) + len(self._pending)
+
+    def add(self, handler):
+        """Park a handler whose connection is waiting for its next request"""
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._pending.append(handler)
+        if closed:
+            self.expire(handler)
+        else:
+            self._wake()
+
+    def close(self):
+        """Stop watching and expire every parked connection"""
+        with self._lock:
+            self._closed = True
+        self._wake()
+        self._thread.join()
+
+    def _wake(self):
+        try:
+            self._wake_writer.send(b'\0')
+        except OSError:
+            # Buffer full: the watcher has wake-ups queued already
+            pass
+
+    def _watch(self):
+        selector = self._selector
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                closed = self._closed
+            if closed:
+                break
+
+            now = time.monotonic()
+            for handler in pending:
+                try:
+                    selector.register(handler.connection, selectors.EVENT_READ, handler)
+                except (ValueError, OSError):
+                    # Closed while being parked
+                    self.expire(handler)
+                    continue
+                sequence = next(self._sequence)
+                self._parked[handler] = sequence
+                heapq.heappush(self._deadlines, (now + handler.timeout, sequence, handler))
+
+            timeout = max(0.0, self._deadlines[0][0] - now) if self._deadlines else None
+            for key, _ in selector.select(timeout):
+                if key.fileobj is self._wake_reader:
+                    try:
+                        while self._wake_reader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                self._release(key.data)
+                self.resume(key.data)
+
+            now = time.monotonic()
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, sequence, handler = heapq.heappop(self._deadlines)
+                if self._parked.get(handler) == sequence:
+                    self._release(handler)
+                    self.expire(handler)
+
+        for handler in list(self._parked) + self._pending:
+            if handler in self._parked:
+                self._release(handler)
+            self.expire(handler)
+        self._pending = []
+        self._deadlines = []
+        selector.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
+
+    def _release(self, handler):
+        """Stop watching a handler's connection"""
+        del self._parked[handler]
+        try:
+            self._selector.unregister(handler.connection)
+        except (KeyError, ValueError):
+            pass
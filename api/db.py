@@ -1,2 +1,277 @@
+#!/usr/bin/env python3
+"""
+SQLite Persistence for the MoMo SMS REST API
 
+SQLiteTransactionStore keeps transactions in the SQLite database created by
+etl/load_db.py (schema: database/database_setup_sqlite.sql) and exposes the
+same interface as the in-memory stores in api/store.py, so SMSDataProcessor
+can run against it unchanged. Unlike those stores, its data survives a
+restart.
 
+Requests share a small pool of connections. Every statement is a constant
+SQL string with ? parameters, so each connection compiles it once and reuses
+the prepared statement from its statement cache. The database runs in WAL
+mode, which lets readers on other connections proceed while a writer commits.
+Writes go through one dedicated connection, so PRAGMA data_version on it
+tells writes made by other processes apart from the store's own.
+"""
+
+import queue
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator, Iterable
+sys.path.append('.')
+from etl.load_db import (DEFAULT_DB_FILE, connect, create_schema, bulk_load_transactions,
+                         load_category_ids, category_id_for, transaction_row, INSERT_TRANSACTION)
+
+# Rows fetched per query when scanning the table in ID order
+SCAN_BATCH_SIZE = 1000
+
+# Columns where NULL means the transaction never had the field; like the
+# in-memory stores, the store leaves them out rather than inventing a value
+OPTIONAL_FIELDS = ('timestamp', 'status', 'balance', 'fee')
+
+SELECT_TRANSACTIONS = (
+    'SELECT t.transaction_id, t.transaction_type, t.amount, t.currency, s.full_name, r.full_name, '
+    't.timestamp, t.status, t.reference_number, t.balance, t.fee, m.raw_content '
+    'FROM Transactions t '
+    'LEFT JOIN Users s ON s.user_id = t.sender_id '
+    'LEFT JOIN Users r ON r.user_id = t.receiver_id '
+    'LEFT JOIN Raw_Messages m ON m.message_id = t.message_id '
+)
+SELECT_TRANSACTION = SELECT_TRANSACTIONS + 'WHERE t.transaction_id = ?'
+SELECT_TRANSACTIONS_AFTER = SELECT_TRANSACTIONS + 'WHERE t.transaction_id > ? ORDER BY t.transaction_id LIMIT ?'
+SELECT_MESSAGE_ID = 'SELECT message_id FROM Transactions WHERE transaction_id = ?'
+SELECT_USER = 'SELECT user_id FROM Users WHERE full_name = ? AND phone_number IS NULL'
+INSERT_USER = 'INSERT INTO Users (full_name) VALUES (?)'
+INSERT_MESSAGE = "INSERT INTO Raw_Messages (raw_content, processing_status) VALUES (?, 'processed')"
+UPDATE_MESSAGE = 'UPDATE Raw_Messages SET raw_content = ? WHERE message_id = ?'
+UPDATE_TRANSACTION = (
+    'UPDATE Transactions SET sender_id = ?, receiver_id = ?, category_id = ?, message_id = ?, '
+    'amount = ?, currency = ?, timestamp = ?, transaction_type = ?, status = ?, '
+    'reference_number = ?, balance = ?, fee = ? WHERE transaction_id = ?'
+)
+DELETE_TRANSACTION = 'DELETE FROM Transactions WHERE transaction_id = ?'
+
+class SQLiteConnectionPool:
+    """Fixed-size pool of SQLite connections shared by the request threads"""
+
+    def __init__(self, db_path: str, size: int = 4, cached_statements: int = 64):
+        self.db_path = db_path
+        self._connections = queue.LifoQueue()
+        for _ in range(size):
+            conn = connect(db_path, check_same_thread=False, cached_statements=cached_statements)
+            self._connections.put(conn)
+        self.size = size
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection, blocking until one is free"""
+        conn = self._connections.get()
+        try:
+            yield conn
+        finally:
+            self._connections.put(conn)
+
+    def close(self):
+        """Close every pooled connection"""
+        for _ in range(self.size):
+            self._connections.get().close()
+
+class SQLiteTransactionStore:
+    """Transaction store persisted in SQLite
+
+    Missing names, reference numbers and messages come back as empty
+    strings; a missing timestamp, status, balance or fee is left out, as in
+    the other stores. Fields outside the schema are not stored. Writes that
+    break a constraint (e.g. a reused reference number) raise ValueError.
+    """
+
+    # Each reader uses its own connection and sees a consistent WAL snapshot
+    CONCURRENT_READS = True
+
+    # Contents survive a restart, so the processor only loads an empty database
+    PERSISTENT = True
+
+    # Other processes may write to the same database (see changed_elsewhere)
+    SHARED = True
+
+    def __init__(self, db_path: str = DEFAULT_DB_FILE, pool_size: int = 4):
+        self.pool = SQLiteConnectionPool(db_path, pool_size)
+        self._writer = connect(db_path, check_same_thread=False)
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            create_schema(self._writer)
+            self._categories = load_category_ids(self._writer)
+            self._data_version = self._read_data_version()
+
+    def load(self, transactions: Iterable[Dict[str, Any]]):
+        """Replace the database contents with the given transactions"""
+        with self._write_lock:
+            bulk_load_transactions(self._writer, transactions)
+            self._categories = load_category_ids(self._writer)
+
+    def close(self):
+        """Close the connection pool and the writer connection"""
+        self.pool.close()
+        self._writer.close()
+
+    def is_stale(self, source_file: str) -> bool:
+        """Never: API writes live in the database, so newer ETL output does not replace it"""
+        return False
+
+    def changed_elsewhere(self) -> bool:
+        """Whether another connection (another process) has committed since the last call
+
+        data_version only moves for commits made on other connections, and
+        this store writes on the one connection it reads it from.
+        """
+        with self._write_lock:
+            data_version = self._read_data_version()
+            changed = data_version != self._data_version
+            self._data_version = data_version
+            # Categories may have been added by the other writer too
+            if changed:
+                self._categories = load_category_ids(self._writer)
+            return changed
+
+    def _read_data_version(self) -> int:
+        return self._writer.execute('PRAGMA data_version').fetchone()[0]
+
+    def __len__(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM Transactions').fetchone()[0]
+
+    def __contains__(self, transaction_id: int) -> bool:
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT 1 FROM Transactions WHERE transaction_id = ?', (transaction_id,))
+            return row.fetchone() is not None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.iter_after(0)
+
+    def ids(self) -> Iterator[int]:
+        """Iterate live transaction IDs in ID order"""
+        with self.pool.connection() as conn:
+            rows = conn.execute('SELECT transaction_id FROM Transactions ORDER BY transaction_id').fetchall()
+        return (row[0] for row in rows)
+
+    def iter_after(self, after_id: int) -> Iterator[Dict[str, Any]]:
+        """Iterate transactions with ID greater than after_id, in ID order
+
+        Rows are fetched in keyset batches, and no connection is held while
+        the caller consumes a batch.
+        """
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(SELECT_TRANSACTIONS_AFTER, (after_id, SCAN_BATCH_SIZE)).fetchall()
+            for row in rows:
+                yield self._row_to_transaction(row)
+            if len(rows) < SCAN_BATCH_SIZE:
+                return
+            after_id = rows[-1][0]
+
+    def get(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        """Get a transaction by ID"""
+        with self.pool.connection() as conn:
+            return self._fetch(conn, transaction_id)
+
+    def add(self, transaction_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert a transaction; SQLite assigns the next (never reused) ID"""
+        with self._writing() as conn:
+            message_id = self._save_message(conn, None, transaction_data.get('message'))
+            row = transaction_row(transaction_data, None, *self._resolve_keys(conn, transaction_data),
+                                  message_id)
+            transaction_id = conn.execute(INSERT_TRANSACTION, row).lastrowid
+            return self._fetch(conn, transaction_id)
+
+    def update(self, transaction_id: int, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update a transaction (its ID cannot be changed)"""
+        with self._writing() as conn:
+            tx = self._fetch(conn, transaction_id)
+            if tx is None:
+                return None
+
+            updated_tx = {**tx, **update_data, 'id': transaction_id}
+            message_id = conn.execute(SELECT_MESSAGE_ID, (transaction_id,)).fetchone()[0]
+            message_id = self._save_message(conn, message_id, updated_tx.get('message'))
+            row = transaction_row(updated_tx, None, *self._resolve_keys(conn, updated_tx), message_id)
+            conn.execute(UPDATE_TRANSACTION, row[1:] + (transaction_id,))
+            return self._fetch(conn, transaction_id)
+
+    def delete(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        """Delete a transaction (its raw message is kept)"""
+        with self._writing() as conn:
+            tx = self._fetch(conn, transaction_id)
+            if tx is not None:
+                conn.execute(DELETE_TRANSACTION, (transaction_id,))
+            return tx
+
+    @contextmanager
+    def _writing(self) -> Iterator[sqlite3.Connection]:
+        """The writer connection inside one database transaction
+
+        A constraint violation rolls the transaction back and is raised as
+        ValueError, which the API reports as a 400.
+        """
+        with self._write_lock:
+            try:
+                with self._writer:
+                    yield self._writer
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f"Transaction rejected by the database: {e}") from e
+
+    def _fetch(self, conn: sqlite3.Connection, transaction_id: int) -> Optional[Dict[str, Any]]:
+        """Read one transaction on the given connection"""
+        row = conn.execute(SELECT_TRANSACTION, (transaction_id,)).fetchone()
+        return self._row_to_transaction(row) if row is not None else None
+
+    def _resolve_keys(self, conn: sqlite3.Connection, tx: Dict[str, Any]) -> tuple:
+        """(sender_id, receiver_id, category_id) for a transaction, creating rows as needed"""
+        return (self._user_id(conn, tx.get('sender')),
+                self._user_id(conn, tx.get('receiver')),
+                category_id_for(conn, self._categories, tx.get('transaction_type')))
+
+    @staticmethod
+    def _user_id(conn: sqlite3.Connection, name: Optional[str]) -> Optional[int]:
+        """User ID for a counterparty name, inserting the user on first sight"""
+        if not name:
+            return None
+        row = conn.execute(SELECT_USER, (name,)).fetchone()
+        return row[0] if row is not None else conn.execute(INSERT_USER, (name,)).lastrowid
+
+    @staticmethod
+    def _save_message(conn: sqlite3.Connection, message_id: Optional[int], message: Optional[str]) -> Optional[int]:
+        """Store an SMS body, rewriting the transaction's existing message if it has one"""
+        if not message:
+            return None
+        if message_id is None:
+            return conn.execute(INSERT_MESSAGE, (message,)).lastrowid
+        conn.execute(UPDATE_MESSAGE, (message, message_id))
+        return message_id
+
+    @staticmethod
+    def _row_to_transaction(row: tuple) -> Dict[str, Any]:
+        """Build the transaction dict for a SELECT_TRANSACTIONS row"""
+        (tx_id, transaction_type, amount, currency, sender, receiver,
+         timestamp, status, reference_number, balance, fee, message) = row
+        tx = {
+            'id': tx_id,
+            'transaction_type': transaction_type,
+            'amount': amount,
+            'currency': currency,
+            'sender': sender or '',
+            'receiver': receiver or '',
+            'timestamp': timestamp,
+            'status': status,
+            'reference_number': reference_number or '',
+            'balance': balance,
+            'fee': fee,
+            'message': message or ''
+        }
+        for field in OPTIONAL_FIELDS:
+            if tx[field] is None:
+                del tx[field]
+        return tx
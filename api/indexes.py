@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Secondary Indexes for the MoMo SMS REST API
+
+In-memory indexes that let GET /transactions filter without scanning every
+transaction:
+- HashIndex: equality lookups (transaction type, sender, receiver)
+- SortedIndex: range scans and top-k queries (amount, timestamp), kept in
+  sorted blocks so inserts and deletes never re-sort
+
+TransactionIndexes bundles them and is kept up to date by SMSDataProcessor
+on every create, update and delete.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from itertools import accumulate, islice
+from typing import Dict, Any, Optional, Iterable, Iterator, List, Set
+from api.store import timestamp_to_micros
+
+class HashIndex:
+    """Maps a field value to the set of transaction IDs holding it"""
+
+    def __init__(self):
+        self._buckets = {}
+
+    def add(self, key: Any, transaction_id: int):
+        """Index a transaction under key"""
+        self._buckets.setdefault(key, set()).add(transaction_id)
+
+    def remove(self, key: Any, transaction_id: int):
+        """Remove a transaction from key's bucket"""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.discard(transaction_id)
+            if not bucket:
+                del self._buckets[key]
+
+    def lookup(self, key: Any) -> Set[int]:
+        """IDs of transactions indexed under key"""
+        return self._buckets.get(key, set())
+
+class SortedIndex:
+    """
+    Keeps (key, transaction ID) pairs in sorted order for range scans
+
+    Entries are held in sorted blocks of BLOCK_SIZE to 2 * BLOCK_SIZE
+    entries, with the last entry of every block kept in a separate list.
+    A lookup bisects the block maxima and then one block, so an insert or
+    removal shifts at most one block instead of the whole array (cheap at
+    millions of rows), and range scans are O(log n + k). Positions for
+    count_range come from running block offsets, rebuilt lazily after a
+    change.
+    """
+
+    BLOCK_SIZE = 1000
+
+    def __init__(self):
+        self.build([])
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[tuple]:
+        """Every (key, transaction ID) pair, in order"""
+        for block in self._blocks:
+            yield from block
+
+    def build(self, entries: Iterable[tuple]):
+        """Bulk load (key, transaction ID) pairs with a single sort"""
+        ordered = sorted(entries)
+        size = self.BLOCK_SIZE
+        self._blocks = [ordered[start:start + size] for start in range(0, len(ordered), size)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(ordered)
+        # Entries before each block, or None until count_range needs them
+        self._offsets = None
+
+    def add(self, key: Any, transaction_id: int):
+        """Insert an entry, keeping the order"""
+        entry = (key, transaction_id)
+        blocks, maxes = self._blocks, self._maxes
+        if not blocks:
+            blocks.append([entry])
+            maxes.append(entry)
+        else:
+            position = bisect_left(maxes, entry)
+            if position == len(maxes):
+                # Past the end: append to the last block
+                position -= 1
+                blocks[position].append(entry)
+                maxes[position] = entry
+            else:
+                insort(blocks[position], entry)
+
+            block = blocks[position]
+            if len(block) > 2 * self.BLOCK_SIZE:
+                half = len(block) // 2
+                blocks.insert(position + 1, block[half:])
+                del block[half:]
+                maxes[position] = block[-1]
+                maxes.insert(position + 1, blocks[position + 1][-1])
+        self._len += 1
+        self._offsets = None
+
+    def remove(self, key: Any, transaction_id: int):
+        """Remove an entry"""
+        entry = (key, transaction_id)
+        position = bisect_left(self._maxes, entry)
+        if position == len(self._maxes):
+            return
+        block = self._blocks[position]
+        offset = bisect_left(block, entry)
+        if block[offset] != entry:
+            return
+
+        del block[offset]
+        if not block:
+            del self._blocks[position]
+            del self._maxes[position]
+        elif offset == len(block):
+            self._maxes[position] = block[-1]
+        self._len -= 1
+        self._offsets = None
+
+    def _locate(self, probe: tuple, right: bool = False) -> tuple:
+        """(block, offset) of the first entry >= probe (> probe if right); the end is (last block, its length)"""
+        find = bisect_right if right else bisect_left
+        position = find(self._maxes, probe)
+        if position == len(self._maxes):
+            return self._end()
+        return position, find(self._blocks[position], probe)
+
+    def _end(self) -> tuple:
+        return (len(self._blocks) - 1, len(self._blocks[-1])) if self._blocks else (0, 0)
+
+    def _bounds(self, low: Any, high: Any, high_inclusive: bool) -> tuple:
+        """(block, offset) locations [start, stop) of the entries with low <= key <= high (or < high)"""
+        start = (0, 0) if low is None else self._locate((low,))
+        if high is None:
+            stop = self._end()
+        elif high_inclusive:
+            stop = self._locate((high, float('inf')), right=True)
+        else:
+            stop = self._locate((high,))
+        return start, max(start, stop)
+
+    def _position(self, location: tuple) -> int:
+        """Overall position of a (block, offset) location"""
+        if self._offsets is None:
+            self._offsets = [0]
+            self._offsets.extend(accumulate(len(block) for block in self._blocks))
+        block, offset = location
+        return self._offsets[block] + offset
+
+    def _ids_between(self, start: tuple, stop: tuple, reverse: bool) -> Iterator[int]:
+        """Transaction IDs of the entries between two locations, walking blocks lazily"""
+        (first_block, first_offset), (last_block, last_offset) = start, stop
+        blocks = self._blocks
+        order = range(last_block, first_block - 1, -1) if reverse else range(first_block, last_block + 1)
+        for position in order:
+            block = blocks[position]
+            low = first_offset if position == first_block else 0
+            high = last_offset if position == last_block else len(block)
+            if reverse:
+                for offset in range(high - 1, low - 1, -1):
+                    yield block[offset][1]
+            else:
+                for entry in (block if low == 0 and high == len(block) else block[low:high]):
+                    yield entry[1]
+
+    def count_range(self, low: Any = None, high: Any = None, high_inclusive: bool = True) -> int:
+        """Number of entries in the range, in O(log n) (plus O(n / BLOCK_SIZE) after a change)"""
+        start, stop = self._bounds(low, high, high_inclusive)
+        return self._position(stop) - self._position(start)
+
+    def range(self, low: Any = None, high: Any = None, high_inclusive: bool = True,
+              reverse: bool = False) -> Iterator[int]:
+        """Transaction IDs with keys in the range, in key order (descending if reverse)"""
+        if not self._blocks:
+            return iter(())
+        start, stop = self._bounds(low, high, high_inclusive)
+        return self._ids_between(start, stop, reverse)
+
+    def top(self, count: int, largest: bool = True, low: Any = None, high: Any = None,
+            high_inclusive: bool = True) -> List[int]:
+        """IDs of the count entries with the largest (or smallest) keys in the range, in O(log n + count)"""
+        return list(islice(self.range(low, high, high_inclusive, reverse=largest), max(count, 0)))
+
+class TransactionIndexes:
+    """Secondary indexes over the transactions held by SMSDataProcessor"""
+
+    HASH_FIELDS = ('transaction_type', 'sender', 'receiver')
+
+    def __init__(self):
+        self.build([])
+
+    def build(self, transactions: Iterable[Dict[str, Any]]):
+        """Rebuild every index from scratch"""
+        self.hash_indexes = {field: HashIndex() for field in self.HASH_FIELDS}
+        self.amount_index = SortedIndex()
+        self.timestamp_index = SortedIndex()
+        # Indexed sort keys per ID, for removal and for filtering candidates
+        self._amount_of = {}
+        self._timestamp_of = {}
+
+        for tx in transactions:
+            self._add_hash_entries(tx)
+            self._remember_sort_keys(tx)
+
+        self.amount_index.build((key, tx_id) for tx_id, key in self._amount_of.items())
+        self.timestamp_index.build((key, tx_id) for tx_id, key in self._timestamp_of.items())
+
+    def add(self, tx: Dict[str, Any]):
+        """Index a new transaction"""
+        self._add_hash_entries(tx)
+        self._remember_sort_keys(tx)
+
+        tx_id = tx['id']
+        if tx_id in self._amount_of:
+            self.amount_index.add(self._amount_of[tx_id], tx_id)
+        if tx_id in self._timestamp_of:
+            self.timestamp_index.add(self._timestamp_of[tx_id], tx_id)
+
+    def remove(self, tx: Dict[str, Any]):
+        """Remove a transaction from every index"""
+        tx_id = tx['id']
+        for field, index in self.hash_indexes.items():
+            value = tx.get(field)
+            if isinstance(value, str):
+                index.remove(value, tx_id)
+
+        amount = self._amount_of.pop(tx_id, None)
+        if amount is not None:
+            self.amount_index.remove(amount, tx_id)
+        timestamp = self._timestamp_of.pop(tx_id, None)
+        if timestamp is not None:
+            self.timestamp_index.remove(timestamp, tx_id)
+
+    def update(self, old_tx: Dict[str, Any], new_tx: Dict[str, Any]):
+        """Re-index a transaction after an update"""
+        self.remove(old_tx)
+        self.add(new_tx)
+
+    def query(self, filters: Dict[str, Any]) -> List[int]:
+        """
+        IDs of transactions matching every filter, in ID order
+
+        Supported filters: transaction_type, sender, receiver, counterparty
+        (sender or receiver), min_amount, max_amount (inclusive), and start
+        (inclusive) / end (exclusive) as epoch microseconds.
+
+        Equality filters are intersected smallest-first. When there are none,
+        the range filter matching the fewest entries (counted in O(log n)) is
+        scanned, and the remaining range filters are checked per candidate.
+        """
+        candidates = None
+        equality_sets = []
+        for field in self.HASH_FIELDS:
+            if filters.get(field) is not None:
+                equality_sets.append(self.hash_indexes[field].lookup(filters[field]))
+        if filters.get('counterparty') is not None:
+            counterparty = filters['counterparty']
+            equality_sets.append(self.hash_indexes['sender'].lookup(counterparty)
+                                 | self.hash_indexes['receiver'].lookup(counterparty))
+
+        if equality_sets:
+            equality_sets.sort(key=len)
+            candidates = set(equality_sets[0])
+            for ids in equality_sets[1:]:
+                candidates &= ids
+
+        ranges = []
+        if filters.get('min_amount') is not None or filters.get('max_amount') is not None:
+            ranges.append((self.amount_index, self._amount_of,
+                           filters.get('min_amount'), filters.get('max_amount'), True))
+        if filters.get('start') is not None or filters.get('end') is not None:
+            ranges.append((self.timestamp_index, self._timestamp_of,
+                           filters.get('start'), filters.get('end'), False))
+
+        if candidates is None and ranges:
+            ranges.sort(key=lambda r: r[0].count_range(r[2], r[3], r[4]))
+            index, _, low, high, high_inclusive = ranges.pop(0)
+            candidates = set(index.range(low, high, high_inclusive))
+
+        if candidates is None:
+            return []
+
+        for _, keys, low, high, high_inclusive in ranges:
+            candidates = {tx_id for tx_id in candidates
+                          if self._in_range(keys.get(tx_id), low, high, high_inclusive)}
+
+        return sorted(candidates)
+
+    def top(self, field: str, count: int, largest: bool = True, low: Any = None, high: Any = None) -> List[int]:
+        """
+        IDs of the count transactions with the largest (or smallest) amount
+        or timestamp, in that order, in O(log n + count)
+
+        low and high bound the key as in query(): amounts inclusive, and
+        timestamps (epoch microseconds) with high exclusive.
+        """
+        if field == 'amount':
+            return self.amount_index.top(count, largest, low, high, high_inclusive=True)
+        if field == 'timestamp':
+            return self.timestamp_index.top(count, largest, low, high, high_inclusive=False)
+        raise ValueError(f"No sorted index on {field}")
+
+    @staticmethod
+    def _in_range(key: Optional[Any], low: Any, high: Any, high_inclusive: bool) -> bool:
+        """Whether an indexed key falls in a range"""
+        if key is None:
+            return False
+        if low is not None and key < low:
+            return False
+        if high is not None and (key > high if high_inclusive else key >= high):
+            return False
+        return True
+
+    def _add_hash_entries(self, tx: Dict[str, Any]):
+        """Add a transaction to the hash indexes"""
+        tx_id = tx['id']
+        for field, index in self.hash_indexes.items():
+            value = tx.get(field)
+            if isinstance(value, str):
+                index.add(value, tx_id)
+
+    def _remember_sort_keys(self, tx: Dict[str, Any]):
+        """Record the amount and timestamp sort keys of a transaction"""
+        tx_id = tx['id']
+        amount = tx.get('amount')
+        if isinstance(amount, (int, float)) and not isinstance(amount, bool):
+            self._amount_of[tx_id] = float(amount)
+        timestamp = timestamp_to_micros(tx.get('timestamp'))
+        if timestamp is not None:
+            self._timestamp_of[tx_id] = timestamp
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Request Metrics for the MoMo SMS REST API
+
+Each request records, per method and endpoint (the route template, e.g.
+/transactions/{id}, so paths with IDs do not multiply the series):
+
+- a count by status
+- a latency histogram, from the request line being read to the last byte written
+- a response size histogram (bytes written to the socket, headers included)
+  and a request body size histogram
+- time spent per stage: auth, processor (SMSDataProcessor calls),
+  serialize (JSON encoding and compression) and write (socket writes)
+
+GET /metrics serves everything in the Prometheus text exposition format.
+Recording is a few integer additions under one lock per request.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Tuple, List, Optional, Sequence
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# Endpoints reported under their own path; anything else not matching a template is 'other'
+FIXED_ENDPOINTS = ('/transactions', '/transactions/top', '/stats', '/performance', '/metrics', '/auth/token')
+
+def endpoint_label(path: Optional[str]) -> str:
+    """Route template of a request path"""
+    if not path:
+        return 'other'
+    path = path.split('?', 1)[0]
+    if path in FIXED_ENDPOINTS:
+        return path
+    parts = path.split('/')
+    if len(parts) >= 3 and parts[1] == 'transactions' and parts[2]:
+        if len(parts) == 3:
+            return '/transactions/{id}'
+        if len(parts) == 4 and parts[3] == 'raw':
+            return '/transactions/{id}/raw'
+    return 'other'
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    return ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+
+class Histogram:
+    """Counts of observations per bucket, with their sum"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # One count per bucket, plus the +Inf bucket; cumulated when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> List[str]:
+        """Exposition lines for this histogram"""
+        prefix = labels + ',' if labels else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+class APIMetrics:
+    """Request counters and histograms shared by every handler"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (method, endpoint, status) -> count
+        self.requests = {}
+        # (method, endpoint) -> Histogram
+        self.latency = {}
+        self.response_size = {}
+        self.request_size = {}
+        # (endpoint, stage) -> Histogram
+        self.stages = {}
+
+    def record(self, method: str, endpoint: str, status: int, duration_ns: int, response_bytes: int,
+               request_bytes: int, stage_ns: Dict[str, int]):
+        """Record one finished request"""
+        key = (method, endpoint)
+        with self._lock:
+            status_key = (method, endpoint, status)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.response_size[key] = Histogram(SIZE_BUCKETS)
+            self.latency[key].observe(duration_ns / 1e9)
+            self.response_size[key].observe(response_bytes)
+            if request_bytes:
+                if key not in self.request_size:
+                    self.request_size[key] = Histogram(SIZE_BUCKETS)
+                self.request_size[key].observe(request_bytes)
+
+            for stage, elapsed in stage_ns.items():
+                stage_key = (endpoint, stage)
+                if stage_key not in self.stages:
+                    self.stages[stage_key] = Histogram(LATENCY_BUCKETS)
+                self.stages[stage_key].observe(elapsed / 1e9)
+
+    def render(self, gauges: Sequence[Tuple[str, str, str, float]] = ()) -> str:
+        """Everything in Prometheus text format, followed by (name, type, help, value) extras"""
+        lines = []
+        with self._lock:
+            lines += ['# HELP momo_http_requests_total Requests handled, by method, endpoint and status',
+                      '# TYPE momo_http_requests_total counter']
+            for labels, count in sorted(self.requests.items()):
+                lines.append(f'momo_http_requests_total{{{_labels(("method", "endpoint", "status"), labels)}}} {count}')
+
+            for name, help_text, histograms, label_names in (
+                ('momo_http_request_duration_seconds', 'Request latency', self.latency, ('method', 'endpoint')),
+                ('momo_http_response_size_bytes', 'Bytes written per response, headers included',
+                 self.response_size, ('method', 'endpoint')),
+                ('momo_http_request_size_bytes', 'Request body bytes', self.request_size, ('method', 'endpoint')),
+                ('momo_http_stage_duration_seconds', 'Time per request spent in a stage: auth, processor, '
+                 'serialize or write', self.stages, ('endpoint', 'stage')),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for labels, histogram in sorted(histograms.items()):
+                    lines += histogram.render(name, _labels(label_names, labels))
+
+        for name, metric_type, help_text, value in gauges:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+class StageTimer:
+    """Context manager adding the time spent in its block to a per-request stage total"""
+
+    __slots__ = ('stage_ns', 'stage', 'start')
+
+    def __init__(self, stage_ns: Dict[str, int], stage: str):
+        self.stage_ns = stage_ns
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stage_ns[self.stage] = self.stage_ns.get(self.stage, 0) + time.perf_counter_ns() - self.start
+
+class MeteredWriter:
+    """Socket stream wrapper counting the bytes written and the time spent writing them"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes = 0
+        self.write_ns = 0
+
+    def reset(self):
+        self.bytes = 0
+        self.write_ns = 0
+
+    def write(self, data) -> int:
+        start = time.perf_counter_ns()
+        written = self.stream.write(data)
+        self.write_ns += time.perf_counter_ns() - start
+        self.bytes += len(data)
+        return written
+
+    def flush(self):
+        self.stream.flush()
+
+    @property
+    def closed(self) -> bool:
+        return self.stream.closed
+
+    def close(self):
+        self.stream.close()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Serialized Response Cache for the MoMo SMS REST API
+
+GET responses are cached as the exact bytes sent to the client, keyed by
+content coding, path and query, so a repeat read is a single write of a stored buffer
+instead of fetching and re-serializing transactions.
+
+Every entry belongs to a data version: SMSDataProcessor bumps its version on
+each create, update and delete, and the first lookup under a newer version
+drops every older entry. The same version, with a digest of the path and
+query, makes up the ETag header, so clients that poll a resource with
+If-None-Match get 304 Not Modified until the data changes.
+
+Entries are evicted least recently used first once the cached bodies exceed
+a byte budget.
+"""
+
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple, List
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+class ResponseCache:
+    """LRU cache of serialized response bodies, bounded by total bytes"""
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        # Distinguishes ETags of this process from those of an earlier run,
+        # whose data version counter may have reached the same value
+        self.instance_id = os.urandom(4).hex()
+        self._lock = threading.Lock()
+        # key -> (headers, body), least recently used first
+        self._entries = OrderedDict()
+        self._version = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def etag(self, version: int, resource: str, encoding: Optional[str] = None) -> str:
+        """ETag of the response for a resource (path and query) under a data version and content coding"""
+        tag = f'{self.instance_id}-{version}-{zlib.crc32(resource.encode()):08x}'
+        if encoding:
+            return f'"{tag}-{encoding}"'
+        return f'"{tag}"'
+
+    def get(self, key: str, version: int) -> Optional[Tuple[List[Tuple[str, str]], bytes]]:
+        """(headers, body) cached for key under version, or None"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, version: int, headers: List[Tuple[str, str]], body: bytes):
+        """Cache a response body and its entity headers (ignored if built under an older version or too large)"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._check_version(version)
+            if version != self._version:
+                return
+
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[1])
+            self._entries[key] = (headers, body)
+            self.size += len(body)
+
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_version(self, version: int):
+        """Drop every entry once the data has moved past their version (call with the lock held)"""
+        if self._version is None or version > self._version:
+            self._entries.clear()
+            self.size = 0
+            self._version = version
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value matches an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+class DiscardingWriter:
+    """Swallows the body of a response that went out as 304 Not Modified"""
+
+    def write(self, data) -> int:
+        return len(data)
+
+    def flush(self):
+        pass
+
+class CapturingWriter:
+    """Passes writes through to a stream while keeping a copy, up to a size limit"""
+
+    def __init__(self, stream, limit: int):
+        self.stream = stream
+        self.limit = limit
+        self.chunks = []
+        self.size = 0
+        self.overflowed = False
+
+    def write(self, data) -> int:
+        if not self.overflowed:
+            self.size += len(data)
+            if self.size > self.limit:
+                self.discard()
+            else:
+                self.chunks.append(bytes(data))
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def discard(self):
+        """Stop keeping a copy (the response is not to be cached)"""
+        self.overflowed = True
+        self.chunks = []
+
+    def getvalue(self) -> Optional[bytes]:
+        """Everything written, or None if it went over the limit"""
+        return None if self.overflowed else b''.join(self.chunks)
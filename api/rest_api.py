@@ -5,86 +5,214 @@ Week 2: API Implementation with Basic Authentication
 
 This module implements a REST API for SMS transaction data with:
 - CRUD operations (GET, POST, PUT, DELETE)
-- Basic Authentication
+- Basic Authentication (salted password hashes) and signed bearer tokens
 - XML parsing and JSON conversion
 - Data Structures & Algorithms (DSA) integration
 """
 
+import argparse
 import json
 import xml.etree.ElementTree as ET
-import base64
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+from bisect import bisect_right
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import os
 import sys
 sys.path.append('.')
 from etl.parse_xml import SMSTransactionParser
+from api.store import DictTransactionStore, ColumnarTransactionStore, timestamp_to_micros
+from api.indexes import TransactionIndexes
+from api.rollups import TransactionRollups, TIME_BUCKET_FORMATS
+from api.db import SQLiteTransactionStore
+from api.snapshot import SnapshotTransactionStore, DEFAULT_SNAPSHOT_FILE
+from etl.load_db import DEFAULT_DB_FILE
+from etl.sms_index import RawSMSReader, DEFAULT_SMS_INDEX_FILE
+from api.auth import (Authenticator, CredentialStore, TokenSigner, TooManyFailures, DEFAULT_CREDENTIALS_FILE,
+                      TOKEN_TTL)
+from api.connections import IdleConnections
+from api.metrics import APIMetrics, MeteredWriter, StageTimer, endpoint_label
+from api.access_log import AccessLog, DEFAULT_SAMPLE_RATE
+from api.response_cache import ResponseCache, DEFAULT_CACHE_BYTES, CapturingWriter, DiscardingWriter, etag_matches
+from api.encoding import (COMPRESS_MIN_BYTES, ChunkedWriter, CompressingWriter, compress, dumps,
+                          encode_stream_batch, identity_acceptable, negotiate_encoding, parse_fields, project,
+                          representation)
+
+# Response headers kept with a cached body and replayed on a cache hit
+CACHED_HEADERS = ('content-type', 'content-encoding', 'vary')
+
+# Transactions fetched from the store per write when streaming a listing
+STREAM_BATCH_SIZE = 500
+
+# Longest chunk-size or trailer line accepted in a chunked request body
+MAX_CHUNK_LINE_BYTES = 65536
+
+# Default and largest limit of GET /transactions/top
+TOP_DEFAULT_LIMIT = 10
+TOP_MAX_LIMIT = 1000
+
+# Range parameters of GET /transactions/top, per sort field
+TOP_RANGE_PARAMETERS = {
+    'amount': ('min_amount', 'max_amount'),
+    'timestamp': ('start', 'end')
+}
+
+# Filter query parameters on GET /transactions and how to parse them
+FILTER_PARAMETERS = {
+    'transaction_type': str,
+    'sender': str,
+    'receiver': str,
+    'counterparty': str,
+    'min_amount': float,
+    'max_amount': float,
+    'start': timestamp_to_micros,
+    'end': timestamp_to_micros
+}
 
 class SMSDataProcessor:
     """Handles SMS data parsing and storage"""
     
-    def __init__(self, xml_file_path):
+    def __init__(self, xml_file_path, store=None):
         self.xml_file_path = xml_file_path
-        self.transactions = []
-        self.transaction_dict = {}  # For DSA comparison
+        # Transaction store backing the processor (see api/store.py)
+        self.store = store if store is not None else DictTransactionStore()
+        # Secondary indexes for filtered queries, maintained on every mutation
+        self.indexes = TransactionIndexes()
+        # Amount rollups behind GET /stats, maintained on every mutation
+        self.rollups = TransactionRollups()
+        # Indexes and rollups are built on first use, so startup does not
+        # have to read every transaction (see ensure_derived)
+        self.derived_ready = False
+        # Bumped after every change to the data; keys cached responses and ETags
+        self.data_version = 0
+        # Reader for raw SMS lookups, opened on first use and reopened once
+        # the ETL replaces the index (see get_raw_sms)
+        self.sms_index_file = DEFAULT_SMS_INDEX_FILE
+        self.sms_reader = None
+        # Serializes mutations (and reads too, for stores that need it)
+        self.lock = threading.RLock()
         self.sms_parser = SMSTransactionParser(xml_file_path)
         self.load_data()
     
     def load_data(self):
         """Parse XML file and load transactions into memory"""
         try:
+            json_file = 'data/processed/transactions.json'
+            
+            # A persistent store that already holds data is the source of truth,
+            # unless the ETL has written newer JSON since it was built
+            if self.store.PERSISTENT and len(self.store):
+                if not self.store.is_stale(json_file):
+                    print(f"Using {len(self.store)} transactions already in the store")
+                    with self.lock:
+                        self.derived_ready = False
+                    return
+                print(f"The store is older than {json_file}; reloading it")
+            
             print(f"Loading SMS data from: {self.xml_file_path}")
             
             # First try to load from pre-generated JSON file
-            json_file = 'data/processed/transactions.json'
             if os.path.exists(json_file):
                 print(f"Loading from pre-generated JSON: {json_file}")
                 with open(json_file, 'r', encoding='utf-8') as f:
-                    self.transactions = json.load(f)
+                    transactions = json.load(f)
             else:
-                # Parse SMS records and extract transactions
-                self.sms_parser.parse_xml()
-                self.transactions = self.sms_parser.process_sms_to_transactions()
+                # Stream SMS records straight into transaction extraction
+                transactions = self.sms_parser.process_sms_to_transactions(self.sms_parser.iter_sms_records())
             
-            # Build dictionary for fast lookups
-            for tx in self.transactions:
-                self.transaction_dict[tx['id']] = tx
+            # Store builds its own ID lookup
+            with self.lock:
+                self.store.load(transactions)
+                self.derived_ready = False
+                self.data_version += 1
             
-            print(f"Loaded {len(self.transactions)} transactions")
+            print(f"Loaded {len(self.store)} transactions")
                 
         except Exception as e:
             print(f"Error loading data: {e}")
-            self.transactions = []
-            self.transaction_dict = {}
+            with self.lock:
+                self.store.load([])
+                self.derived_ready = False
+                self.data_version += 1
+    
+    def catch_up(self):
+        """Notice writes another process made to a shared store (call with the lock held)
+        
+        The indexes and rollups are then rebuilt on next use, and the new data
+        version retires cached responses and ETags.
+        """
+        if self.store.SHARED and self.store.changed_elsewhere():
+            self.derived_ready = False
+            self.data_version += 1
+    
+    def current_version(self):
+        """data_version, after catching up with writes made elsewhere"""
+        if self.store.SHARED:
+            with self.lock:
+                self.catch_up()
+        return self.data_version
+    
+    def ensure_derived(self):
+        """Build the indexes and rollups if they have not been yet (call with the lock held)"""
+        self.catch_up()
+        if not self.derived_ready:
+            self.indexes.build(self.store)
+            self.rollups.build(self.store)
+            self.derived_ready = True
+    
+    def read_lock(self):
+        """Context manager guarding a read against concurrent writers"""
+        return nullcontext() if self.store.CONCURRENT_READS else self.lock
     
     def linear_search(self, transaction_id):
         """Linear search algorithm - O(n) complexity"""
-        start_time = time.time()
-        
-        for transaction in self.transactions:
-            if transaction['id'] == transaction_id:
-                end_time = time.time()
-                return transaction, (end_time - start_time) * 1000  # Convert to milliseconds
-        
-        end_time = time.time()
-        return None, (end_time - start_time) * 1000
+        with self.read_lock():
+            start_time = time.perf_counter_ns()
+            
+            for tx_id in self.store.ids():
+                if tx_id == transaction_id:
+                    transaction = self.store.get(tx_id)
+                    end_time = time.perf_counter_ns()
+                    return transaction, (end_time - start_time) / 1_000_000  # Convert to milliseconds
+            
+            end_time = time.perf_counter_ns()
+            return None, (end_time - start_time) / 1_000_000
     
     def dictionary_lookup(self, transaction_id):
         """Dictionary lookup algorithm - O(1) complexity"""
-        start_time = time.time()
-        
-        result = self.transaction_dict.get(transaction_id)
-        
-        end_time = time.time()
-        return result, (end_time - start_time) * 1000  # Convert to milliseconds
+        with self.read_lock():
+            start_time = time.perf_counter_ns()
+            
+            result = self.store.get(transaction_id)
+            
+            end_time = time.perf_counter_ns()
+            return result, (end_time - start_time) / 1_000_000  # Convert to milliseconds
     
     def get_all_transactions(self):
-        """Get all transactions"""
-        return self.transactions
+        """Get all transactions (dicts are built here, at serialization time)"""
+        with self.read_lock():
+            return list(self.store)
+    
+    def get_transactions_page(self, after_id=0, limit=STREAM_BATCH_SIZE):
+        """Keyset page: up to limit transactions with ID greater than after_id"""
+        with self.read_lock():
+            return list(islice(self.store.iter_after(after_id), limit))
     
-    def get_transaction_by_id(self, transaction_id):
-        """Get transaction by ID using both algorithms for comparison"""
+    def get_transaction_by_id(self, transaction_id, compare=False):
+        """Get transaction by ID
+        
+        By default this is a single indexed lookup. With compare=True the
+        lookup is also repeated with linear search and both are timed, for
+        the DSA comparison.
+        """
+        if not compare:
+            with self.read_lock():
+                return {'transaction': self.store.get(transaction_id)}
+        
         # Try dictionary lookup first (faster)
         result_dict, time_dict = self.dictionary_lookup(transaction_id)
         
@@ -107,54 +235,346 @@ class SMSDataProcessor:
     
     def add_transaction(self, transaction_data):
         """Add new transaction"""
-        # Generate new ID
-        new_id = max([tx['id'] for tx in self.transactions], default=0) + 1
-        transaction_data['id'] = new_id
-        
-        self.transactions.append(transaction_data)
-        self.transaction_dict[new_id] = transaction_data
-        
-        return transaction_data
+        with self.lock:
+            self.catch_up()
+            new_transaction = self.store.add(transaction_data)
+            if self.derived_ready:
+                self.indexes.add(new_transaction)
+                self.rollups.add(new_transaction)
+            self.data_version += 1
+            return new_transaction
     
     def update_transaction(self, transaction_id, update_data):
         """Update existing transaction"""
-        if transaction_id in self.transaction_dict:
-            # Update in list
-            for i, tx in enumerate(self.transactions):
-                if tx['id'] == transaction_id:
-                    self.transactions[i].update(update_data)
-                    break
+        with self.lock:
+            self.catch_up()
+            # Stores return a fresh or copy-on-write dict, so this stays unchanged
+            old_transaction = self.store.get(transaction_id)
+            if old_transaction is None:
+                return None
             
-            # Update in dictionary
-            self.transaction_dict[transaction_id].update(update_data)
-            return self.transaction_dict[transaction_id]
-        
-        return None
+            updated_transaction = self.store.update(transaction_id, update_data)
+            if self.derived_ready:
+                self.indexes.update(old_transaction, updated_transaction)
+                self.rollups.update(old_transaction, updated_transaction)
+            self.data_version += 1
+            return updated_transaction
     
     def delete_transaction(self, transaction_id):
         """Delete transaction"""
-        if transaction_id in self.transaction_dict:
-            # Remove from list
-            self.transactions = [tx for tx in self.transactions if tx['id'] != transaction_id]
-            
-            # Remove from dictionary
-            deleted_tx = self.transaction_dict.pop(transaction_id)
-            return deleted_tx
+        with self.lock:
+            self.catch_up()
+            deleted_transaction = self.store.delete(transaction_id)
+            if deleted_transaction is not None:
+                if self.derived_ready:
+                    self.indexes.remove(deleted_transaction)
+                    self.rollups.remove(deleted_transaction)
+                self.data_version += 1
+            return deleted_transaction
+    
+    def query_transaction_ids(self, filters):
+        """IDs of transactions matching the filters, in ID order (see TransactionIndexes.query)"""
+        with self.lock:
+            self.ensure_derived()
+            return self.indexes.query(filters)
+    
+    def get_top_transactions(self, field, count, largest=True, low=None, high=None):
+        """Transactions with the largest (or smallest) amounts or timestamps (see TransactionIndexes.top)"""
+        with self.lock:
+            self.ensure_derived()
+            transactions = (self.store.get(tx_id) for tx_id in self.indexes.top(field, count, largest, low, high))
+            return [tx for tx in transactions if tx is not None]
+    
+    def get_stats(self, bucket='day', start=None, end=None):
+        """Amount statistics from the rollups (see TransactionRollups.query)
+        
+        Hours the window only partly covers are counted from the
+        transactions the timestamp index finds in them.
+        """
+        with self.lock:
+            self.ensure_derived()
+            partial_transactions = []
+            for low, high in self.rollups.partial_hours(start, end):
+                partial_transactions.extend(self.store.get(tx_id)
+                                            for tx_id in self.indexes.query({'start': low, 'end': high}))
+            return self.rollups.query(bucket, start, end, partial_transactions)
+    
+    def get_raw_sms(self, transaction_id):
+        """The SMS record a transaction was extracted from, read through the ETL's offset index
         
-        return None
+        Returns None if the transaction does not exist, did not come from the
+        backup, or the index is missing or out of date.
+        """
+        with self.lock:
+            if self.store.get(transaction_id) is None:
+                return None
+            if self.sms_reader is not None and not self.sms_reader.is_current():
+                self.sms_reader.close()
+                self.sms_reader = None
+            if self.sms_reader is None:
+                try:
+                    self.sms_reader = RawSMSReader(self.xml_file_path, self.sms_index_file)
+                except (OSError, ValueError) as e:
+                    print(f"Raw SMS lookups unavailable: {e}")
+                    return None
+            return self.sms_reader.record_for_transaction(transaction_id)
+    
+    def get_transactions_by_ids(self, transaction_ids):
+        """Fetch transactions by ID, skipping any deleted since the IDs were found"""
+        with self.read_lock():
+            transactions = (self.store.get(tx_id) for tx_id in transaction_ids)
+            return [tx for tx in transactions if tx is not None]
 
 class AuthenticatedHTTPRequestHandler(BaseHTTPRequestHandler):
-    """HTTP Request Handler with Basic Authentication"""
+    """HTTP Request Handler with Basic Authentication
+    
+    Speaks HTTP/1.1, so a client can send many requests over one connection.
+    Every response is framed by Content-Length or chunked transfer coding;
+    the connection is closed after the server's keep-alive timeout passes
+    with no request, or after its per-connection request limit. On servers
+    that park idle connections, handle() returns as soon as the connection
+    is waiting for its next request, leaving it open.
+    """
+    
+    protocol_version = 'HTTP/1.1'
+    
+    # Headers and body go out in separate writes; with Nagle's algorithm the
+    # body of every response after the first on a connection would wait for
+    # the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
     
     def __init__(self, *args, **kwargs):
-        # Hardcoded credentials for demonstration (in production, use proper auth)
-        self.valid_credentials = {
-            'admin': 'password123',
-            'user': 'momo2024',
-            'api': 'sms_data'
-        }
+        # Requests answered on this connection
+        self.requests_handled = 0
+        # Set while the open connection waits in the server's idle set
+        self.parked = False
+        self.reset_response_state()
         super().__init__(*args, **kwargs)
     
+    def reset_response_state(self):
+        """Clear the per-request bookkeeping for the cache, ETags and framing"""
+        self.etag = None
+        self.response_status = None
+        self.response_headers = []
+        self.capture_response = False
+        self.response_capture = None
+        self.chunked_writer = None
+        self.send_chunked = False
+        self.body_read = False
+        self.username = None
+        # Instrumentation (see api/metrics.py): start time, body size and time per stage
+        self.request_start = None
+        self.request_bytes = 0
+        self.stage_ns = {}
+        self.log_note = None
+    
+    def setup(self):
+        """Apply the server's keep-alive timeout to the connection"""
+        self.timeout = self.server.keep_alive_timeout
+        super().setup()
+        self.socket_wfile = MeteredWriter(self.wfile)
+        self.wfile = self.socket_wfile
+    
+    def handle(self):
+        """Serve requests until the connection closes, or until it is idle on
+        a server that parks idle connections (see ThreadPoolSMSAPIServer)"""
+        self.parked = False
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if self.server.parks_idle_connections and not self.input_pending():
+                self.parked = True
+                return
+            self.handle_one_request()
+    
+    def input_pending(self):
+        """Whether any of the next request has arrived (buffered, or waiting on the socket)"""
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            # Let the next read report the error
+            return True
+        finally:
+            self.connection.settimeout(self.timeout)
+    
+    def finish(self):
+        """Close the streams, unless the connection is parked for its next request"""
+        if self.parked:
+            self.wfile.flush()
+            return
+        super().finish()
+    
+    def handle_one_request(self):
+        """Handle the next request on the connection"""
+        self.reset_response_state()
+        try:
+            super().handle_one_request()
+        finally:
+            self.wfile = self.socket_wfile
+        if self.request_start is not None:
+            self.record_request()
+    
+    def parse_request(self):
+        """Parse the request line and headers, starting the request's clock"""
+        self.request_start = time.perf_counter_ns()
+        self.socket_wfile.reset()
+        return super().parse_request()
+    
+    def timer(self, stage):
+        """Context manager timing a stage of the request: auth, processor or serialize"""
+        return StageTimer(self.stage_ns, stage)
+    
+    def record_request(self):
+        """Record the finished request in the server's metrics and access log"""
+        duration_ns = time.perf_counter_ns() - self.request_start
+        self.stage_ns['write'] = self.socket_wfile.write_ns
+        method = self.command or '-'
+        path = getattr(self, 'path', None)
+        status = self.response_status or 0
+        
+        self.server.metrics.record(method, endpoint_label(path), status, duration_ns, self.socket_wfile.bytes,
+                                   self.request_bytes, self.stage_ns)
+        record = {
+            'client': self.client_address[0],
+            'user': self.username,
+            'method': method,
+            'path': path,
+            'status': status,
+            'bytes': self.socket_wfile.bytes,
+            'duration_ms': round(duration_ns / 1e6, 3)
+        }
+        if self.log_note is not None:
+            record['message'] = self.log_note
+        self.server.access_log.request(record)
+    
+    def request_body_chunked(self):
+        """Whether the request body is sent with chunked transfer coding"""
+        transfer_encoding = self.headers.get('Transfer-Encoding') or ''
+        return transfer_encoding.rsplit(',', 1)[-1].strip().lower() == 'chunked'
+    
+    def read_request_body(self):
+        """Read the request body: Content-Length bytes, or the chunks of a
+        chunked body (raises ValueError if its framing is broken)"""
+        if self.request_body_chunked():
+            body = self.read_chunked_body()
+        elif self.headers.get('Transfer-Encoding'):
+            raise ValueError("Unsupported Transfer-Encoding")
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.body_read = True
+        self.request_bytes = len(body)
+        return body
+    
+    def read_chunked_body(self):
+        """Decode a chunked request body, discarding any trailer fields
+        
+        When the framing is broken, body_read stays False and end_headers
+        closes the connection, as the next request cannot be found.
+        """
+        chunks = []
+        while True:
+            size_line = self.rfile.readline(MAX_CHUNK_LINE_BYTES + 1)
+            try:
+                size = int(size_line.split(b';', 1)[0], 16)
+            except ValueError:
+                raise ValueError("Malformed chunk size in request body") from None
+            if size < 0:
+                raise ValueError("Malformed chunk size in request body")
+            if size == 0:
+                break
+            chunk = self.rfile.read(size)
+            if len(chunk) < size or self.rfile.readline(3) != b'\r\n':
+                raise ValueError("Truncated chunk in request body")
+            chunks.append(chunk)
+        
+        # Trailer fields, up to the blank line that ends the body
+        while True:
+            line = self.rfile.readline(MAX_CHUNK_LINE_BYTES + 1)
+            if line in (b'\r\n', b'\n'):
+                return b''.join(chunks)
+            if not line or len(line) > MAX_CHUNK_LINE_BYTES:
+                raise ValueError("Truncated chunked request body")
+    
+    def send_response(self, code, message=None):
+        """Send the status line, remembering the status for the response cache
+        
+        A 200 for a GET whose ETag the client already holds goes out as 304
+        instead, and its body is dropped (see end_headers).
+        """
+        if code == 200 and self.etag is not None and etag_matches(self.headers.get('If-None-Match'), self.etag):
+            code = 304
+        self.response_status = code
+        super().send_response(code, message)
+    
+    def send_header(self, keyword, value):
+        """Send a header, remembering entity headers for the response cache"""
+        if self.response_status == 304 and keyword.lower() in ('content-length', 'transfer-encoding'):
+            # A 304 has no body to frame
+            return
+        if keyword.lower() in CACHED_HEADERS:
+            self.response_headers.append((keyword, value))
+        elif keyword.lower() == 'transfer-encoding' and value.lower() == 'chunked':
+            self.send_chunked = True
+        super().send_header(keyword, value)
+    
+    def end_headers(self):
+        """Finish the headers: add the ETag to successful GET responses, decide
+        whether the connection stays open, and set up chunked framing and
+        capture of the body for the cache"""
+        if self.etag is not None and self.response_status in (200, 304):
+            self.send_header('ETag', self.etag)
+            self.send_header('Cache-Control', 'no-cache')
+        
+        self.requests_handled += 1
+        headers = getattr(self, 'headers', None)
+        # A body left unread would be taken for the next request
+        unread_body = headers is not None and not self.body_read and (
+            int(headers.get('Content-Length') or 0) > 0 or 'Transfer-Encoding' in headers)
+        if not self.close_connection and (unread_body or
+                                          self.requests_handled >= self.server.max_keep_alive_requests):
+            self.send_header('Connection', 'close')
+        
+        super().end_headers()
+        if self.response_status == 304:
+            self.wfile = DiscardingWriter()
+            return
+        if self.send_chunked:
+            self.chunked_writer = ChunkedWriter(self.wfile)
+            self.wfile = self.chunked_writer
+        if self.capture_response and self.response_status == 200:
+            self.response_capture = CapturingWriter(self.wfile, self.server.response_cache.max_bytes)
+            self.wfile = self.response_capture
+    
+    def wants_pretty(self):
+        """Whether the request asked for indented JSON with ?pretty=1"""
+        query = parse_qs(urlparse(self.path).query)
+        return query.get('pretty', ['0'])[0].lower() in ('1', 'true', 'yes')
+    
+    def send_json(self, status, response, headers=()):
+        """Send a JSON response: compact unless ?pretty=1, and compressed when
+        the client accepts gzip or deflate and the body is large (or the
+        client refuses identity)"""
+        with self.timer('serialize'):
+            body = dumps(response, self.wants_pretty()).encode()
+            accept_encoding = self.headers.get('Accept-Encoding')
+            encoding = negotiate_encoding(accept_encoding)
+            if encoding and (len(body) >= COMPRESS_MIN_BYTES or not identity_acceptable(accept_encoding)):
+                body = compress(body, encoding)
+            else:
+                encoding = None
+        
+        self.send_response(status)
+        for keyword, value in headers:
+            self.send_header(keyword, value)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
     def do_HEAD(self):
         """Handle HEAD requests"""
         self.send_response(200)
@@ -162,18 +582,74 @@ class AuthenticatedHTTPRequestHandler(BaseHTTPRequestHandler):
         self.end_headers()
     
     def do_GET(self):
-        """Handle GET requests"""
+        """Handle GET requests
+        
+        Responses are cached by path and query for the current data version,
+        and a cached body is written back as is. If-None-Match is answered
+        with 304 only where the response would be a 200: for a cached body,
+        or once the route has produced one.
+        """
         if not self.authenticate():
             return
         
+        # Metrics change without the data changing, so they bypass the cache
+        if urlparse(self.path).path == '/metrics':
+            self.get_metrics()
+            return
+        
+        cache = self.server.response_cache
+        version = self.server.sms_processor.current_version()
+        encoding = representation(self.headers.get('Accept-Encoding'))
+        cache_key = f"{encoding or 'identity'} {self.path}"
+        self.etag = cache.etag(version, self.path, encoding)
+        
+        cached = cache.get(cache_key, version)
+        if cached is not None:
+            headers, body = cached
+            self.send_response(200)
+            for keyword, value in headers:
+                self.send_header(keyword, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        
+        self.capture_response = cache.max_bytes > 0
+        try:
+            self.route_get()
+        finally:
+            capture = self.response_capture
+            if capture is not None:
+                self.wfile = capture.stream
+                self.response_capture = None
+                body = capture.getvalue()
+                if body is not None and self.response_status == 200:
+                    cache.put(cache_key, version, self.response_headers, body)
+            self.capture_response = False
+    
+    def route_get(self):
+        """Dispatch a GET request to its endpoint"""
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         
         if path == '/transactions':
-            self.get_all_transactions()
+            self.get_all_transactions(parse_qs(parsed_path.query))
+        elif path == '/transactions/top':
+            self.get_top_transactions(parse_qs(parsed_path.query))
+        elif path.startswith('/transactions/') and path.endswith('/raw'):
+            self.get_raw_sms(int(path.split('/')[-2]))
         elif path.startswith('/transactions/'):
             transaction_id = int(path.split('/')[-1])
-            self.get_transaction_by_id(transaction_id)
+            query = parse_qs(parsed_path.query)
+            compare = query.get('compare', ['0'])[0].lower() in ('1', 'true', 'yes')
+            try:
+                fields = parse_fields(query['fields'][0] if 'fields' in query else None)
+            except ValueError:
+                self.send_error(400, "Invalid fields parameter")
+                return
+            self.get_transaction_by_id(transaction_id, compare, fields)
+        elif path == '/stats':
+            self.get_stats(parse_qs(parsed_path.query))
         elif path == '/performance':
             self.get_performance_comparison()
         else:
@@ -181,11 +657,14 @@ class AuthenticatedHTTPRequestHandler(BaseHTTPRequestHandler):
     
     def do_POST(self):
         """Handle POST requests"""
-        if not self.authenticate():
+        # A token cannot renew itself: new tokens need the password
+        if not self.authenticate(allow_bearer=self.path != '/auth/token'):
             return
         
         if self.path == '/transactions':
             self.create_transaction()
+        elif self.path == '/auth/token':
+            self.issue_token()
         else:
             self.send_error(404, "Not Found")
     
@@ -211,93 +690,269 @@ class AuthenticatedHTTPRequestHandler(BaseHTTPRequestHandler):
         else:
             self.send_error(404, "Not Found")
     
-    def authenticate(self):
-        """Basic Authentication implementation"""
-        auth_header = self.headers.get('Authorization')
-        
-        if not auth_header or not auth_header.startswith('Basic '):
-            self.send_authenticate_header()
-            return False
-        
+    def authenticate(self, allow_bearer=True):
+        """Check the Basic credentials or bearer token (see api/auth.py), sending 401 if invalid,
+        or 429 if this client failed too many password checks"""
         try:
-            # Decode base64 credentials
-            encoded_credentials = auth_header.split(' ')[1]
-            decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
-            username, password = decoded_credentials.split(':', 1)
-            
-            # Check credentials
-            if username in self.valid_credentials and self.valid_credentials[username] == password:
-                return True
-            else:
-                self.send_authenticate_header()
-                return False
-                
-        except Exception as e:
+            with self.timer('auth'):
+                self.username = self.server.authenticator.authenticate(
+                    self.headers.get('Authorization'), self.client_address[0], allow_bearer)
+        except TooManyFailures as e:
+            self.username = None
+            error_response = {
+                'error': 'Too Many Requests',
+                'message': str(e),
+                'status_code': 429
+            }
+            self.send_json(429, error_response, headers=[('Retry-After', str(int(e.retry_after) + 1))])
+            return False
+        if self.username is None:
             self.send_authenticate_header()
             return False
+        return True
     
     def send_authenticate_header(self):
         """Send 401 Unauthorized response"""
-        self.send_response(401)
-        self.send_header('WWW-Authenticate', 'Basic realm="MoMo SMS API"')
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        
         error_response = {
             'error': 'Unauthorized',
             'message': 'Valid credentials required',
             'status_code': 401
         }
-        self.wfile.write(json.dumps(error_response, indent=2).encode())
+        self.send_json(401, error_response, headers=[('WWW-Authenticate', 'Basic realm="MoMo SMS API"')])
     
-    def get_all_transactions(self):
-        """GET /transactions - List all transactions"""
+    def get_all_transactions(self, query=None):
+        """GET /transactions - List transactions
+        
+        Query parameters:
+            cursor: only return transactions with ID greater than this (keyset)
+            limit: maximum number of transactions to return
+            format: 'json' (default) or 'ndjson' (one transaction per line)
+            fields: comma-separated fields to return per transaction (e.g. to drop message)
+            pretty: 1 for indented JSON
+            transaction_type, sender, receiver, counterparty: exact-match filters
+            min_amount, max_amount: inclusive amount range
+            start, end: ISO-8601 time window (start inclusive, end exclusive)
+        
+        The body is streamed in batches fetched by keyset from the store, so
+        the full response is never held in memory. Filters are answered from
+        the secondary indexes rather than by scanning every transaction. It is
+        compressed on the fly when the client accepts gzip or deflate.
+        """
+        query = query or {}
+        try:
+            cursor = int(query.get('cursor', ['0'])[0])
+            limit = int(query['limit'][0]) if 'limit' in query else None
+            stream_format = query.get('format', ['json'])[0]
+            if cursor < 0 or (limit is not None and limit < 1) or stream_format not in ('json', 'ndjson'):
+                raise ValueError
+            filters = self._parse_filters(query)
+            fields = parse_fields(query['fields'][0] if 'fields' in query else None)
+        except ValueError:
+            self.send_error(400, "Invalid cursor, limit, format, fields or filter parameter")
+            return
+        
+        headers_sent = False
         try:
-            transactions = self.server.sms_processor.get_all_transactions()
+            processor = self.server.sms_processor
+            ndjson = stream_format == 'ndjson'
+            pretty = self.wants_pretty()
+            encoding = negotiate_encoding(self.headers.get('Accept-Encoding'))
+            
+            if filters:
+                with self.timer('processor'):
+                    matching_ids = processor.query_transaction_ids(filters)
+                
+                def fetch_page(after_id, size):
+                    """Next page of matching transactions after after_id"""
+                    position = bisect_right(matching_ids, after_id)
+                    while position < len(matching_ids):
+                        page = processor.get_transactions_by_ids(matching_ids[position:position + size])
+                        if page:
+                            return page
+                        # Every ID in this slice was deleted meanwhile; keep going
+                        position += size
+                    return []
+            else:
+                fetch_page = processor.get_transactions_page
             
             self.send_response(200)
-            self.send_header('Content-type', 'application/json')
+            self.send_header('Content-type', 'application/x-ndjson' if ndjson else 'application/json')
+            self.send_header('Vary', 'Accept-Encoding')
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            if self.request_version == 'HTTP/1.0':
+                # No chunked coding in HTTP/1.0; closing the connection ends the body
+                self.close_connection = True
+            else:
+                self.send_header('Transfer-Encoding', 'chunked')
             self.end_headers()
+            headers_sent = True
+            
+            out = CompressingWriter(self.wfile, encoding) if encoding else self.wfile
+            if not ndjson:
+                out.write(b'{\n  "status": "success",\n  "transactions": [' if pretty
+                          else b'{"status":"success","transactions":[')
+            
+            count = 0
+            after_id = cursor
+            while limit is None or count < limit:
+                batch_size = STREAM_BATCH_SIZE if limit is None else min(STREAM_BATCH_SIZE, limit - count)
+                with self.timer('processor'):
+                    page = fetch_page(after_id, batch_size)
+                if not page:
+                    break
+                
+                with self.timer('serialize'):
+                    batch = encode_stream_batch(page, ndjson, count == 0, pretty, fields)
+                out.write(batch)
+                count += len(page)
+                after_id = page[-1]['id']
+            
+            if not ndjson:
+                # Only report a next cursor when more transactions remain
+                trailer = {'count': count}
+                if limit is not None:
+                    with self.timer('processor'):
+                        more = count == limit and fetch_page(after_id, 1)
+                    trailer['next_cursor'] = after_id if more else None
+                
+                if pretty:
+                    closing = '\n  ],' if count else '],'
+                    members = ',\n'.join(f'  {json.dumps(key)}: {json.dumps(value)}' for key, value in trailer.items())
+                    out.write(f'{closing}\n{members}\n}}'.encode())
+                else:
+                    out.write(('],' + dumps(trailer)[1:]).encode())
+            
+            if encoding:
+                out.finish()
+            if self.chunked_writer is not None:
+                self.chunked_writer.finish()
+            
+        except Exception as e:
+            if headers_sent:
+                # Too late for an error status; the truncated body signals the failure
+                self.log_error("Error streaming transactions: %s", str(e))
+                self.close_connection = True
+                if self.response_capture is not None:
+                    self.response_capture.discard()
+            else:
+                self.send_error(500, f"Internal Server Error: {str(e)}")
+    
+    @staticmethod
+    def _parse_filters(query):
+        """Build index query filters from query parameters (raises ValueError)"""
+        filters = {}
+        for name, parse in FILTER_PARAMETERS.items():
+            if name in query:
+                value = parse(query[name][0])
+                if value is None:
+                    raise ValueError(f"Invalid {name}")
+                filters[name] = value
+        return filters
+    
+    def get_top_transactions(self, query=None):
+        """GET /transactions/top - Transactions with the largest or smallest amounts, or the latest or earliest
+        
+        Query parameters:
+            by: 'amount' (default) or 'timestamp'
+            order: 'desc' (default, largest or latest first) or 'asc'
+            limit: number of transactions, 1 to TOP_MAX_LIMIT (default TOP_DEFAULT_LIMIT)
+            min_amount, max_amount (by=amount) or start, end (by=timestamp): key range
+            fields: comma-separated fields to return per transaction
+        
+        Read off the end of the sorted index, in O(log n + limit).
+        """
+        query = query or {}
+        try:
+            by = query.get('by', ['amount'])[0]
+            order = query.get('order', ['desc'])[0]
+            limit = int(query.get('limit', [str(TOP_DEFAULT_LIMIT)])[0])
+            if by not in TOP_RANGE_PARAMETERS or order not in ('asc', 'desc') or not 1 <= limit <= TOP_MAX_LIMIT:
+                raise ValueError
+            low_name, high_name = TOP_RANGE_PARAMETERS[by]
+            bounds = self._parse_filters({name: query[name] for name in (low_name, high_name) if name in query})
+            fields = parse_fields(query['fields'][0] if 'fields' in query else None)
+        except ValueError:
+            self.send_error(400, "Invalid by, order, limit, range or fields parameter")
+            return
+        
+        try:
+            with self.timer('processor'):
+                transactions = self.server.sms_processor.get_top_transactions(
+                    by, limit, order == 'desc', bounds.get(low_name), bounds.get(high_name))
             
             response = {
                 'status': 'success',
+                'by': by,
+                'order': order,
                 'count': len(transactions),
-                'transactions': transactions
+                'transactions': [project(tx, fields) for tx in transactions]
             }
             
-            self.wfile.write(json.dumps(response, indent=2).encode())
+            self.send_json(200, response)
             
         except Exception as e:
             self.send_error(500, f"Internal Server Error: {str(e)}")
     
-    def get_transaction_by_id(self, transaction_id):
-        """GET /transactions/{id} - Get specific transaction"""
+    def get_transaction_by_id(self, transaction_id, compare=False, fields=None):
+        """GET /transactions/{id} - Get specific transaction
+        
+        Add ?compare=1 to also time a linear search against the indexed lookup,
+        and ?fields=... to return only some of the transaction's fields.
+        """
         try:
-            result = self.server.sms_processor.get_transaction_by_id(transaction_id)
+            with self.timer('processor'):
+                result = self.server.sms_processor.get_transaction_by_id(transaction_id, compare)
             
             if result['transaction']:
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                
                 response = {
                     'status': 'success',
-                    'transaction': result['transaction'],
-                    'performance_analysis': result['performance']
+                    'transaction': project(result['transaction'], fields)
                 }
+                if compare:
+                    response['performance_analysis'] = result['performance']
                 
-                self.wfile.write(json.dumps(response, indent=2).encode())
+                self.send_json(200, response)
             else:
                 self.send_error(404, "Transaction not found")
                 
         except Exception as e:
             self.send_error(500, f"Internal Server Error: {str(e)}")
     
+    def get_raw_sms(self, transaction_id):
+        """GET /transactions/{id}/raw - The original SMS a transaction was extracted from"""
+        try:
+            with self.timer('processor'):
+                sms = self.server.sms_processor.get_raw_sms(transaction_id)
+            
+            if sms:
+                response = {
+                    'status': 'success',
+                    'transaction_id': transaction_id,
+                    'sms': sms
+                }
+                self.send_json(200, response)
+            else:
+                self.send_error(404, "Raw SMS not found")
+                
+        except Exception as e:
+            self.send_error(500, f"Internal Server Error: {str(e)}")
+    
+    def issue_token(self):
+        """POST /auth/token - Bearer token for the user of the Basic credentials"""
+        authenticator = self.server.authenticator
+        response = {
+            'status': 'success',
+            'token': authenticator.issue_token(self.username),
+            'token_type': 'Bearer',
+            'expires_in': authenticator.tokens.ttl
+        }
+        self.send_json(200, response)
+    
     def create_transaction(self):
         """POST /transactions - Create new transaction"""
         try:
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
+            post_data = self.read_request_body()
             transaction_data = json.loads(post_data.decode('utf-8'))
             
             # Validate required fields
@@ -307,11 +962,8 @@ class AuthenticatedHTTPRequestHandler(BaseHTTPRequestHandler):
                     self.send_error(400, f"Missing required field: {field}")
                     return
             
-            new_transaction = self.server.sms_processor.add_transaction(transaction_data)
-            
-            self.send_response(201)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
+            with self.timer('processor'):
+                new_transaction = self.server.sms_processor.add_transaction(transaction_data)
             
             response = {
                 'status': 'success',
@@ -319,65 +971,101 @@ class AuthenticatedHTTPRequestHandler(BaseHTTPRequestHandler):
                 'transaction': new_transaction
             }
             
-            self.wfile.write(json.dumps(response, indent=2).encode())
+            self.send_json(201, response)
             
         except json.JSONDecodeError:
             self.send_error(400, "Invalid JSON")
+        except ValueError as e:
+            # The store rejected the transaction
+            self.send_error(400, str(e))
         except Exception as e:
             self.send_error(500, f"Internal Server Error: {str(e)}")
     
     def update_transaction(self, transaction_id):
         """PUT /transactions/{id} - Update transaction"""
         try:
-            content_length = int(self.headers['Content-Length'])
-            put_data = self.rfile.read(content_length)
+            put_data = self.read_request_body()
             update_data = json.loads(put_data.decode('utf-8'))
             
-            updated_transaction = self.server.sms_processor.update_transaction(transaction_id, update_data)
+            with self.timer('processor'):
+                updated_transaction = self.server.sms_processor.update_transaction(transaction_id, update_data)
             
             if updated_transaction:
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                
                 response = {
                     'status': 'success',
                     'message': 'Transaction updated successfully',
                     'transaction': updated_transaction
                 }
                 
-                self.wfile.write(json.dumps(response, indent=2).encode())
+                self.send_json(200, response)
             else:
                 self.send_error(404, "Transaction not found")
                 
         except json.JSONDecodeError:
             self.send_error(400, "Invalid JSON")
+        except ValueError as e:
+            # The store rejected the change
+            self.send_error(400, str(e))
         except Exception as e:
             self.send_error(500, f"Internal Server Error: {str(e)}")
     
     def delete_transaction(self, transaction_id):
         """DELETE /transactions/{id} - Delete transaction"""
         try:
-            deleted_transaction = self.server.sms_processor.delete_transaction(transaction_id)
+            with self.timer('processor'):
+                deleted_transaction = self.server.sms_processor.delete_transaction(transaction_id)
             
             if deleted_transaction:
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                
                 response = {
                     'status': 'success',
                     'message': 'Transaction deleted successfully',
                     'deleted_transaction': deleted_transaction
                 }
                 
-                self.wfile.write(json.dumps(response, indent=2).encode())
+                self.send_json(200, response)
             else:
                 self.send_error(404, "Transaction not found")
                 
         except Exception as e:
             self.send_error(500, f"Internal Server Error: {str(e)}")
     
+    def get_stats(self, query=None):
+        """GET /stats - Amount statistics per type, currency and time bucket
+        
+        Query parameters:
+            bucket: 'hour', 'day' (default) or 'month'
+            start, end: ISO-8601 time window (start inclusive, end exclusive)
+        
+        Answered from rollups maintained on every write, in O(buckets), plus
+        the transactions in hours the window only partly covers.
+        """
+        query = query or {}
+        try:
+            bucket = query.get('bucket', ['day'])[0]
+            if bucket not in TIME_BUCKET_FORMATS:
+                raise ValueError
+            window = self._parse_filters({name: query[name] for name in ('start', 'end') if name in query})
+        except ValueError:
+            self.send_error(400, "Invalid bucket, start or end parameter")
+            return
+        
+        try:
+            with self.timer('processor'):
+                stats = self.server.sms_processor.get_stats(bucket, window.get('start'), window.get('end'))
+            
+            response = {
+                'status': 'success',
+                'bucket': bucket,
+                'start': query['start'][0] if 'start' in query else None,
+                'end': query['end'][0] if 'end' in query else None,
+                **stats
+            }
+            
+            self.send_json(200, response)
+            
+        except Exception as e:
+            self.send_error(500, f"Internal Server Error: {str(e)}")
+    
     def get_performance_comparison(self):
         """GET /performance - Compare DSA algorithms"""
         try:
@@ -386,17 +1074,14 @@ class AuthenticatedHTTPRequestHandler(BaseHTTPRequestHandler):
             results = []
             
             for tx_id in test_ids:
-                result = self.server.sms_processor.get_transaction_by_id(tx_id)
+                with self.timer('processor'):
+                    result = self.server.sms_processor.get_transaction_by_id(tx_id, compare=True)
                 results.append({
                     'transaction_id': tx_id,
                     'found': result['transaction'] is not None,
                     'performance': result['performance']
                 })
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            
             response = {
                 'status': 'success',
                 'message': 'DSA Performance Comparison',
@@ -408,21 +1093,159 @@ class AuthenticatedHTTPRequestHandler(BaseHTTPRequestHandler):
                 }
             }
             
-            self.wfile.write(json.dumps(response, indent=2).encode())
+            self.send_json(200, response)
             
         except Exception as e:
             self.send_error(500, f"Internal Server Error: {str(e)}")
     
+    def get_metrics(self):
+        """GET /metrics - Request metrics in Prometheus text format"""
+        server = self.server
+        cache = server.response_cache
+        gauges = [
+            ('momo_transactions', 'gauge', 'Transactions in the store', len(server.sms_processor.store)),
+            ('momo_data_version', 'gauge', 'Changes to the data since startup', server.sms_processor.data_version),
+            ('momo_response_cache_hits_total', 'counter', 'GET responses served from the cache', cache.hits),
+            ('momo_response_cache_misses_total', 'counter', 'GET responses not found in the cache', cache.misses),
+            ('momo_response_cache_bytes', 'gauge', 'Bytes of cached response bodies', cache.size),
+            ('momo_auth_cache_entries', 'gauge', 'Verified Authorization headers cached',
+             len(server.authenticator.cache))
+        ]
+        if server.parks_idle_connections:
+            gauges.append(('momo_idle_connections', 'gauge', 'Keep-alive connections waiting for a request',
+                           len(server.idle_connections)))
+        with self.timer('serialize'):
+            body = server.metrics.render(gauges).encode()
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_request(self, code='-', size='-'):
+        """Requests are logged once finished, with their timing (see record_request)"""
+    
     def log_message(self, format, *args):
-        """Override to customize logging"""
-        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {format % args}")
+        """Attach a server message (an error) to the request's log line, or log it alone between requests"""
+        if self.request_start is not None:
+            self.log_note = format % args
+        else:
+            self.server.access_log.message({'client': self.client_address[0], 'message': format % args})
 
 class SMSAPIServer(HTTPServer):
     """Custom HTTP Server with SMS data processor"""
     
-    def __init__(self, server_address, RequestHandlerClass, xml_file_path):
+    # Seconds an idle keep-alive connection is held open waiting for its next request
+    keep_alive_timeout = 5.0
+    
+    # Whether handlers hand idle connections back instead of blocking on them
+    parks_idle_connections = False
+    
+    # Requests served on one connection before it is closed
+    max_keep_alive_requests = 100
+    
+    def __init__(self, server_address, RequestHandlerClass, xml_file_path, store=None,
+                 cache_bytes=DEFAULT_CACHE_BYTES, authenticator=None):
         super().__init__(server_address, RequestHandlerClass)
-        self.sms_processor = SMSDataProcessor(xml_file_path)
+        self.sms_processor = SMSDataProcessor(xml_file_path, store)
+        # Serialized GET responses shared by every handler
+        self.response_cache = ResponseCache(cache_bytes)
+        # Request metrics behind GET /metrics, and the access log
+        self.metrics = APIMetrics()
+        self.access_log = AccessLog()
+        # Credentials, verified-header cache and token signing shared by every handler
+        self.authenticator = (authenticator if authenticator is not None
+                              else Authenticator(CredentialStore.load(DEFAULT_CREDENTIALS_FILE)))
+    
+    def server_close(self):
+        """Close the listening socket and write out the access log"""
+        super().server_close()
+        self.access_log.close()
+
+class ThreadPoolSMSAPIServer(SMSAPIServer):
+    """SMS API Server that handles connections on a bounded pool of worker threads
+    
+    A slow client only ties up one worker, so other requests keep being served.
+    Workers only hold a connection while a request is in progress: an idle
+    keep-alive connection is parked with IdleConnections (api/connections.py)
+    and comes back to the pool when its next request arrives, so idle
+    clients never starve the pool.
+    """
+    
+    # Deeper listen backlog so bursts of concurrent clients are not refused
+    request_queue_size = 128
+    
+    parks_idle_connections = True
+    
+    def __init__(self, server_address, RequestHandlerClass, xml_file_path, store=None, workers=8,
+                 cache_bytes=DEFAULT_CACHE_BYTES, authenticator=None):
+        super().__init__(server_address, RequestHandlerClass, xml_file_path, store, cache_bytes, authenticator)
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-worker')
+        self.idle_connections = IdleConnections(self.resume_connection, self.expire_connection)
+    
+    def process_request(self, request, client_address):
+        """Hand the connection to a worker thread"""
+        self.executor.submit(self.process_request_thread, request, client_address)
+    
+    def process_request_thread(self, request, client_address):
+        """Handle a new connection on a worker thread until it closes or goes idle"""
+        handler = None
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+        self.release_connection(handler, request)
+    
+    def serve_parked(self, handler):
+        """Handle the requests that arrived on a parked connection, on a worker thread"""
+        try:
+            handler.handle()
+            handler.finish()
+        except Exception:
+            handler.parked = False
+            self.handle_error(handler.request, handler.client_address)
+        self.release_connection(handler, handler.request)
+    
+    def release_connection(self, handler, request):
+        """Park the connection if its handler left it idle, otherwise close it"""
+        if handler is not None and handler.parked:
+            self.idle_connections.add(handler)
+        else:
+            self.shutdown_request(request)
+    
+    def resume_connection(self, handler):
+        """A parked connection has a request waiting: queue it for a worker"""
+        try:
+            self.executor.submit(self.serve_parked, handler)
+        except RuntimeError:
+            # The pool is shutting down
+            self.expire_connection(handler)
+    
+    def expire_connection(self, handler):
+        """Close a parked connection (idle past the keep-alive timeout, or the server is closing)"""
+        handler.parked = False
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(handler.request)
+    
+    def server_close(self):
+        """Stop accepting connections, close idle ones and wait for in-flight requests"""
+        super().server_close()
+        self.idle_connections.close()
+        self.executor.shutdown(wait=True)
+        self.access_log.flush()
+
+# Transaction store backends selectable with --store
+STORE_BACKENDS = {
+    'dict': DictTransactionStore,
+    'columnar': ColumnarTransactionStore,
+    'sqlite': SQLiteTransactionStore,
+    'snapshot': SnapshotTransactionStore
+}
 
 def main():
     """Main function to start the API server"""
@@ -431,27 +1254,76 @@ def main():
     PORT = 8000
     XML_FILE_PATH = 'data/raw/modified_sms_v2.xml'
     
+    arg_parser = argparse.ArgumentParser(description='Run the MoMo SMS REST API server')
+    arg_parser.add_argument('--store', choices=sorted(STORE_BACKENDS), default='dict',
+                            help='Transaction store backend (snapshot starts fastest, columnar saves memory '
+                                 'on large datasets, sqlite persists changes across restarts)')
+    arg_parser.add_argument('--db', default=DEFAULT_DB_FILE,
+                            help='SQLite database file for the sqlite store')
+    arg_parser.add_argument('--snapshot', default=DEFAULT_SNAPSHOT_FILE,
+                            help='Binary snapshot file for --store snapshot (written from JSON if missing)')
+    arg_parser.add_argument('--cache-mb', type=float, default=DEFAULT_CACHE_BYTES / (1024 * 1024),
+                            help='Memory for cached GET responses in MB; 0 disables the cache (ETags still work)')
+    arg_parser.add_argument('--credentials', default=DEFAULT_CREDENTIALS_FILE,
+                            help='JSON file of users and salted password hashes (see api/auth.py)')
+    arg_parser.add_argument('--token-ttl', type=int, default=TOKEN_TTL,
+                            help='Seconds a bearer token from POST /auth/token stays valid')
+    arg_parser.add_argument('--keep-alive-timeout', type=float, default=SMSAPIServer.keep_alive_timeout,
+                            help='Seconds to hold an idle connection open for its next request')
+    arg_parser.add_argument('--max-keep-alive-requests', type=int, default=SMSAPIServer.max_keep_alive_requests,
+                            help='Requests served on one connection before it is closed')
+    arg_parser.add_argument('--log-sample', type=float, default=DEFAULT_SAMPLE_RATE,
+                            help='Fraction of successful requests written to the access log (errors always are)')
+    arg_parser.add_argument('--workers', type=int, default=8,
+                            help='Worker threads handling requests concurrently; 1 runs single-threaded')
+    args = arg_parser.parse_args()
+    
     # Check if XML file exists
     if not os.path.exists(XML_FILE_PATH):
         print(f"Error: XML file not found at {XML_FILE_PATH}")
         print("Please ensure the modified_sms_v2.xml file exists in the data/raw/ directory")
         return
     
+    # Tokens survive a restart only if the signing secret is set
+    token_secret = os.environ.get('MOMO_TOKEN_SECRET')
+    authenticator = Authenticator(CredentialStore.load(args.credentials),
+                                  TokenSigner(token_secret.encode() if token_secret else None, args.token_ttl))
+    
     # Create server
-    server = SMSAPIServer((HOST, PORT), AuthenticatedHTTPRequestHandler, XML_FILE_PATH)
+    if args.store == 'sqlite':
+        store = SQLiteTransactionStore(args.db)
+    elif args.store == 'snapshot':
+        store = SnapshotTransactionStore(args.snapshot)
+    else:
+        store = STORE_BACKENDS[args.store]()
+    cache_bytes = int(args.cache_mb * 1024 * 1024)
+    if args.workers > 1:
+        server = ThreadPoolSMSAPIServer((HOST, PORT), AuthenticatedHTTPRequestHandler, XML_FILE_PATH,
+                                        store, workers=args.workers, cache_bytes=cache_bytes,
+                                        authenticator=authenticator)
+    else:
+        server = SMSAPIServer((HOST, PORT), AuthenticatedHTTPRequestHandler, XML_FILE_PATH, store, cache_bytes,
+                              authenticator)
+    server.keep_alive_timeout = args.keep_alive_timeout
+    server.max_keep_alive_requests = args.max_keep_alive_requests
+    server.access_log.sample_rate = args.log_sample
     
     print(f"MoMo SMS API Server starting...")
-    print(f"Server running at http://{HOST}:{PORT}")
-    print(f"Loaded {len(server.sms_processor.transactions)} transactions from XML")
-    print(f"Authentication required - use Basic Auth")
+    print(f"Server running at http://{HOST}:{PORT} ({args.workers} worker threads)")
+    print(f"Loaded {len(server.sms_processor.store)} transactions from XML ({args.store} store)")
+    print(f"Authentication required - use Basic Auth or a bearer token from POST /auth/token")
     print(f"Available endpoints:")
     print(f"   GET    /transactions           - List all transactions")
     print(f"   GET    /transactions/{{id}}     - Get specific transaction")
+    print(f"   GET    /transactions/{{id}}/raw - Original SMS of a transaction")
     print(f"   POST   /transactions           - Create new transaction")
+    print(f"   POST   /auth/token             - Bearer token for the authenticated user")
     print(f"   PUT    /transactions/{{id}}     - Update transaction")
     print(f"   DELETE /transactions/{{id}}     - Delete transaction")
+    print(f"   GET    /stats                  - Amount statistics per type, currency and period")
     print(f"   GET    /performance            - DSA performance comparison")
-    print(f"\nValid credentials:")
+    print(f"   GET    /metrics                - Request metrics (Prometheus text format)")
+    print(f"\nDemo credentials (in {DEFAULT_CREDENTIALS_FILE}):")
     print(f"   admin:password123")
     print(f"   user:momo2024")
     print(f"   api:sms_data")
@@ -461,7 +1333,7 @@ def main():
         server.serve_forever()
     except KeyboardInterrupt:
         print(f"\nServer stopped")
-        server.shutdown()
+        server.server_close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Aggregate Rollups for the MoMo SMS REST API
+
+Running amount statistics (count, sum, min, max, mean) behind GET /stats.
+SMSDataProcessor keeps them up to date on every create, update and delete,
+so a /stats request merges pre-aggregated buckets instead of scanning every
+transaction.
+
+The finest bucket is one hour of one transaction type in one currency.
+Queries merge those into totals per type, per currency and per hour, day or
+month, over an optional time window. Hours the window only partly covers
+are counted from their transactions instead, which the caller looks up in
+the timestamp index (see partial_hours).
+"""
+
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Any, Optional, Iterable, List, Tuple
+from api.store import EPOCH, timestamp_to_micros
+
+HOUR_MICROS = 3_600_000_000
+
+# Time bucket granularities supported by /stats, as strftime formats
+TIME_BUCKET_FORMATS = {
+    'hour': '%Y-%m-%dT%H:00',
+    'day': '%Y-%m-%d',
+    'month': '%Y-%m'
+}
+
+# Time bucket label for transactions without a parseable timestamp
+UNKNOWN_BUCKET = 'unknown'
+
+class AmountStats:
+    """Count, sum, min and max of a multiset of amounts that supports removal
+
+    Amounts are kept as value -> multiplicity, so min and max only need a scan
+    of the distinct values when the current extreme is removed.
+    """
+
+    __slots__ = ('count', 'total', 'minimum', 'maximum', '_amounts')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self._amounts = Counter()
+
+    def add(self, amount: float):
+        """Count one amount"""
+        self.count += 1
+        self.total += amount
+        self._amounts[amount] += 1
+        if self.minimum is None or amount < self.minimum:
+            self.minimum = amount
+        if self.maximum is None or amount > self.maximum:
+            self.maximum = amount
+
+    def remove(self, amount: float):
+        """Uncount one amount"""
+        self._amounts[amount] -= 1
+        if self._amounts[amount] <= 0:
+            del self._amounts[amount]
+            if amount == self.minimum:
+                self.minimum = min(self._amounts, default=None)
+            if amount == self.maximum:
+                self.maximum = max(self._amounts, default=None)
+        self.count -= 1
+        self.total = self.total - amount if self.count else 0.0
+
+    def merge_into(self, summary: Dict[str, Any]):
+        """Fold these statistics into a summary dict built by new_summary()"""
+        if not self.count:
+            return
+        summary['count'] += self.count
+        summary['sum'] += self.total
+        if summary['min'] is None or self.minimum < summary['min']:
+            summary['min'] = self.minimum
+        if summary['max'] is None or self.maximum > summary['max']:
+            summary['max'] = self.maximum
+
+def new_summary() -> Dict[str, Any]:
+    """Empty summary for merging AmountStats"""
+    return {'count': 0, 'sum': 0.0, 'min': None, 'max': None, 'mean': None}
+
+def finish_summary(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill in the mean and round the sum of a merged summary"""
+    summary['sum'] = round(summary['sum'], 2)
+    if summary['count']:
+        summary['mean'] = round(summary['sum'] / summary['count'], 2)
+    return summary
+
+class TransactionRollups:
+    """Hourly amount rollups per transaction type and currency"""
+
+    def __init__(self):
+        self.build([])
+
+    def build(self, transactions: Iterable[Dict[str, Any]]):
+        """Rebuild every rollup from scratch"""
+        # hour (epoch micros, or None) -> (transaction_type, currency) -> AmountStats
+        self._buckets = {}
+        # Known hours in order, for windowed queries
+        self._hours = []
+        for tx in transactions:
+            self.add(tx)
+
+    def add(self, tx: Dict[str, Any]):
+        """Count a new transaction"""
+        key = self._bucket_key(tx)
+        if key is None:
+            return
+        hour, group = key
+        groups = self._buckets.get(hour)
+        if groups is None:
+            groups = self._buckets[hour] = {}
+            if hour is not None:
+                insort(self._hours, hour)
+        stats = groups.get(group)
+        if stats is None:
+            stats = groups[group] = AmountStats()
+        stats.add(float(tx['amount']))
+
+    def remove(self, tx: Dict[str, Any]):
+        """Uncount a transaction"""
+        key = self._bucket_key(tx)
+        if key is None:
+            return
+        hour, group = key
+        groups = self._buckets.get(hour)
+        stats = groups.get(group) if groups is not None else None
+        if stats is None:
+            return
+
+        stats.remove(float(tx['amount']))
+        if not stats.count:
+            del groups[group]
+            if not groups:
+                del self._buckets[hour]
+                if hour is not None:
+                    del self._hours[bisect_left(self._hours, hour)]
+
+    def update(self, old_tx: Dict[str, Any], new_tx: Dict[str, Any]):
+        """Recount a transaction after an update"""
+        self.remove(old_tx)
+        self.add(new_tx)
+
+    @staticmethod
+    def partial_hours(start: Optional[int] = None, end: Optional[int] = None) -> List[Tuple[int, int]]:
+        """(start, end) ranges of a window that only cover part of an hour, in time order"""
+        if start is not None and end is not None and start >= end:
+            return []
+        ranges = []
+        if start is not None and start % HOUR_MICROS:
+            ranges.append((start, start - start % HOUR_MICROS + HOUR_MICROS))
+        if end is not None and end % HOUR_MICROS:
+            end_hour = end - end % HOUR_MICROS
+            if ranges and ranges[0][1] > end_hour:
+                # start and end fall in the same hour
+                ranges[0] = (start, end)
+            else:
+                ranges.append((end_hour if start is None else max(start, end_hour), end))
+        return ranges
+
+    def query(self, bucket: str = 'day', start: Optional[int] = None, end: Optional[int] = None,
+              partial_transactions: Iterable[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        """
+        Amount statistics overall, per transaction type, per currency and per time bucket
+
+        start (inclusive) and end (exclusive) are epoch microseconds. Hours
+        wholly inside the window come from the rollups; partial_transactions
+        must be the transactions in the partial_hours(start, end) ranges.
+        Transactions without a timestamp are only included when there is no
+        window. Runs in O(populated hours in the window + partial transactions).
+        """
+        time_format = TIME_BUCKET_FORMATS[bucket]
+        windowed = start is not None or end is not None
+
+        # Populated hours that start at or after start and end by end
+        low = 0 if start is None else bisect_left(self._hours, -(-start // HOUR_MICROS) * HOUR_MICROS)
+        high = len(self._hours) if end is None else bisect_left(self._hours, end - end % HOUR_MICROS)
+        buckets = [(hour, self._buckets[hour]) for hour in self._hours[low:high]]
+
+        partial = TransactionRollups()
+        for tx in partial_transactions:
+            partial.add(tx)
+        if partial._hours:
+            buckets.extend((hour, partial._buckets[hour]) for hour in partial._hours)
+            buckets.sort(key=lambda bucket_item: bucket_item[0])
+        if not windowed and None in self._buckets:
+            buckets.append((None, self._buckets[None]))
+
+        overall = new_summary()
+        by_type, by_currency, by_time = {}, {}, {}
+        for hour, groups in buckets:
+            if hour is None:
+                label = UNKNOWN_BUCKET
+            else:
+                label = (EPOCH + timedelta(microseconds=hour)).strftime(time_format)
+            for (transaction_type, currency), stats in groups.items():
+                stats.merge_into(overall)
+                stats.merge_into(by_type.setdefault(transaction_type, new_summary()))
+                stats.merge_into(by_currency.setdefault(currency, new_summary()))
+                stats.merge_into(by_time.setdefault(label, new_summary()))
+
+        return {
+            'overall': finish_summary(overall),
+            'by_transaction_type': {key: finish_summary(by_type[key]) for key in sorted(by_type)},
+            'by_currency': {key: finish_summary(by_currency[key]) for key in sorted(by_currency)},
+            f'by_{bucket}': {key: finish_summary(value) for key, value in by_time.items()}
+        }
+
+    @staticmethod
+    def _bucket_key(tx: Dict[str, Any]) -> Optional[tuple]:
+        """(hour, (transaction_type, currency)) for a transaction, or None without a numeric amount"""
+        amount = tx.get('amount')
+        if not isinstance(amount, (int, float)) or isinstance(amount, bool):
+            return None
+        micros = timestamp_to_micros(tx.get('timestamp'))
+        hour = None if micros is None else micros - micros % HOUR_MICROS
+        group = (str(tx.get('transaction_type') or 'unknown'), str(tx.get('currency') or 'unknown'))
+        return hour, group
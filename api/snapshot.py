@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+Binary Transaction Snapshots for the MoMo SMS REST API
+
+A snapshot holds the same transactions as transactions.json in a layout that
+can be memory-mapped and read one record at a time, so the API starts without
+parsing anything:
+
+    header        magic, version and the offset/size of every section
+    records       one fixed-width record per transaction, sorted by ID:
+                  id, timestamp (epoch micros), amount, balance, fee,
+                  type/currency/status category codes, a field presence
+                  mask, and string numbers for sender, receiver,
+                  reference number and message (-1 when absent)
+    offsets       (string count + 1) uint64 heap offsets; string i is
+                  heap[offsets[i]:offsets[i + 1]]
+    heap          UTF-8 string bytes (names are stored once and shared)
+    metadata      small JSON: category values, plus the fields of any
+                  record that do not fit the fixed layout
+
+SnapshotTransactionStore serves reads straight from the mapping and keeps
+writes in memory on top of it. JSON remains the export format.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from typing import Dict, Any, Optional, Iterator, Iterable, List
+from api.store import (TRANSACTION_FIELDS, NUMERIC_FIELDS, CATEGORY_FIELDS, INTERNED_STRING_FIELDS,
+                       STRING_FIELDS, EPOCH, NO_TIMESTAMP, micros_to_timestamp)
+
+DEFAULT_SNAPSHOT_FILE = 'data/processed/transactions.snapshot'
+
+SNAPSHOT_MAGIC = b'MOMOSNAP'
+SNAPSHOT_VERSION = 1
+
+# magic, version, record size, reserved, record count, records offset,
+# offsets offset, string count, heap offset, heap size, metadata offset,
+# metadata size
+HEADER = struct.Struct('<8sHHI8Q')
+
+# id, timestamp, amount, balance, fee, transaction_type, currency, status,
+# presence mask, sender, receiver, reference_number, message
+RECORD = struct.Struct('<qqdddHHHHqqqq')
+OFFSET = struct.Struct('<Q')
+
+RECORD_STRING_FIELDS = INTERNED_STRING_FIELDS + STRING_FIELDS
+MICROSECOND = timedelta(microseconds=1)
+
+# Position of each stored field in a RECORD tuple, and its presence mask bit
+RECORD_SLOTS = {
+    'timestamp': 1, 'amount': 2, 'balance': 3, 'fee': 4,
+    'transaction_type': 5, 'currency': 6, 'status': 7,
+    'sender': 9, 'receiver': 10, 'reference_number': 11, 'message': 12
+}
+PRESENT_SLOT = 8
+FIELD_BITS = {field: 1 << bit for bit, field in enumerate(TRANSACTION_FIELDS)}
+
+def _canonical_micros(value: Any) -> Optional[int]:
+    """Epoch micros of a naive ISO timestamp that micros_to_timestamp() reproduces exactly, else None"""
+    if not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is not None or dt.isoformat() != value:
+        return None
+    return (dt - EPOCH) // MICROSECOND
+
+class _SnapshotEncoder:
+    """Packs transactions into snapshot records, heap strings and metadata
+
+    Starts empty, or from the categories, extras and string count/heap size
+    of an existing snapshot so its sections can be copied as they are and
+    the new records appended after them.
+    """
+
+    def __init__(self, categories: Optional[Dict[str, List[str]]] = None,
+                 extras: Optional[Dict[str, Dict[str, Any]]] = None, string_count: int = 0, heap_size: int = 0):
+        self.categories = categories or {field: [] for field in CATEGORY_FIELDS}
+        self.category_codes = {field: {value: code for code, value in enumerate(values)}
+                               for field, values in self.categories.items()}
+        self.extras = extras if extras is not None else {}
+        self.records = bytearray()
+        self.heap = bytearray()
+        # End offset of each string added here (the first starts at heap_size)
+        self.offsets = array('Q')
+        self.string_base = string_count
+        self.heap_base = heap_size
+        # Interned strings added here (names already in a copied heap are stored again)
+        self.interned = {}
+        self.count = 0
+
+    def _string_number(self, value: str, intern: bool) -> int:
+        if intern and value in self.interned:
+            return self.interned[value]
+        self.heap.extend(value.encode('utf-8'))
+        self.offsets.append(self.heap_base + len(self.heap))
+        number = self.string_base + len(self.offsets) - 1
+        if intern:
+            self.interned[value] = number
+        return number
+
+    def add(self, tx: Dict[str, Any]):
+        """Pack one transaction (call in ID order)"""
+        record = [tx['id'], NO_TIMESTAMP, 0.0, 0.0, 0.0, 0, 0, 0, 1, -1, -1, -1, -1]
+        leftover = None
+
+        for field, value in tx.items():
+            slot = RECORD_SLOTS.get(field)
+            stored = False
+            if slot is None:
+                stored = field == 'id'
+            elif field in NUMERIC_FIELDS:
+                # Integers stay in the extras, so they are not read back as floats
+                if isinstance(value, float):
+                    record[slot] = value
+                    stored = True
+            elif field in CATEGORY_FIELDS:
+                if isinstance(value, str):
+                    codes = self.category_codes[field]
+                    code = codes.get(value)
+                    if code is None:
+                        code = codes[value] = len(self.categories[field])
+                        self.categories[field].append(value)
+                    record[slot] = code
+                    stored = True
+            elif field == 'timestamp':
+                micros = _canonical_micros(value)
+                if micros is not None:
+                    record[slot] = micros
+                    stored = True
+            elif isinstance(value, str):
+                record[slot] = self._string_number(value, field in INTERNED_STRING_FIELDS)
+                stored = True
+
+            if not stored:
+                if leftover is None:
+                    leftover = self.extras[str(tx['id'])] = {}
+                leftover[field] = value
+            elif slot is not None:
+                record[PRESENT_SLOT] |= FIELD_BITS[field]
+
+        self.records += RECORD.pack(*record)
+        self.count += 1
+
+    def offset_bytes(self) -> bytes:
+        """The added string offsets as little-endian uint64"""
+        offsets = array('Q', self.offsets)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        return offsets.tobytes()
+
+    def metadata(self) -> bytes:
+        return json.dumps({'categories': self.categories, 'extras': self.extras}, ensure_ascii=False).encode('utf-8')
+
+def _write_sections(snapshot_file: str, count: int, string_count: int, records: Iterable[bytes],
+                    offset_table: Iterable[bytes], heap: Iterable[bytes], metadata: bytes) -> str:
+    """Write a snapshot from its sections (each an iterable of byte chunks) to a
+    temporary file next to snapshot_file; returns the temporary file's path"""
+    temporary_file = snapshot_file + '.tmp'
+    sizes = {}
+    with open(temporary_file, 'wb') as f:
+        # Header first as a placeholder: section sizes are known once written
+        f.write(bytes(HEADER.size))
+        for name, chunks in (('records', records), ('offsets', offset_table), ('heap', heap)):
+            sizes[name] = sum(f.write(chunk) for chunk in chunks)
+        f.write(metadata)
+
+        records_offset = HEADER.size
+        offsets_offset = records_offset + sizes['records']
+        heap_offset = offsets_offset + sizes['offsets']
+        metadata_offset = heap_offset + sizes['heap']
+        f.seek(0)
+        f.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, RECORD.size, 0, count, records_offset,
+                            offsets_offset, string_count, heap_offset, sizes['heap'],
+                            metadata_offset, len(metadata)))
+    return temporary_file
+
+def write_snapshot(transactions: Iterable[Dict[str, Any]], snapshot_file: str = DEFAULT_SNAPSHOT_FILE) -> int:
+    """
+    Write transactions to a snapshot file
+
+    The file is written next to the target and renamed over it, so a reader
+    that has the old snapshot mapped keeps a consistent view (on POSIX;
+    Windows refuses to replace a mapped file, so close readers first).
+
+    Returns:
+        Number of transactions written
+    """
+    encoder = _SnapshotEncoder()
+    for tx in sorted(transactions, key=lambda tx: tx['id']):
+        encoder.add(tx)
+
+    temporary_file = _write_sections(snapshot_file, encoder.count, len(encoder.offsets),
+                                     [encoder.records], [OFFSET.pack(0), encoder.offset_bytes()],
+                                     [encoder.heap], encoder.metadata())
+    os.replace(temporary_file, snapshot_file)
+    return encoder.count
+
+class _RecordIds:
+    """Read-only sequence view of the record IDs, for bisecting the mapping"""
+
+    def __init__(self, snapshot: 'SnapshotReader'):
+        self._snapshot = snapshot
+
+    def __len__(self) -> int:
+        return self._snapshot.count
+
+    def __getitem__(self, index: int) -> int:
+        return self._snapshot.record_id(index)
+
+class SnapshotReader:
+    """Memory-mapped snapshot file; records are decoded only when asked for"""
+
+    def __init__(self, snapshot_file: str):
+        self.snapshot_file = snapshot_file
+        with open(snapshot_file, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, record_size, _, self.count, self._records_offset, self._offsets_offset,
+         self._string_count, self._heap_offset, self._heap_size, metadata_offset,
+         metadata_size) = HEADER.unpack_from(self._map)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or record_size != RECORD.size:
+            self._map.close()
+            raise ValueError(f"Not a version {SNAPSHOT_VERSION} transaction snapshot: {snapshot_file}")
+
+        metadata = json.loads(self._map[metadata_offset:metadata_offset + metadata_size].decode('utf-8'))
+        self._categories = metadata['categories']
+        self._extras = {int(tx_id): fields for tx_id, fields in metadata['extras'].items()}
+        self.ids = _RecordIds(self)
+        self._first_id = self.record_id(0) if self.count else 0
+
+    def close(self):
+        """Unmap the file"""
+        self._map.close()
+
+    def _chunks(self, start: int, size: int, chunk_size: int = 1 << 24) -> Iterator[bytes]:
+        """Bytes of a section of the file, in pieces of at most chunk_size"""
+        for offset in range(start, start + size, chunk_size):
+            yield self._map[offset:min(offset + chunk_size, start + size)]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self.record(index) for index in range(self.count))
+
+    @property
+    def max_id(self) -> int:
+        """Largest transaction ID in the snapshot (0 when empty)"""
+        return self.record_id(self.count - 1) if self.count else 0
+
+    def record_id(self, index: int) -> int:
+        """ID of the record at an index, without decoding the rest of it"""
+        return struct.unpack_from('<q', self._map, self._records_offset + index * RECORD.size)[0]
+
+    def find(self, transaction_id: int) -> Optional[int]:
+        """Record index of a transaction ID, by binary search over the mapping
+
+        ETL IDs are consecutive, so the record at the ID's distance from the
+        first ID is tried before searching.
+        """
+        guess = transaction_id - self._first_id
+        if 0 <= guess < self.count and self.record_id(guess) == transaction_id:
+            return guess
+        index = bisect_left(self.ids, transaction_id)
+        if index < self.count and self.record_id(index) == transaction_id:
+            return index
+        return None
+
+    def first_after(self, transaction_id: int) -> int:
+        """Index of the first record with an ID greater than transaction_id"""
+        return bisect_right(self.ids, transaction_id)
+
+    def string(self, number: int) -> str:
+        """Decode string number from the heap"""
+        start, end = struct.unpack_from('<QQ', self._map, self._offsets_offset + number * OFFSET.size)
+        return self._map[self._heap_offset + start:self._heap_offset + end].decode('utf-8')
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """Decode the record at an index into a transaction dict"""
+        (tx_id, timestamp, amount, balance, fee, transaction_type, currency, status, present,
+         sender, receiver, reference_number, message) = RECORD.unpack_from(
+            self._map, self._records_offset + index * RECORD.size)
+        values = {
+            'id': tx_id,
+            'transaction_type': transaction_type, 'currency': currency, 'status': status,
+            'amount': amount, 'balance': balance, 'fee': fee,
+            'sender': sender, 'receiver': receiver,
+            'reference_number': reference_number, 'message': message
+        }
+
+        tx = {}
+        for bit, field in enumerate(TRANSACTION_FIELDS):
+            if not present & (1 << bit):
+                continue
+            if field in CATEGORY_FIELDS:
+                tx[field] = self._categories[field][values[field]]
+            elif field in RECORD_STRING_FIELDS:
+                tx[field] = self.string(values[field])
+            elif field == 'timestamp':
+                tx[field] = micros_to_timestamp(timestamp)
+            else:
+                tx[field] = values[field]
+
+        extras = self._extras.get(tx_id)
+        if extras:
+            tx.update(extras)
+        return tx
+
+class SnapshotTransactionStore:
+    """Transaction store served from a memory-mapped snapshot
+
+    Opening the store maps the file and reads only the header, so startup
+    time does not depend on the number of transactions. Reads decode single
+    records from the mapping on demand. Writes are kept in memory on top of
+    the snapshot (added and updated transactions as dicts, deleted snapshot
+    IDs in a set); load() writes a new snapshot.
+    """
+
+    # The mapping is read-only and in-memory versions are replaced, never mutated
+    CONCURRENT_READS = True
+
+    # Contents come from the snapshot file, so an existing snapshot is not
+    # reloaded from JSON unless the JSON is newer (see is_stale; in-memory
+    # writes are not saved back to it)
+    PERSISTENT = True
+
+    # Only this process writes to it
+    SHARED = False
+
+    def __init__(self, snapshot_file: str = DEFAULT_SNAPSHOT_FILE):
+        self.snapshot_file = snapshot_file
+        self._snapshot = None
+        if os.path.exists(snapshot_file):
+            self._snapshot = SnapshotReader(snapshot_file)
+        self._reset_overlay()
+
+    def _reset_overlay(self):
+        """Drop in-memory writes"""
+        # ID -> transaction dict for added and updated transactions
+        self._overlay = {}
+        # Snapshot IDs that were deleted
+        self._deleted = set()
+        # IDs added after the snapshot, in order (may include deleted ones)
+        self._added = []
+        self._next_id = (self._snapshot.max_id if self._snapshot else 0) + 1
+
+    def load(self, transactions: Iterable[Dict[str, Any]]):
+        """Replace the store contents by writing and mapping a new snapshot"""
+        # Written aside and renamed only once the old file is unmapped, which Windows requires
+        new_file = self.snapshot_file + '.new'
+        write_snapshot(transactions, new_file)
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+        os.replace(new_file, self.snapshot_file)
+        self._snapshot = SnapshotReader(self.snapshot_file)
+        self._reset_overlay()
+
+    def close(self):
+        """Unmap the snapshot"""
+        if self._snapshot is not None:
+            self._snapshot.close()
+
+    def is_stale(self, source_file: str) -> bool:
+        """Whether source_file (e.g. the ETL's JSON output) was written after the snapshot"""
+        if self._snapshot is None or not os.path.exists(source_file):
+            return False
+        return os.stat(self.snapshot_file).st_mtime_ns < os.stat(source_file).st_mtime_ns
+
+    def _snapshot_count(self) -> int:
+        return self._snapshot.count if self._snapshot else 0
+
+    def _in_snapshot(self, transaction_id: int) -> bool:
+        return self._snapshot is not None and self._snapshot.find(transaction_id) is not None
+
+    def __len__(self) -> int:
+        added = sum(1 for tx_id in self._added if tx_id in self._overlay)
+        return self._snapshot_count() - len(self._deleted) + added
+
+    def __contains__(self, transaction_id: int) -> bool:
+        return self.get(transaction_id) is not None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.iter_after(0)
+
+    def ids(self) -> Iterator[int]:
+        """Iterate live transaction IDs in ID order"""
+        deleted = self._deleted
+        for index in range(self._snapshot_count()):
+            tx_id = self._snapshot.record_id(index)
+            if tx_id not in deleted:
+                yield tx_id
+        overlay = self._overlay
+        for position in range(len(self._added)):
+            tx_id = self._added[position]
+            if tx_id in overlay:
+                yield tx_id
+
+    def iter_after(self, after_id: int) -> Iterator[Dict[str, Any]]:
+        """Iterate transactions with ID greater than after_id, in ID order"""
+        overlay = self._overlay
+        deleted = self._deleted
+        if self._snapshot is not None:
+            snapshot = self._snapshot
+            for index in range(snapshot.first_after(after_id), snapshot.count):
+                tx_id = snapshot.record_id(index)
+                if tx_id in deleted:
+                    continue
+                tx = overlay.get(tx_id)
+                yield tx if tx is not None else snapshot.record(index)
+
+        # Added IDs are all above the snapshot's and in increasing order
+        added = self._added
+        for position in range(bisect_right(added, after_id), len(added)):
+            tx = overlay.get(added[position])
+            if tx is not None:
+                yield tx
+
+    def get(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        """Get a transaction by ID"""
+        tx = self._overlay.get(transaction_id)
+        if tx is not None:
+            return tx
+        if self._snapshot is None or transaction_id in self._deleted:
+            return None
+        index = self._snapshot.find(transaction_id)
+        return self._snapshot.record(index) if index is not None else None
+
+    def add(self, transaction_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a transaction, assigning it the next ID"""
+        new_id = self._next_id
+        self._next_id += 1
+        transaction_data['id'] = new_id
+
+        self._overlay[new_id] = transaction_data
+        self._added.append(new_id)
+        return transaction_data
+
+    def update(self, transaction_id: int, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update a transaction (its ID cannot be changed); the new version lives in memory"""
+        tx = self.get(transaction_id)
+        if tx is None:
+            return None
+
+        updated_tx = {**tx, **update_data, 'id': transaction_id}
+        self._overlay[transaction_id] = updated_tx
+        return updated_tx
+
+    def delete(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        """Delete a transaction"""
+        tx = self.get(transaction_id)
+        if tx is None:
+            return None
+
+        self._overlay.pop(transaction_id, None)
+        if self._in_snapshot(transaction_id):
+            self._deleted.add(transaction_id)
+        return tx
+
+def append_to_snapshot(new_transactions: List[Dict[str, Any]], snapshot_file: str = DEFAULT_SNAPSHOT_FILE) -> int:
+    """
+    Add transactions to a snapshot
+
+    Transactions whose ID is already in the snapshot are skipped, so
+    re-applying an ETL batch after a failed run adds nothing. When every new
+    ID is above the snapshot's (as with incremental ETL runs), the existing
+    records, string offsets and heap are copied byte for byte and only the
+    new transactions are encoded; with none the file is left alone.
+    Otherwise the snapshot is decoded and rewritten in ID order.
+
+    Returns:
+        Number of transactions in the snapshot
+    """
+    if not os.path.exists(snapshot_file):
+        return write_snapshot(new_transactions, snapshot_file)
+
+    snapshot = SnapshotReader(snapshot_file)
+    try:
+        new_transactions = sorted((tx for tx in new_transactions if snapshot.find(tx['id']) is None),
+                                  key=lambda tx: tx['id'])
+        if not new_transactions:
+            return snapshot.count
+        if new_transactions[0]['id'] <= snapshot.max_id:
+            transactions = list(snapshot) + new_transactions
+            snapshot.close()
+            return write_snapshot(transactions, snapshot_file)
+
+        extras = {str(tx_id): fields for tx_id, fields in snapshot._extras.items()}
+        encoder = _SnapshotEncoder(snapshot._categories, extras, snapshot._string_count, snapshot._heap_size)
+        for tx in new_transactions:
+            encoder.add(tx)
+
+        temporary_file = _write_sections(
+            snapshot_file, snapshot.count + encoder.count, snapshot._string_count + len(encoder.offsets),
+            chain(snapshot._chunks(snapshot._records_offset, snapshot.count * RECORD.size), [encoder.records]),
+            chain(snapshot._chunks(snapshot._offsets_offset, (snapshot._string_count + 1) * OFFSET.size),
+                  [encoder.offset_bytes()]),
+            chain(snapshot._chunks(snapshot._heap_offset, snapshot._heap_size), [encoder.heap]),
+            encoder.metadata())
+        count = snapshot.count + encoder.count
+    finally:
+        snapshot.close()
+
+    # Replaced only once unmapped, which Windows requires
+    os.replace(temporary_file, snapshot_file)
+    return count
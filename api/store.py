@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Transaction Stores for the MoMo SMS REST API
+
+SMSDataProcessor keeps its transactions in one of these stores:
+- DictTransactionStore: one Python dict per transaction (default)
+- ColumnarTransactionStore: typed column arrays, interned category codes and
+  a UTF-8 string pool; dicts are only built when a response is serialized
+
+Both stores (and SQLiteTransactionStore in api/db.py) expose the same
+interface: load, get, add, update, delete, ids, iter_after, len() and
+iteration in ID order. Stores are not thread-safe on their
+own; SMSDataProcessor serializes writers, and also readers when a store's
+CONCURRENT_READS is False. A store that other processes can write to sets
+SHARED and reports their writes from changed_elsewhere().
+"""
+
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Iterator, Iterable
+
+# Standard transaction fields, in the order written by the ETL parser
+TRANSACTION_FIELDS = (
+    'id', 'transaction_type', 'amount', 'currency', 'sender', 'receiver',
+    'timestamp', 'status', 'reference_number', 'balance', 'fee', 'message'
+)
+
+NUMERIC_FIELDS = ('amount', 'balance', 'fee')
+CATEGORY_FIELDS = ('transaction_type', 'currency', 'status')
+INTERNED_STRING_FIELDS = ('sender', 'receiver')
+STRING_FIELDS = ('reference_number', 'message')
+
+# Timestamps are stored as microseconds since this (naive) epoch
+EPOCH = datetime(1970, 1, 1)
+NO_TIMESTAMP = -2 ** 63
+
+def timestamp_to_micros(value: Any) -> Optional[int]:
+    """Convert an ISO-8601 timestamp string to microseconds since the epoch"""
+    if not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None) - dt.utcoffset()
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+def micros_to_timestamp(micros: int) -> str:
+    """Convert microseconds since the epoch back to an ISO-8601 string"""
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+class DictTransactionStore:
+    """Keeps each transaction as a dict in a single ID-keyed dict
+
+    The ID dict is the single source of truth. An append-only array of IDs
+    records the ID order for ordered scans; deleted IDs stay in it as
+    tombstones (skipped because they are missing from the dict) until
+    enough accumulate to compact it. New IDs come from a monotonic counter,
+    so create, update and delete are all O(1) amortized.
+    """
+
+    # Compact the ID array once dead IDs outnumber live ones (and exceed this count)
+    COMPACT_MIN_DEAD = 1024
+
+    # Stored dicts are never mutated, so reads are safe alongside a writer
+    CONCURRENT_READS = True
+
+    # Contents live in memory only and are reloaded on every start
+    PERSISTENT = False
+
+    # Only this process writes to it
+    SHARED = False
+
+    def __init__(self, transactions: Iterable[Dict[str, Any]] = ()):
+        self.load(transactions)
+
+    def load(self, transactions: Iterable[Dict[str, Any]]):
+        """Replace the store contents with the given transactions"""
+        self.transaction_dict = {tx['id']: tx for tx in transactions}
+        self._ids = array('q', sorted(self.transaction_dict))
+        self._next_id = self._ids[-1] + 1 if self._ids else 1
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self.transaction_dict)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        transaction_dict = self.transaction_dict
+        for tx_id in self._ids:
+            tx = transaction_dict.get(tx_id)
+            if tx is not None:
+                yield tx
+
+    def __contains__(self, transaction_id: int) -> bool:
+        return transaction_id in self.transaction_dict
+
+    def ids(self) -> Iterator[int]:
+        """Iterate live transaction IDs in ID order"""
+        transaction_dict = self.transaction_dict
+        return (tx_id for tx_id in self._ids if tx_id in transaction_dict)
+
+    def iter_after(self, after_id: int) -> Iterator[Dict[str, Any]]:
+        """Iterate transactions with ID greater than after_id, in ID order"""
+        ids = self._ids
+        transaction_dict = self.transaction_dict
+        for position in range(bisect_right(ids, after_id), len(ids)):
+            tx = transaction_dict.get(ids[position])
+            if tx is not None:
+                yield tx
+
+    def get(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        """Get a transaction by ID"""
+        return self.transaction_dict.get(transaction_id)
+
+    def add(self, transaction_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a transaction, assigning it the next ID"""
+        new_id = self._next_id
+        self._next_id += 1
+        transaction_data['id'] = new_id
+
+        self.transaction_dict[new_id] = transaction_data
+        self._ids.append(new_id)
+
+        return transaction_data
+
+    def update(self, transaction_id: int, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update a transaction (its ID cannot be changed)
+
+        The stored dict is replaced rather than modified, so readers still
+        serializing the old version never see it change underneath them.
+        """
+        tx = self.transaction_dict.get(transaction_id)
+        if tx is None:
+            return None
+
+        updated_tx = {**tx, **update_data, 'id': transaction_id}
+        self.transaction_dict[transaction_id] = updated_tx
+        return updated_tx
+
+    def delete(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        """Delete a transaction, leaving a tombstone in the ID array"""
+        deleted_tx = self.transaction_dict.pop(transaction_id, None)
+        if deleted_tx is None:
+            return None
+
+        self._dead += 1
+        if self._dead > self.COMPACT_MIN_DEAD and self._dead > len(self.transaction_dict):
+            self.compact()
+        return deleted_tx
+
+    def compact(self):
+        """Drop tombstoned IDs from the ID array"""
+        self._ids = array('q', self.ids())
+        self._dead = 0
+
+class StringPool:
+    """Append-only UTF-8 string heap addressed by integer references
+
+    Overwritten strings stay in the heap; release() counts their bytes as
+    dead so the owner knows when rebuilding the pool is worth it.
+    """
+
+    def __init__(self):
+        self._heap = bytearray()
+        self._offsets = array('q', [0])
+        self._interned = {}
+        self.dead_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the heap and offset table"""
+        return len(self._heap) + self._offsets.itemsize * len(self._offsets)
+
+    def add(self, value: str, intern: bool = False) -> int:
+        """Append a string and return its reference
+
+        Interned strings (names) are stored once and shared between rows;
+        messages are nearly all unique, so they skip the intern table.
+        """
+        if intern:
+            ref = self._interned.get(value)
+            if ref is not None:
+                return ref
+
+        self._heap += value.encode('utf-8')
+        self._offsets.append(len(self._heap))
+        ref = len(self._offsets) - 2
+
+        if intern:
+            self._interned[value] = ref
+        return ref
+
+    def get(self, ref: int) -> str:
+        """Decode the string with the given reference"""
+        return self._heap[self._offsets[ref]:self._offsets[ref + 1]].decode('utf-8')
+
+    def release(self, ref: int):
+        """Count a string that is no longer referenced as dead (never call it for interned strings)"""
+        self.dead_bytes += self._offsets[ref + 1] - self._offsets[ref]
+
+    @property
+    def live_bytes(self) -> int:
+        """Heap bytes still referenced"""
+        return len(self._heap) - self.dead_bytes
+
+class CategoryColumn:
+    """Small-cardinality string column stored as interned integer codes"""
+
+    def __init__(self):
+        self.codes = array('I')
+        self.values = []
+        self._lookup = {}
+
+    def code_for(self, value: str) -> int:
+        """Return the code for a value, interning it on first use"""
+        code = self._lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self._lookup[value] = code
+        return code
+
+class ColumnarTransactionStore:
+    """Compact column-oriented transaction store
+
+    Numeric fields live in typed arrays, type/currency/status are interned
+    category codes, and names, reference numbers and messages live in a
+    string pool. A per-row bitmask records which standard fields are present;
+    non-standard fields, and values that do not fit their column's type
+    (including integer amounts, so they come back as integers), are kept in
+    a small per-row overflow dict. Deletes leave a tombstone, and updated
+    messages and reference numbers leave dead bytes in the string pool;
+    both are reclaimed by compact().
+    """
+
+    # Compact once dead rows outnumber live ones (and exceed this count)
+    COMPACT_MIN_DEAD = 1024
+
+    # ...or once dead string pool bytes outnumber live ones (and exceed this)
+    COMPACT_MIN_DEAD_BYTES = 1024 * 1024
+
+    # Rows are updated in place, so readers must not overlap a writer
+    CONCURRENT_READS = False
+
+    # Contents live in memory only and are reloaded on every start
+    PERSISTENT = False
+
+    # Only this process writes to it
+    SHARED = False
+
+    def __init__(self, transactions: Iterable[Dict[str, Any]] = ()):
+        self.load(transactions)
+
+    def load(self, transactions: Iterable[Dict[str, Any]]):
+        """Replace the store contents with the given transactions"""
+        self._ids = array('q')
+        self._numeric = {field: array('d') for field in NUMERIC_FIELDS}
+        self._timestamps = array('q')
+        self._categories = {field: CategoryColumn() for field in CATEGORY_FIELDS}
+        self._string_refs = {field: array('q') for field in INTERNED_STRING_FIELDS + STRING_FIELDS}
+        self._strings = StringPool()
+        self._present = array('H')
+        self._live = array('B')
+        self._extras = {}
+        self._row_of = {}
+        self._max_id = 0
+        self._dead = 0
+
+        # Rows are kept in ID order so keyset scans can bisect the ID column
+        for tx in sorted(transactions, key=lambda tx: tx['id']):
+            self._append_row(tx)
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, transaction_id: int) -> bool:
+        return transaction_id in self._row_of
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        live = self._live
+        for row in range(len(self._ids)):
+            if live[row]:
+                yield self._materialize(row)
+
+    def ids(self) -> Iterator[int]:
+        """Iterate live transaction IDs in ID order"""
+        live = self._live
+        return (tx_id for row, tx_id in enumerate(self._ids) if live[row])
+
+    def iter_after(self, after_id: int) -> Iterator[Dict[str, Any]]:
+        """Iterate transactions with ID greater than after_id, in ID order"""
+        live = self._live
+        for row in range(bisect_right(self._ids, after_id), len(self._ids)):
+            if live[row]:
+                yield self._materialize(row)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate bytes held by the column arrays and string pool"""
+        columns = [self._ids, self._timestamps, self._present, self._live]
+        columns += list(self._numeric.values()) + list(self._string_refs.values())
+        columns += [column.codes for column in self._categories.values()]
+        return sum(col.itemsize * len(col) for col in columns) + self._strings.nbytes
+
+    def get(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        """Get a transaction by ID, materialized as a dict"""
+        row = self._row_of.get(transaction_id)
+        return self._materialize(row) if row is not None else None
+
+    def add(self, transaction_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a transaction, assigning it the next ID from the monotonic counter"""
+        transaction_data['id'] = self._max_id + 1
+        row = self._append_row(transaction_data)
+        return self._materialize(row)
+
+    def update(self, transaction_id: int, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update a transaction's fields in place"""
+        row = self._row_of.get(transaction_id)
+        if row is None:
+            return None
+
+        for field, value in update_data.items():
+            if field != 'id':
+                self._set_field(row, field, value)
+        updated = self._materialize(row)
+        self._compact_if_wasteful()
+        return updated
+
+    def delete(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        """Delete a transaction, leaving a tombstone in the columns"""
+        row = self._row_of.pop(transaction_id, None)
+        if row is None:
+            return None
+
+        deleted = self._materialize(row)
+        self._live[row] = 0
+        self._extras.pop(row, None)
+        for field in STRING_FIELDS:
+            self._release_string(row, field)
+        self._dead += 1
+
+        self._compact_if_wasteful()
+        return deleted
+
+    def _compact_if_wasteful(self):
+        """Compact when tombstones or dead string bytes outweigh live data"""
+        strings = self._strings
+        if ((self._dead > self.COMPACT_MIN_DEAD and self._dead > len(self._row_of)) or
+                (strings.dead_bytes > self.COMPACT_MIN_DEAD_BYTES and strings.dead_bytes > strings.live_bytes)):
+            self.compact()
+
+    def _release_string(self, row: int, field: str):
+        """Drop a row's reference to its (uninterned) string for field"""
+        refs = self._string_refs[field]
+        if refs[row] != -1:
+            self._strings.release(refs[row])
+            refs[row] = -1
+
+    def compact(self):
+        """Rewrite the columns without tombstoned rows"""
+        live_rows = [self._materialize(row) for row in range(len(self._ids)) if self._live[row]]
+        max_id = self._max_id
+        self.load(live_rows)
+        self._max_id = max_id
+
+    def _append_row(self, tx: Dict[str, Any]) -> int:
+        """Append a transaction as a new row and return the row number"""
+        row = len(self._ids)
+        tx_id = tx['id']
+
+        self._ids.append(tx_id)
+        self._live.append(1)
+        self._present.append(1)
+        self._timestamps.append(NO_TIMESTAMP)
+        for column in self._numeric.values():
+            column.append(0.0)
+        for column in self._categories.values():
+            column.codes.append(0)
+        for column in self._string_refs.values():
+            column.append(-1)
+
+        for field, value in tx.items():
+            if field != 'id':
+                self._set_field(row, field, value)
+
+        self._row_of[tx_id] = row
+        self._max_id = max(self._max_id, tx_id)
+        return row
+
+    def _set_field(self, row: int, field: str, value: Any):
+        """Store one field value in its column, or in the row's overflow dict"""
+        stored = False
+
+        if field in NUMERIC_FIELDS:
+            # Integers go to the overflow dict, so they are not returned as floats
+            if isinstance(value, float):
+                self._numeric[field][row] = value
+                stored = True
+        elif field in CATEGORY_FIELDS:
+            if isinstance(value, str):
+                column = self._categories[field]
+                column.codes[row] = column.code_for(value)
+                stored = True
+        elif field in INTERNED_STRING_FIELDS or field in STRING_FIELDS:
+            intern = field in INTERNED_STRING_FIELDS
+            if not intern:
+                self._release_string(row, field)
+            if isinstance(value, str):
+                self._string_refs[field][row] = self._strings.add(value, intern=intern)
+                stored = True
+        elif field == 'timestamp':
+            micros = timestamp_to_micros(value)
+            self._timestamps[row] = micros if micros is not None else NO_TIMESTAMP
+            # Keep the original text when it does not round-trip exactly
+            stored = micros is not None and micros_to_timestamp(micros) == value
+
+        if field in TRANSACTION_FIELDS:
+            bit = 1 << TRANSACTION_FIELDS.index(field)
+            if stored:
+                self._present[row] |= bit
+            else:
+                self._present[row] &= ~bit
+
+        extras = self._extras.get(row)
+        if stored:
+            if extras and field in extras:
+                del extras[field]
+        else:
+            self._extras.setdefault(row, {})[field] = value
+
+    def _materialize(self, row: int) -> Dict[str, Any]:
+        """Build the dict for a row"""
+        mask = self._present[row]
+        tx = {}
+
+        for bit, field in enumerate(TRANSACTION_FIELDS):
+            if not mask & (1 << bit):
+                continue
+            if field == 'id':
+                tx['id'] = self._ids[row]
+            elif field in NUMERIC_FIELDS:
+                tx[field] = self._numeric[field][row]
+            elif field in CATEGORY_FIELDS:
+                column = self._categories[field]
+                tx[field] = column.values[column.codes[row]]
+            elif field == 'timestamp':
+                tx[field] = micros_to_timestamp(self._timestamps[row])
+            else:
+                tx[field] = self._strings.get(self._string_refs[field][row])
+
+        extras = self._extras.get(row)
+        if extras:
+            tx.update(extras)
+        return tx
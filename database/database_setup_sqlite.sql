@@ -0,0 +1,95 @@
+-- =====================================================
+-- MoMo SMS Data Processing System - SQLite Schema
+-- Embedded persistence for the REST API
+-- =====================================================
+--
+-- Same tables as database_setup.sql, adapted to SQLite:
+-- - AUTO_INCREMENT becomes INTEGER PRIMARY KEY AUTOINCREMENT (IDs never reused)
+-- - ENUM columns become TEXT with CHECK constraints where the API allows it;
+--   transaction_type stays free text so API and ETL types both round-trip
+-- - DECIMAL becomes REAL and DATETIME becomes ISO-8601 TEXT
+-- - Users.phone_number is nullable: most SMS only name the counterparty
+-- - Transactions gains balance and fee columns parsed from the SMS body
+-- - Empty reference numbers are stored as NULL so UNIQUE still holds
+-- - amount and timestamp are nullable and amount may be negative, as the API
+--   accepts such transactions; a NULL status, balance or fee means "not given"
+
+PRAGMA foreign_keys = ON;
+
+-- Users table - Customer information
+CREATE TABLE IF NOT EXISTS Users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    phone_number TEXT UNIQUE,
+    full_name TEXT,
+    account_status TEXT DEFAULT 'active' CHECK (account_status IN ('active', 'suspended', 'inactive')),
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Transaction Categories table - Transaction type classification
+CREATE TABLE IF NOT EXISTS Transaction_Categories (
+    category_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category_name TEXT NOT NULL UNIQUE,
+    description TEXT,
+    rule_pattern TEXT
+);
+
+-- Raw Messages table - Original SMS data
+CREATE TABLE IF NOT EXISTS Raw_Messages (
+    message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    raw_content TEXT NOT NULL,
+    parsed_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    processing_status TEXT DEFAULT 'pending' CHECK (processing_status IN ('pending', 'processed', 'failed', 'ignored'))
+);
+
+-- Transactions table - Main transaction records
+CREATE TABLE IF NOT EXISTS Transactions (
+    transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sender_id INTEGER REFERENCES Users(user_id) ON DELETE SET NULL ON UPDATE CASCADE,
+    receiver_id INTEGER REFERENCES Users(user_id) ON DELETE SET NULL ON UPDATE CASCADE,
+    category_id INTEGER NOT NULL REFERENCES Transaction_Categories(category_id) ON DELETE RESTRICT ON UPDATE CASCADE,
+    message_id INTEGER UNIQUE REFERENCES Raw_Messages(message_id) ON DELETE SET NULL ON UPDATE CASCADE,
+    amount REAL,
+    currency TEXT DEFAULT 'RWF',
+    timestamp TEXT,
+    transaction_type TEXT NOT NULL,
+    status TEXT DEFAULT 'pending',
+    reference_number TEXT UNIQUE,
+    balance REAL,
+    fee REAL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- System Logs table - ETL processing logs
+CREATE TABLE IF NOT EXISTS System_Logs (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    level TEXT NOT NULL CHECK (level IN ('DEBUG', 'INFO', 'WARN', 'ERROR', 'CRITICAL')),
+    message TEXT NOT NULL,
+    context_json TEXT,
+    transaction_id INTEGER REFERENCES Transactions(transaction_id) ON DELETE SET NULL ON UPDATE CASCADE,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- =====================================================
+-- INDEXES FOR PERFORMANCE OPTIMIZATION
+-- =====================================================
+
+CREATE INDEX IF NOT EXISTS idx_users_name ON Users(full_name);
+CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON Transactions(timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_sender ON Transactions(sender_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_receiver ON Transactions(receiver_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_category ON Transactions(category_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_type ON Transactions(transaction_type);
+CREATE INDEX IF NOT EXISTS idx_transactions_amount ON Transactions(amount);
+CREATE INDEX IF NOT EXISTS idx_logs_transaction ON System_Logs(transaction_id);
+
+-- =====================================================
+-- TRANSACTION CATEGORIES
+-- =====================================================
+
+INSERT OR IGNORE INTO Transaction_Categories (category_name, description, rule_pattern) VALUES
+('Transfer', 'Person-to-person money transfer', '.*transfer.*|.*sent.*|.*received.*'),
+('Payment', 'Payment for goods or services', '.*payment.*|.*paid.*|.*purchase.*'),
+('Withdrawal', 'Cash withdrawal from agent or ATM', '.*withdraw.*|.*cash.*|.*agent.*'),
+('Deposit', 'Cash deposit to account', '.*deposit.*|.*top.*up.*'),
+('Airtime', 'Mobile airtime purchase', '.*airtime.*|.*credit.*|.*top.*up.*'),
+('Bill Payment', 'Utility or bill payment', '.*bill.*|.*electricity.*|.*water.*');
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Benchmark Timing for the DSA Module
+
+Times a lookup function over a workload of IDs the way timeit does, but
+keeps every sample so the spread can be reported:
+
+1. calibrate: find how many lookups make one sample last at least
+   MIN_SAMPLE_NS, so timer resolution and loop setup are negligible
+2. warm up: run a few samples and discard them (caches, branch predictors,
+   lazily built structures)
+3. measure: time `repeats` samples with perf_counter_ns and the garbage
+   collector off; each sample is the mean ns per lookup over one pass
+
+Samples are summarised as mean, median, min, max, a 95% bootstrap
+confidence interval of the median and p95_pass_ns, the 95th percentile of
+the per-pass means (pass-to-pass jitter, not the latency of single
+lookups, which are too short to time one by one).
+
+That confidence interval only covers the variation within one process.
+Medians of the same code move by tens of percent between processes (memory
+layout, CPU frequency, other load), so regressions are judged across
+independent runs: combine_runs() merges the results of several processes,
+keeping each run's median. compare_results() then flags a result only when
+the median moved beyond a threshold and every run of one side was slower
+than every run of the other.
+"""
+
+import gc
+import random
+import statistics
+import time
+from typing import Callable, Dict, Any, List, Sequence, Tuple
+
+DEFAULT_WARMUP = 3
+DEFAULT_REPEATS = 30
+
+# Shortest sample, and most lookups per sample
+MIN_SAMPLE_NS = 5_000_000
+MAX_OPS_PER_SAMPLE = 1_000_000
+
+BOOTSTRAP_RESAMPLES = 1000
+
+# Relative median slowdown that counts as a regression (run-to-run noise is
+# easily 10-20% on a shared machine)
+DEFAULT_REGRESSION_THRESHOLD = 0.25
+
+# Independent runs each side needs before compare_results() gives a verdict
+MIN_COMPARE_RUNS = 3
+
+# Fields identifying a result
+RESULT_KEY_FIELDS = ('rows', 'workload', 'algorithm')
+
+def _time_ops(lookup: Callable, ops: Sequence) -> int:
+    """Nanoseconds to call lookup on every item of ops"""
+    start = time.perf_counter_ns()
+    for item in ops:
+        lookup(item)
+    return time.perf_counter_ns() - start
+
+def _cycle(ids: Sequence, count: int) -> List:
+    """First count items of ids repeated"""
+    repeats, remainder = divmod(count, len(ids))
+    return list(ids) * repeats + list(ids[:remainder])
+
+def calibrate(lookup: Callable, ids: Sequence, min_sample_ns: int = MIN_SAMPLE_NS) -> int:
+    """Lookups per sample needed for a sample to last min_sample_ns"""
+    count = 1
+    while count < MAX_OPS_PER_SAMPLE:
+        elapsed = _time_ops(lookup, _cycle(ids, count))
+        if elapsed >= min_sample_ns:
+            break
+        # Aim a little past the target, at most 10x per step
+        count = min(MAX_OPS_PER_SAMPLE, count * min(10, max(2, int(1.2 * min_sample_ns / max(elapsed, 1)))))
+    return count
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def bootstrap_median_ci(samples: Sequence[float], confidence: float = 0.95,
+                        resamples: int = BOOTSTRAP_RESAMPLES) -> Tuple[float, float]:
+    """Percentile bootstrap confidence interval of the median (seeded, so reproducible)"""
+    rng = random.Random(0)
+    size = len(samples)
+    medians = sorted(statistics.median(rng.choices(samples, k=size)) for _ in range(resamples))
+    tail = (1 - confidence) / 2
+    return percentile(medians, tail), percentile(medians, 1 - tail)
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """Statistics of per-pass mean lookup times (ns)"""
+    ordered = sorted(samples)
+    low, high = bootstrap_median_ci(ordered)
+    return {
+        'mean_ns': statistics.fmean(ordered),
+        'median_ns': statistics.median(ordered),
+        'p95_pass_ns': percentile(ordered, 0.95),
+        'min_ns': ordered[0],
+        'max_ns': ordered[-1],
+        'stdev_ns': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        'ci95_low_ns': low,
+        'ci95_high_ns': high
+    }
+
+def measure(lookup: Callable, ids: Sequence, warmup: int = DEFAULT_WARMUP, repeats: int = DEFAULT_REPEATS,
+            min_sample_ns: int = MIN_SAMPLE_NS) -> Dict[str, Any]:
+    """
+    Benchmark lookup over a workload of IDs
+
+    Returns:
+        summarize() statistics plus the sample count, lookups per sample and
+        the raw samples (mean ns per lookup of each pass)
+    """
+    ops = _cycle(ids, calibrate(lookup, ids, min_sample_ns))
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(warmup):
+            _time_ops(lookup, ops)
+        samples = [_time_ops(lookup, ops) / len(ops) for _ in range(repeats)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return {
+        'samples': len(samples),
+        'ops_per_sample': len(ops),
+        **summarize(samples),
+        'raw_ns': samples
+    }
+
+def call_overhead_ns(repeats: int = DEFAULT_REPEATS) -> float:
+    """Median cost of the timing loop and one Python call, included in every result"""
+    return measure(lambda item: None, list(range(1000)), repeats=repeats)['median_ns']
+
+def combine_runs(runs: Sequence[List[Dict[str, Any]]],
+                 key_fields: Sequence[str] = RESULT_KEY_FIELDS) -> List[Dict[str, Any]]:
+    """
+    Merge the results of independent runs of the same benchmark
+
+    Each merged result has the per-run medians (run_medians_ns), their
+    median (median_ns) and range (run_low_ns, run_high_ns), and the
+    statistics of every run's samples pooled. The in-process confidence
+    interval is dropped: it understates run-to-run variation.
+    """
+    merged = {}
+    for results in runs:
+        for result in results:
+            key = tuple(result[field] for field in key_fields)
+            if key not in merged:
+                merged[key] = {'result': result, 'medians': [], 'raw': []}
+            merged[key]['medians'].append(result['median_ns'])
+            merged[key]['raw'] += result.get('raw_ns', [result['median_ns']])
+
+    combined = []
+    for entry in merged.values():
+        pooled = summarize(entry['raw'])
+        medians = entry['medians']
+        result = {field: value for field, value in entry['result'].items()
+                  if field not in pooled and field not in ('raw_ns', 'samples')}
+        result.update({
+            'runs': len(medians),
+            'run_medians_ns': medians,
+            'median_ns': statistics.median(medians),
+            'run_low_ns': min(medians),
+            'run_high_ns': max(medians),
+            'samples': len(entry['raw']),
+            'mean_ns': pooled['mean_ns'],
+            'p95_pass_ns': pooled['p95_pass_ns'],
+            'min_ns': pooled['min_ns'],
+            'max_ns': pooled['max_ns'],
+            'stdev_ns': pooled['stdev_ns']
+        })
+        combined.append(result)
+    return combined
+
+def compare_results(baseline: List[Dict[str, Any]], current: List[Dict[str, Any]],
+                    threshold: float = DEFAULT_REGRESSION_THRESHOLD,
+                    key_fields: Sequence[str] = RESULT_KEY_FIELDS,
+                    min_runs: int = MIN_COMPARE_RUNS) -> List[Dict[str, Any]]:
+    """
+    Match results by key_fields and classify each change
+
+    A result is a 'regression' when its median is more than threshold slower
+    and every one of its runs was slower than every baseline run
+    ('improvement' is the mirror case), otherwise 'unchanged'. Results with
+    fewer than min_runs runs on either side (see combine_runs) are
+    'inconclusive': one process cannot tell a change from run-to-run noise.
+    """
+    previous = {tuple(result[field] for field in key_fields): result for result in baseline}
+    changes = []
+    for result in current:
+        key = tuple(result[field] for field in key_fields)
+        before = previous.get(key)
+        if before is None:
+            continue
+
+        before_runs = before.get('run_medians_ns', [before['median_ns']])
+        current_runs = result.get('run_medians_ns', [result['median_ns']])
+        ratio = result['median_ns'] / before['median_ns'] if before['median_ns'] else 1.0
+        if min(len(before_runs), len(current_runs)) < min_runs:
+            verdict = 'inconclusive'
+        elif ratio > 1 + threshold and min(current_runs) > max(before_runs):
+            verdict = 'regression'
+        elif ratio < 1 - threshold and max(current_runs) < min(before_runs):
+            verdict = 'improvement'
+        else:
+            verdict = 'unchanged'
+
+        changes.append({
+            **dict(zip(key_fields, key)),
+            'baseline_median_ns': before['median_ns'],
+            'median_ns': result['median_ns'],
+            'ratio': ratio,
+            'verdict': verdict
+        })
+    return changes
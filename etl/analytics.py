@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Vectorized Transaction Analytics for MoMo SMS Data
+
+Converts the transactions produced by
+SMSTransactionParser.process_sms_to_transactions() into NumPy arrays once,
+then answers analytics questions with whole-array operations instead of
+Python loops over dicts:
+- group-by sums (count / amount / fees) per type, per period, or both
+- rolling balances and closing balance per period
+- amount percentiles and histograms per type
+
+Requires NumPy, which the rest of the ETL does not: pip install -r
+requirements.txt.
+"""
+
+import warnings
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Iterable, Sequence
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("etl/analytics.py needs NumPy; install it with: pip install -r requirements.txt") from e
+
+# Marks transactions whose timestamp could not be parsed (NaT as int64)
+NO_TIMESTAMP = np.iinfo(np.int64).min
+
+# Naive timestamps are taken as UTC (as in the API), so periods follow the
+# wall-clock dates written by the ETL
+EPOCH = datetime(1970, 1, 1)
+
+# Period granularities and the datetime64 unit each one truncates to
+PERIOD_UNITS = {
+    'hour': 'h',
+    'day': 'D',
+    'month': 'M',
+    'year': 'Y'
+}
+
+class TransactionArrays:
+    """Column arrays for a list of transactions
+
+    Attributes:
+        ids, timestamp_ms: int64 (epoch milliseconds, NO_TIMESTAMP if unknown)
+        amount, fee, balance: float64 (NaN when missing)
+        type_codes: uint16 codes into type_names
+    """
+
+    def __init__(self, ids, amount, fee, balance, timestamp_ms, type_codes, type_names):
+        self.ids = ids
+        self.amount = amount
+        self.fee = fee
+        self.balance = balance
+        self.timestamp_ms = timestamp_ms
+        self.type_codes = type_codes
+        self.type_names = type_names
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable[Dict[str, Any]]) -> 'TransactionArrays':
+        """Build the arrays in a single pass over the transactions"""
+        ids, amounts, fees, balances, timestamps, codes = [], [], [], [], [], []
+        type_names = []
+        code_of = {}
+
+        for tx in transactions:
+            ids.append(tx.get('id', 0))
+            amounts.append(_to_float(tx.get('amount')))
+            fees.append(_to_float(tx.get('fee')))
+            balances.append(_to_float(tx.get('balance')))
+            timestamps.append(tx.get('timestamp'))
+
+            transaction_type = tx.get('transaction_type') or 'unknown'
+            code = code_of.get(transaction_type)
+            if code is None:
+                code = code_of[transaction_type] = len(type_names)
+                type_names.append(transaction_type)
+            codes.append(code)
+
+        return cls(
+            ids=np.array(ids, dtype=np.int64),
+            amount=np.array(amounts, dtype=np.float64),
+            fee=np.array(fees, dtype=np.float64),
+            balance=np.array(balances, dtype=np.float64),
+            timestamp_ms=_timestamps_to_epoch_ms(timestamps),
+            type_codes=np.array(codes, dtype=np.uint16),
+            type_names=type_names
+        )
+
+    def has_timestamp(self) -> np.ndarray:
+        """Boolean mask of transactions with a known timestamp"""
+        return self.timestamp_ms != NO_TIMESTAMP
+
+    def period_labels(self, period: str, mask: np.ndarray = None) -> np.ndarray:
+        """Period start of each (masked) transaction as datetime64 truncated to the period"""
+        timestamps = self.timestamp_ms if mask is None else self.timestamp_ms[mask]
+        return timestamps.astype('datetime64[ms]').astype(f'datetime64[{PERIOD_UNITS[period]}]')
+
+def _to_float(value: Any) -> float:
+    """Numeric field as float, NaN when missing or not a number"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+def _timestamps_to_epoch_ms(timestamps: List[Any]) -> np.ndarray:
+    """ISO-8601 timestamps as an int64 array of epoch milliseconds
+
+    NumPy parses the whole column in C; only if some value is not valid ISO
+    does this fall back to parsing row by row (invalid rows become NO_TIMESTAMP).
+    """
+    try:
+        with warnings.catch_warnings():
+            # Offsets are applied (converted to UTC); NumPy just warns that it drops them
+            warnings.simplefilter('ignore', UserWarning)
+            return np.array(timestamps, dtype='datetime64[ms]').astype(np.int64)
+    except (TypeError, ValueError):
+        return np.array([_to_epoch_ms(timestamp) for timestamp in timestamps], dtype=np.int64)
+
+def _to_epoch_ms(timestamp: Any) -> int:
+    """ISO-8601 timestamp as epoch milliseconds (naive values are taken as UTC)"""
+    try:
+        dt = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return NO_TIMESTAMP
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+def _group_totals(codes: np.ndarray, groups: int, amount: np.ndarray, fee: np.ndarray) -> tuple:
+    """(count, amount, fees) per group code, NaNs counted as zero"""
+    counts = np.bincount(codes, minlength=groups)
+    amounts = np.bincount(codes, weights=np.nan_to_num(amount), minlength=groups)
+    fees = np.bincount(codes, weights=np.nan_to_num(fee), minlength=groups)
+    return counts, amounts, fees
+
+def _totals_dict(count, amount, fee) -> Dict[str, Any]:
+    """Totals as plain Python numbers"""
+    return {'count': int(count), 'amount': float(amount), 'fees': float(fee)}
+
+def sums_by_type(arrays: TransactionArrays) -> Dict[str, Dict[str, Any]]:
+    """Count, amount and fee totals per transaction type"""
+    counts, amounts, fees = _group_totals(arrays.type_codes, len(arrays.type_names), arrays.amount, arrays.fee)
+    return {name: _totals_dict(counts[code], amounts[code], fees[code])
+            for code, name in enumerate(arrays.type_names) if counts[code]}
+
+def _period_offsets(arrays: TransactionArrays, period: str, mask: np.ndarray) -> tuple:
+    """(first period, number of periods spanned, offset of each masked transaction's period)
+
+    Periods are consecutive integers in datetime64 units, so grouping by
+    offset from the first one needs no sort.
+    """
+    labels = arrays.period_labels(period, mask).astype(np.int64)
+    if not len(labels):
+        return 0, 0, labels
+    first = labels.min()
+    return first, int(labels.max() - first) + 1, labels - first
+
+def _period_label(first: int, offset: int, period: str) -> str:
+    """Label ('2024-05', '2024-05-10', ...) of a period offset"""
+    return str(np.datetime64(int(first + offset), PERIOD_UNITS[period]))
+
+def sums_by_period(arrays: TransactionArrays, period: str = 'day') -> Dict[str, Dict[str, Any]]:
+    """Count, amount and fee totals per period, in time order (undated transactions are left out)"""
+    mask = arrays.has_timestamp()
+    first, span, offsets = _period_offsets(arrays, period, mask)
+    counts, amounts, fees = _group_totals(offsets, span, arrays.amount[mask], arrays.fee[mask])
+    return {_period_label(first, i, period): _totals_dict(counts[i], amounts[i], fees[i])
+            for i in np.nonzero(counts)[0]}
+
+def sums_by_type_and_period(arrays: TransactionArrays, period: str = 'month') -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Totals per transaction type, then per period"""
+    mask = arrays.has_timestamp()
+    first, span, offsets = _period_offsets(arrays, period, mask)
+    combined = arrays.type_codes[mask].astype(np.int64) * span + offsets
+    counts, amounts, fees = _group_totals(combined, len(arrays.type_names) * span,
+                                          arrays.amount[mask], arrays.fee[mask])
+
+    result = {}
+    for code, name in enumerate(arrays.type_names):
+        base = code * span
+        present = np.nonzero(counts[base:base + span])[0]
+        if len(present):
+            result[name] = {_period_label(first, i, period): _totals_dict(counts[base + i], amounts[base + i],
+                                                                          fees[base + i])
+                            for i in present}
+    return result
+
+def time_order(arrays: TransactionArrays) -> np.ndarray:
+    """Indices of the dated transactions in time order (stable, so ties keep input order)"""
+    dated = np.nonzero(arrays.has_timestamp())[0]
+    return dated[np.argsort(arrays.timestamp_ms[dated], kind='stable')]
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Mean of each value and the window - 1 before it (shorter at the start)"""
+    cumulative = np.cumsum(np.insert(values, 0, 0.0))
+    ends = np.arange(1, len(values) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (cumulative[ends] - cumulative[starts]) / (ends - starts)
+
+def rolling_balance(arrays: TransactionArrays, window: int = 30) -> Dict[str, np.ndarray]:
+    """Reported balance in time order with its rolling mean over the last window transactions"""
+    order = time_order(arrays)
+    order = order[~np.isnan(arrays.balance[order])]
+    balances = arrays.balance[order]
+    return {
+        'timestamp_ms': arrays.timestamp_ms[order],
+        'balance': balances,
+        'rolling_mean': rolling_mean(balances, window)
+    }
+
+def closing_balance_by_period(arrays: TransactionArrays, period: str = 'day') -> Dict[str, float]:
+    """Balance after the last transaction of each period"""
+    order = time_order(arrays)
+    order = order[~np.isnan(arrays.balance[order])]
+    if not len(order):
+        return {}
+    labels = arrays.timestamp_ms[order].astype('datetime64[ms]').astype(f'datetime64[{PERIOD_UNITS[period]}]')
+    # Labels are sorted, so the last row of each period is just before the next period starts
+    last = np.append(np.nonzero(labels[1:] != labels[:-1])[0], len(labels) - 1)
+    return {str(labels[i]): float(arrays.balance[order[i]]) for i in last}
+
+def percentiles_by_type(arrays: TransactionArrays, percentiles: Sequence[float] = (50, 90, 99)) -> Dict[str, Dict[str, float]]:
+    """Amount percentiles per transaction type (linear interpolation)"""
+    valid = ~np.isnan(arrays.amount)
+    codes = arrays.type_codes[valid]
+    # A stable sort of small integer codes is a radix sort; each type's amounts
+    # then form one contiguous slice, and np.percentile only partitions it
+    order = np.argsort(codes, kind='stable')
+    amounts = arrays.amount[valid][order]
+    bounds = np.searchsorted(codes[order], np.arange(len(arrays.type_names) + 1))
+
+    result = {}
+    for code, name in enumerate(arrays.type_names):
+        values = amounts[bounds[code]:bounds[code + 1]]
+        if len(values):
+            quantiles = np.percentile(values, percentiles)
+            result[name] = {f'p{p:g}': float(q) for p, q in zip(percentiles, quantiles)}
+    return result
+
+def histograms_by_type(arrays: TransactionArrays, bins: int = 20) -> Dict[str, Any]:
+    """Amount histograms per transaction type over shared bin edges"""
+    valid = ~np.isnan(arrays.amount)
+    amounts = arrays.amount[valid]
+    codes = arrays.type_codes[valid].astype(np.int64)
+    edges = np.histogram_bin_edges(amounts, bins=bins)
+
+    # Bin index of each amount; the last bin includes its right edge, as in np.histogram
+    bin_index = np.clip(np.searchsorted(edges, amounts, side='right') - 1, 0, bins - 1)
+    counts = np.bincount(codes * bins + bin_index, minlength=len(arrays.type_names) * bins)
+    counts = counts.reshape(len(arrays.type_names), bins)
+
+    return {
+        'bin_edges': edges.tolist(),
+        'counts': {name: counts[code].tolist() for code, name in enumerate(arrays.type_names)
+                   if counts[code].any()}
+    }
+
+def summarize(transactions: List[Dict[str, Any]], period: str = 'month') -> Dict[str, Any]:
+    """Every analytic above for a list of transactions, as plain Python values"""
+    arrays = TransactionArrays.from_transactions(transactions)
+    return {
+        'by_type': sums_by_type(arrays),
+        f'by_{period}': sums_by_period(arrays, period),
+        f'by_type_and_{period}': sums_by_type_and_period(arrays, period),
+        'closing_balance': closing_balance_by_period(arrays, period),
+        'percentiles': percentiles_by_type(arrays),
+        'histograms': histograms_by_type(arrays)
+    }
@@ -1,2 +1,207 @@
+#!/usr/bin/env python3
+"""
+Dashboard Export for MoMo SMS Data
 
+Computes the aggregates the dashboard displays in a single pass over the
+transactions, so the browser never has to fetch and aggregate every
+transaction itself:
+- totals, and count / amount / fees per transaction type
+- daily and monthly volume
+- top counterparties by amount
+- the balance time series (closing balance per day)
 
+The aggregates are written to dashboard.json with a schema version. Every
+aggregate is a running sum (or a latest value), so new transactions from an
+incremental ETL run are folded into the existing file instead of
+recomputing it from scratch.
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Dict, Any, Iterable, Optional
+sys.path.append('.')
+
+DEFAULT_INPUT_FILE = 'data/processed/transactions.json'
+DEFAULT_DASHBOARD_FILE = 'data/processed/dashboard.json'
+
+# Bump when the layout of dashboard.json changes; older files are rebuilt
+DASHBOARD_SCHEMA_VERSION = 1
+
+# Counterparties listed in top_counterparties
+TOP_COUNTERPARTIES = 10
+
+class DashboardAggregator:
+    """Running dashboard aggregates, updated one transaction at a time"""
+
+    def __init__(self, dashboard: Optional[Dict[str, Any]] = None):
+        """Start empty, or resume from a dashboard written by to_dict()"""
+        dashboard = dashboard or {}
+        self.last_transaction_id = dashboard.get('last_transaction_id', 0)
+        self.totals = dashboard.get('totals') or {
+            'count': 0, 'amount': 0.0, 'fees': 0.0, 'first_timestamp': None, 'last_timestamp': None
+        }
+        self.by_type = dashboard.get('by_type', {})
+        self.daily_volume = dashboard.get('daily_volume', {})
+        self.monthly_volume = dashboard.get('monthly_volume', {})
+        self.counterparties = dashboard.get('counterparties', {})
+        self.balance_series = {point['date']: point for point in dashboard.get('balance_series', [])}
+
+    def add(self, tx: Dict[str, Any]) -> bool:
+        """Fold one transaction into the aggregates
+
+        Transactions at or below the last ID already counted are skipped, so
+        re-applying an ETL batch does not double count.
+
+        Returns:
+            True if the transaction was counted
+        """
+        tx_id = tx.get('id', 0)
+        if tx_id <= self.last_transaction_id:
+            return False
+        self.last_transaction_id = tx_id
+
+        amount = tx.get('amount') or 0.0
+        fee = tx.get('fee') or 0.0
+        timestamp = tx.get('timestamp') or None
+
+        self._accumulate(self.totals, amount, fee)
+        if timestamp:
+            if self.totals['first_timestamp'] is None or timestamp < self.totals['first_timestamp']:
+                self.totals['first_timestamp'] = timestamp
+            if self.totals['last_timestamp'] is None or timestamp > self.totals['last_timestamp']:
+                self.totals['last_timestamp'] = timestamp
+
+        self._accumulate(self.by_type.setdefault(tx.get('transaction_type') or 'unknown', {}), amount, fee)
+
+        counterparty = self.counterparty_of(tx)
+        if counterparty:
+            self._accumulate(self.counterparties.setdefault(counterparty, {}), amount, fee)
+
+        moment = self._parse_timestamp(timestamp)
+        if moment is not None:
+            date = moment.strftime('%Y-%m-%d')
+            self._accumulate(self.daily_volume.setdefault(date, {}), amount, fee)
+            self._accumulate(self.monthly_volume.setdefault(moment.strftime('%Y-%m'), {}), amount, fee)
+
+            balance = tx.get('balance')
+            closing = self.balance_series.get(date)
+            if balance is not None and (closing is None or timestamp >= closing['timestamp']):
+                self.balance_series[date] = {'date': date, 'timestamp': timestamp, 'balance': balance}
+
+        return True
+
+    def add_all(self, transactions: Iterable[Dict[str, Any]]) -> int:
+        """Fold in many transactions; returns how many were counted"""
+        return sum(1 for tx in transactions if self.add(tx))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The dashboard document, as written to dashboard.json"""
+        top = sorted(self.counterparties.items(), key=lambda item: item[1]['amount'], reverse=True)
+        return {
+            'schema_version': DASHBOARD_SCHEMA_VERSION,
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'last_transaction_id': self.last_transaction_id,
+            'totals': self.totals,
+            'by_type': dict(sorted(self.by_type.items())),
+            'daily_volume': dict(sorted(self.daily_volume.items())),
+            'monthly_volume': dict(sorted(self.monthly_volume.items())),
+            'top_counterparties': [{'name': name, **stats} for name, stats in top[:TOP_COUNTERPARTIES]],
+            'balance_series': [self.balance_series[date] for date in sorted(self.balance_series)],
+            # Every counterparty's running totals, so top_counterparties stays exact on updates
+            'counterparties': dict(sorted(self.counterparties.items()))
+        }
+
+    @staticmethod
+    def counterparty_of(tx: Dict[str, Any]) -> Optional[str]:
+        """The other party of a transaction (whichever side is not the account owner)"""
+        for name in (tx.get('receiver'), tx.get('sender')):
+            if name and name != 'Self':
+                return name
+        return None
+
+    @staticmethod
+    def _accumulate(bucket: Dict[str, Any], amount: float, fee: float):
+        """Add a transaction to a count / amount / fees bucket"""
+        bucket['count'] = bucket.get('count', 0) + 1
+        bucket['amount'] = round(bucket.get('amount', 0.0) + amount, 2)
+        bucket['fees'] = round(bucket.get('fees', 0.0) + fee, 2)
+
+    @staticmethod
+    def _parse_timestamp(timestamp: Optional[str]) -> Optional[datetime]:
+        """Parse an ETL timestamp, or None if it is not ISO formatted"""
+        try:
+            return datetime.fromisoformat(timestamp)
+        except (TypeError, ValueError):
+            return None
+
+def load_dashboard(dashboard_file: str) -> Optional[Dict[str, Any]]:
+    """Load an existing dashboard, or None if it is missing, unreadable or an older schema"""
+    try:
+        with open(dashboard_file, 'r', encoding='utf-8') as f:
+            dashboard = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(dashboard, dict) or dashboard.get('schema_version') != DASHBOARD_SCHEMA_VERSION:
+        return None
+    return dashboard
+
+def save_dashboard(aggregator: DashboardAggregator, dashboard_file: str):
+    """Write the dashboard document"""
+    try:
+        with open(dashboard_file, 'w', encoding='utf-8') as f:
+            json.dump(aggregator.to_dict(), f, indent=2, ensure_ascii=False)
+        print(f"Dashboard saved to {dashboard_file}")
+    except Exception as e:
+        print(f"Error saving dashboard: {e}")
+
+def build_dashboard(transactions: Iterable[Dict[str, Any]], dashboard_file: str = DEFAULT_DASHBOARD_FILE) -> DashboardAggregator:
+    """Compute the dashboard from scratch and write it"""
+    aggregator = DashboardAggregator()
+    aggregator.add_all(transactions)
+    save_dashboard(aggregator, dashboard_file)
+    return aggregator
+
+def update_dashboard(new_transactions: Iterable[Dict[str, Any]], dashboard_file: str = DEFAULT_DASHBOARD_FILE,
+                     all_transactions_file: str = DEFAULT_INPUT_FILE) -> DashboardAggregator:
+    """
+    Fold newly extracted transactions into the existing dashboard
+
+    If there is no usable dashboard yet, it is rebuilt from the full
+    transactions file (which already contains the new transactions).
+    """
+    existing = load_dashboard(dashboard_file)
+    if existing is None:
+        with open(all_transactions_file, 'r', encoding='utf-8') as f:
+            return build_dashboard(json.load(f), dashboard_file)
+
+    aggregator = DashboardAggregator(existing)
+    counted = aggregator.add_all(new_transactions)
+    if counted:
+        save_dashboard(aggregator, dashboard_file)
+    print(f"Dashboard updated with {counted} new transactions")
+    return aggregator
+
+def main():
+    """Rebuild the dashboard from the transactions JSON"""
+    arg_parser = argparse.ArgumentParser(description='Export MoMo dashboard aggregates')
+    arg_parser.add_argument('--input', default=DEFAULT_INPUT_FILE, help='Transactions JSON from the ETL')
+    arg_parser.add_argument('--output', default=DEFAULT_DASHBOARD_FILE, help='Dashboard JSON output file')
+    args = arg_parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: transactions file not found at {args.input}")
+        print("Run the ETL first: scripts/run_etl.sh")
+        return
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        transactions = json.load(f)
+
+    aggregator = build_dashboard(transactions, args.output)
+    print(f"Aggregated {aggregator.totals['count']} transactions")
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,475 @@
+#!/usr/bin/env python3
+"""
+Database Loaders for MoMo SMS Data
 
+Two loaders for parsed transactions. Both turn each transaction into a
+Raw_Messages row for its SMS body, Users rows for its sender and receiver and
+a Transactions row linking them, resolving every foreign key in memory:
+- bulk_load_transactions: replaces the contents of the SQLite database used by
+  the REST API (schema: database/database_setup_sqlite.sql), with one
+  executemany per table inside a single transaction, in WAL mode
+- SchemaBulkLoader: appends to the MySQL schema in database/database_setup.sql
+  over any DB-API connection, with multi-row INSERT batches
+"""
 
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional
+sys.path.append('.')
+from etl.parse_xml import TRANSFER_PATTERN
+
+DEFAULT_INPUT_FILE = 'data/processed/transactions.json'
+DEFAULT_MYSQL_DATABASE = 'momo_sms'
+DEFAULT_DB_FILE = 'data/momo.db'
+SCHEMA_FILE = 'database/database_setup_sqlite.sql'
+
+# Transaction_Categories row for each transaction type; other types get a
+# category named after the type, created on first use
+CATEGORY_FOR_TYPE = {
+    'transfer': 'Transfer',
+    'send': 'Transfer',
+    'receive': 'Transfer',
+    'payment': 'Payment',
+    'pay': 'Payment',
+    'withdraw': 'Withdrawal',
+    'withdrawal': 'Withdrawal',
+    'deposit': 'Deposit',
+    'airtime': 'Airtime',
+    'bill': 'Bill Payment'
+}
+
+INSERT_USER = 'INSERT INTO Users (user_id, full_name) VALUES (?, ?)'
+INSERT_CATEGORY = 'INSERT INTO Transaction_Categories (category_name) VALUES (?)'
+INSERT_MESSAGE = ("INSERT INTO Raw_Messages (message_id, raw_content, processing_status) "
+                  "VALUES (?, ?, 'processed')")
+INSERT_TRANSACTION = (
+    'INSERT INTO Transactions (transaction_id, sender_id, receiver_id, category_id, message_id, '
+    'amount, currency, timestamp, transaction_type, status, reference_number, balance, fee) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+
+# Explicitly created indexes on the loaded tables (UNIQUE constraints are kept)
+SELECT_SECONDARY_INDEXES = ("SELECT sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+                            "AND tbl_name IN ('Users', 'Raw_Messages', 'Transactions')")
+SELECT_SECONDARY_INDEX_NAMES = SELECT_SECONDARY_INDEXES.replace('SELECT sql', 'SELECT name', 1)
+
+def connect(db_path: str, **kwargs) -> sqlite3.Connection:
+    """Open a SQLite connection in WAL mode with foreign keys enforced"""
+    conn = sqlite3.connect(db_path, **kwargs)
+    conn.execute('PRAGMA journal_mode = WAL')
+    # WAL only needs syncing at checkpoints to stay consistent
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA foreign_keys = ON')
+    return conn
+
+def create_schema(conn: sqlite3.Connection, schema_file: str = SCHEMA_FILE):
+    """Create the tables, indexes and categories if they do not exist yet"""
+    with open(schema_file, 'r', encoding='utf-8') as f:
+        conn.executescript(f.read())
+
+def category_name_for(transaction_type: Optional[str]) -> str:
+    """Transaction_Categories name for a transaction type"""
+    transaction_type = transaction_type or 'unknown'
+    return CATEGORY_FOR_TYPE.get(transaction_type.lower(), transaction_type.title())
+
+def load_category_ids(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Map every category name to its ID"""
+    return dict(conn.execute('SELECT category_name, category_id FROM Transaction_Categories'))
+
+def category_id_for(conn: sqlite3.Connection, categories: Dict[str, int],
+                    transaction_type: Optional[str]) -> int:
+    """Category ID for a transaction type, creating the category if needed"""
+    name = category_name_for(transaction_type)
+    category_id = categories.get(name)
+    if category_id is None:
+        category_id = conn.execute(INSERT_CATEGORY, (name,)).lastrowid
+        categories[name] = category_id
+    return category_id
+
+def transaction_row(tx: Dict[str, Any], transaction_id: Optional[int], sender_id: Optional[int],
+                    receiver_id: Optional[int], category_id: int, message_id: Optional[int]) -> tuple:
+    """Transactions row values for a transaction, in INSERT_TRANSACTION order"""
+    return (
+        transaction_id, sender_id, receiver_id, category_id, message_id,
+        tx.get('amount'),
+        tx.get('currency', 'RWF'),
+        tx.get('timestamp'),
+        tx.get('transaction_type') or 'unknown',
+        tx.get('status'),
+        # Empty reference numbers become NULL so the UNIQUE constraint holds
+        tx.get('reference_number') or None,
+        tx.get('balance'),
+        tx.get('fee')
+    )
+
+def bulk_load_transactions(conn: sqlite3.Connection, transactions: Iterable[Dict[str, Any]]) -> int:
+    """
+    Replace the database contents with the given transactions
+
+    Users and messages are numbered and linked in memory, so nothing is read
+    back while inserting. Everything, including clearing the old rows, runs
+    in one transaction: readers see either the old data or the new data.
+
+    Returns:
+        Number of transactions loaded
+    """
+    categories = load_category_ids(conn)
+    user_ids = {}
+    user_rows = []
+    message_rows = []
+    transaction_rows = []
+
+    def user_id_for(name):
+        if not name:
+            return None
+        user_id = user_ids.get(name)
+        if user_id is None:
+            user_id = len(user_rows) + 1
+            user_ids[name] = user_id
+            user_rows.append((user_id, name))
+        return user_id
+
+    with conn:
+        conn.execute('DELETE FROM Transactions')
+        conn.execute('DELETE FROM Raw_Messages')
+        conn.execute('DELETE FROM Users')
+
+        # Building the secondary indexes once after the load is much cheaper
+        # than updating them on every insert
+        index_sql = [sql for (sql,) in conn.execute(SELECT_SECONDARY_INDEXES)]
+        for name in [row[0] for row in conn.execute(SELECT_SECONDARY_INDEX_NAMES)]:
+            conn.execute(f'DROP INDEX {name}')
+
+        for tx in transactions:
+            message_id = None
+            if tx.get('message'):
+                message_id = len(message_rows) + 1
+                message_rows.append((message_id, tx['message']))
+
+            transaction_rows.append(transaction_row(
+                tx, tx['id'],
+                user_id_for(tx.get('sender')),
+                user_id_for(tx.get('receiver')),
+                category_id_for(conn, categories, tx.get('transaction_type')),
+                message_id
+            ))
+
+        conn.executemany(INSERT_USER, user_rows)
+        conn.executemany(INSERT_MESSAGE, message_rows)
+        conn.executemany(INSERT_TRANSACTION, transaction_rows)
+
+        for sql in index_sql:
+            conn.execute(sql)
+
+    return len(transaction_rows)
+
+# Rows per multi-row INSERT statement in SchemaBulkLoader
+DEFAULT_BATCH_SIZE = 500
+
+# Transactions.transaction_type ENUM values in database_setup.sql
+SCHEMA_TYPES = ('send', 'receive', 'pay', 'withdraw', 'deposit', 'transfer')
+
+# SCHEMA_TYPES value for other ETL types; the category keeps the original type
+SCHEMA_TRANSACTION_TYPES = {
+    'payment': 'pay',
+    'withdrawal': 'withdraw',
+    'airtime': 'pay',
+    'bill': 'pay'
+}
+
+# DB-API paramstyle -> positional placeholder
+PLACEHOLDERS = {
+    'qmark': '?',
+    'format': '%s',
+    'pyformat': '%s'
+}
+
+class SchemaBulkLoader:
+    """
+    Appends transactions to the database_setup.sql schema over a DB-API connection
+
+    Rows are written in load order (Raw_Messages, then Users, then
+    Transactions) with multi-row INSERT statements. IDs are assigned by the
+    loader from each table's current maximum, so foreign keys are resolved
+    through in-memory caches instead of reading generated keys back row by
+    row. The caches are seeded from the database once per load:
+    - users by phone number and by name; a counterparty's phone is taken from
+      its transfer messages when available, so a name seen with and without
+      a phone maps to a single user
+    - categories by name
+    - reference numbers (or SMS bodies, for transactions without one) already
+      loaded, so re-running a load skips them
+
+    Users.phone_number is NOT NULL and UNIQUE, but most SMS only name the
+    counterparty; those users get a stable placeholder number derived from
+    the name ('#' plus 14 hex digits), which keeps re-runs deduplicated.
+
+    chk_sender_receiver forbids a transaction from a user to the same user
+    (a deposit from 'Self' to 'Self'); the user is kept as the receiver and
+    the sender stored as NULL, an external party. A transaction type with no
+    transaction_type ENUM value raises ValueError before anything is written.
+
+    The whole load is committed once, or rolled back on error.
+    """
+
+    def __init__(self, conn, paramstyle: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.conn = conn
+        self.placeholder = PLACEHOLDERS[paramstyle or self._driver_paramstyle(conn)]
+        self.batch_size = batch_size
+
+    @staticmethod
+    def _driver_paramstyle(conn) -> str:
+        """paramstyle of the DB-API module a connection comes from"""
+        module = sys.modules.get(type(conn).__module__.split('.')[0])
+        return getattr(module, 'paramstyle', 'format')
+
+    def load(self, transactions: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Load transactions and return the number of rows written per table
+
+        Returns:
+            Dict with 'messages', 'users', 'transactions' and 'skipped' counts
+        """
+        transactions = list(transactions)
+        cursor = self.conn.cursor()
+        try:
+            counts = self._load(cursor, transactions)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return counts
+
+    def _load(self, cursor, transactions: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Resolve keys and write every table, without committing"""
+        user_by_phone, user_by_name = {}, {}
+        cursor.execute('SELECT user_id, phone_number, full_name FROM Users')
+        for user_id, phone, name in cursor.fetchall():
+            user_by_phone[phone] = user_id
+            if name:
+                user_by_name.setdefault(name, user_id)
+
+        cursor.execute('SELECT category_name, category_id FROM Transaction_Categories')
+        categories = dict(cursor.fetchall())
+
+        # Transactions are identified by reference number, or by SMS body when they have none
+        cursor.execute('SELECT reference_number FROM Transactions WHERE reference_number IS NOT NULL')
+        loaded_keys = {('reference', row[0]) for row in cursor.fetchall()}
+        cursor.execute('SELECT m.raw_content FROM Transactions t '
+                       'JOIN Raw_Messages m ON m.message_id = t.message_id WHERE t.reference_number IS NULL')
+        loaded_keys.update(('message', row[0]) for row in cursor.fetchall())
+
+        next_user = self._max_id(cursor, 'Users', 'user_id') + 1
+        next_message = self._max_id(cursor, 'Raw_Messages', 'message_id') + 1
+        next_category = self._max_id(cursor, 'Transaction_Categories', 'category_id') + 1
+        next_transaction = self._max_id(cursor, 'Transactions', 'transaction_id') + 1
+
+        # Skip transactions already in the database (or repeated in the input)
+        new_transactions = []
+        for tx in transactions:
+            key = self.transaction_key(tx)
+            if key is not None:
+                if key in loaded_keys:
+                    continue
+                loaded_keys.add(key)
+            new_transactions.append(tx)
+
+        # Prefer a real phone number for every name that ever appears with one
+        phone_of = {}
+        for tx in new_transactions:
+            phone_of.update(self.counterparty_phones(tx))
+
+        user_rows, message_rows, category_rows, transaction_rows = [], [], [], []
+
+        def user_id_for(name):
+            nonlocal next_user
+            if not name:
+                return None
+            phone = phone_of.get(name)
+            user_id = user_by_phone.get(phone) if phone else user_by_name.get(name)
+            if user_id is None:
+                phone = phone or self.placeholder_phone(name)
+                user_id = user_by_phone.get(phone)
+            if user_id is None:
+                user_id = next_user
+                next_user += 1
+                user_rows.append((user_id, phone, name))
+                user_by_phone[phone] = user_id
+            user_by_name.setdefault(name, user_id)
+            return user_id
+
+        for tx in new_transactions:
+            message_id = None
+            if tx.get('message'):
+                message_id = next_message
+                next_message += 1
+                message_rows.append((message_id, tx['message'], 'processed'))
+
+            name = category_name_for(tx.get('transaction_type'))
+            category_id = categories.get(name)
+            if category_id is None:
+                category_id = next_category
+                next_category += 1
+                categories[name] = category_id
+                category_rows.append((category_id, name))
+
+            sender_id = user_id_for(tx.get('sender'))
+            receiver_id = user_id_for(tx.get('receiver'))
+            if sender_id == receiver_id:
+                sender_id = None
+
+            transaction_rows.append((
+                next_transaction,
+                sender_id,
+                receiver_id,
+                category_id,
+                message_id,
+                tx.get('amount'),
+                tx.get('currency', 'RWF'),
+                self.schema_timestamp(tx.get('timestamp')),
+                self.schema_type(tx.get('transaction_type')),
+                tx.get('status', 'pending'),
+                tx.get('reference_number') or None
+            ))
+            next_transaction += 1
+
+        self._insert(cursor, 'Raw_Messages', ('message_id', 'raw_content', 'processing_status'), message_rows)
+        self._insert(cursor, 'Users', ('user_id', 'phone_number', 'full_name'), user_rows)
+        self._insert(cursor, 'Transaction_Categories', ('category_id', 'category_name'), category_rows)
+        self._insert(cursor, 'Transactions', (
+            'transaction_id', 'sender_id', 'receiver_id', 'category_id', 'message_id', 'amount',
+            'currency', 'timestamp', 'transaction_type', 'status', 'reference_number'
+        ), transaction_rows)
+
+        return {
+            'messages': len(message_rows),
+            'users': len(user_rows),
+            'transactions': len(transaction_rows),
+            'skipped': len(transactions) - len(new_transactions)
+        }
+
+    @staticmethod
+    def _max_id(cursor, table: str, column: str) -> int:
+        """Largest ID currently in a table (0 when empty)"""
+        cursor.execute(f'SELECT COALESCE(MAX({column}), 0) FROM {table}')
+        return cursor.fetchone()[0]
+
+    def _insert(self, cursor, table: str, columns: tuple, rows: List[tuple]):
+        """Insert rows with one multi-row INSERT per batch"""
+        row_placeholders = '(' + ', '.join([self.placeholder] * len(columns)) + ')'
+        prefix = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            sql = prefix + ', '.join([row_placeholders] * len(batch))
+            cursor.execute(sql, [value for row in batch for value in row])
+
+    @staticmethod
+    def transaction_key(tx: Dict[str, Any]) -> Optional[tuple]:
+        """Key identifying an already loaded transaction: its reference number, else its SMS body"""
+        if tx.get('reference_number'):
+            return ('reference', tx['reference_number'])
+        if tx.get('message'):
+            return ('message', tx['message'])
+        return None
+
+    @staticmethod
+    def schema_type(transaction_type: Optional[str]) -> str:
+        """Transactions.transaction_type ENUM value for an ETL transaction type"""
+        transaction_type = (transaction_type or 'unknown').lower()
+        schema_type = SCHEMA_TRANSACTION_TYPES.get(transaction_type, transaction_type)
+        if schema_type not in SCHEMA_TYPES:
+            raise ValueError(f"Transaction type {transaction_type!r} has no transaction_type value in the schema")
+        return schema_type
+
+    @staticmethod
+    def counterparty_phones(tx: Dict[str, Any]) -> Dict[str, str]:
+        """Map counterparty names in a transaction to phone numbers found in its SMS"""
+        match = TRANSFER_PATTERN.match(tx.get('message') or '')
+        if match and tx.get('receiver'):
+            return {tx['receiver']: '+' + match.group(4)}
+        return {}
+
+    @staticmethod
+    def placeholder_phone(name: str) -> str:
+        """Stable stand-in for Users.phone_number when only the name is known"""
+        return '#' + hashlib.sha1(name.encode('utf-8')).hexdigest()[:14]
+
+    @staticmethod
+    def schema_timestamp(value: Optional[str]) -> Optional[str]:
+        """Format an ETL timestamp as a DATETIME literal ('YYYY-MM-DD HH:MM:SS')"""
+        try:
+            dt = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return value
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+        return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+def connect_mysql(database: str = DEFAULT_MYSQL_DATABASE):
+    """Open a MySQL connection with PyMySQL, configured from MYSQL_* environment variables"""
+    import pymysql
+    return pymysql.connect(
+        host=os.environ.get('MYSQL_HOST', 'localhost'),
+        port=int(os.environ.get('MYSQL_PORT', 3306)),
+        user=os.environ.get('MYSQL_USER', 'root'),
+        password=os.environ.get('MYSQL_PASSWORD', ''),
+        database=database,
+        charset='utf8mb4'
+    )
+
+def main():
+    """Load the ETL output into the SQLite database"""
+    arg_parser = argparse.ArgumentParser(description='Load parsed MoMo transactions into a database')
+    arg_parser.add_argument('--input', default=DEFAULT_INPUT_FILE, help='Transactions JSON from the ETL')
+    arg_parser.add_argument('--db', default=DEFAULT_DB_FILE, help='SQLite database file')
+    arg_parser.add_argument('--mysql', nargs='?', const=DEFAULT_MYSQL_DATABASE, metavar='DATABASE',
+                            help='Append to the database_setup.sql schema in MySQL instead '
+                                 '(needs PyMySQL; server from MYSQL_HOST/PORT/USER/PASSWORD)')
+    args = arg_parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: transactions file not found at {args.input}")
+        print("Run the ETL first: scripts/run_etl.sh")
+        return
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        transactions = json.load(f)
+
+    if args.mysql:
+        try:
+            conn = connect_mysql(args.mysql)
+        except ImportError:
+            print("Error: PyMySQL is required for --mysql (pip install pymysql)")
+            return
+        try:
+            start = time.perf_counter()
+            counts = SchemaBulkLoader(conn).load(transactions)
+            elapsed = time.perf_counter() - start
+        finally:
+            conn.close()
+        print(f"Loaded {counts['transactions']} transactions ({counts['users']} new users, "
+              f"{counts['skipped']} already loaded) into MySQL {args.mysql} in {elapsed:.2f}s")
+        return
+
+    conn = connect(args.db)
+    try:
+        create_schema(conn)
+        start = time.perf_counter()
+        loaded = bulk_load_transactions(conn, transactions)
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+
+    print(f"Loaded {loaded} transactions into {args.db} in {elapsed:.2f}s "
+          f"({loaded / elapsed if elapsed else 0:,.0f} rows/s)")
+
+if __name__ == '__main__':
+    main()
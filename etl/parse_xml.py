@@ -6,8 +6,35 @@ SMS XML Parser for MoMo Transaction Data
 import xml.etree.ElementTree as ET
 import re
 import json
+import os
+import sys
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator
+sys.path.append('.')
+
+# Watermark of the last incremental ETL run
+DEFAULT_CHECKPOINT_FILE = 'data/processed/etl_checkpoint.json'
+
+# Reference numbers dated within this window before the watermark are kept
+# in the checkpoint to catch re-delivered messages; older ones are dropped
+CHECKPOINT_REFERENCE_WINDOW_MS = 7 * 24 * 60 * 60 * 1000
+
+# Start of a record in a JSON array written by save_to_json ('id' comes first)
+JSON_RECORD_ID = re.compile(rb'\n  \{\n    "id": (\d+)')
+
+# Precompiled extraction patterns, one per message type
+RECEIVE_PATTERN = re.compile(r"You have received (\d+(?:,\d+)*) (\w+) from ([^(]+) \(\*+(\d+)\).*?Your new balance:(\d+(?:,\d+)*) (\w+).*?Transaction Id: (\d+)")
+PAYMENT_PATTERN = re.compile(r"TxId: (\d+)\. Your payment of ([\d,]+) (\w+) to ([^0-9]+)(\d+) has been completed.*?Your new balance: ([\d,]+) (\w+)\. Fee was (\d+) (\w+)")
+TRANSFER_PATTERN = re.compile(r"\*165\*S\*([\d,]+) (\w+) transferred to ([^(]+) \((\d+)\) from (\d+).*?Fee was: (\d+) (\w+)\. New balance: ([\d,]+) (\w+)")
+DEPOSIT_PATTERN = re.compile(r"\*113\*R\*A bank deposit of ([\d,]+) (\w+) has been added.*?Your NEW BALANCE :([\d,]+) (\w+)")
+
+# Message prefixes used to pick a single pattern per body, most frequent first
+MESSAGE_PREFIXES = (
+    ('*165*S*', 'transfer'),
+    ('*113*R*', 'deposit'),
+    ('TxId:', 'payment'),
+    ('You have received', 'receive'),
+)
 
 class SMSTransactionParser:
     """Parses SMS messages to extract mobile money transaction data"""
@@ -15,6 +42,10 @@ class SMSTransactionParser:
     def __init__(self, xml_file_path: str):
         self.xml_file_path = xml_file_path
         self.transactions = []
+        # Position in the backup of the <sms> element each transaction came from
+        self.sms_ordinals = []
+        # <sms> elements in the backup, once a parse has read all of them
+        self.sms_count = None
         self.sms_records = []
         
     def parse_xml(self) -> List[Dict[str, Any]]:
@@ -27,17 +58,7 @@ class SMSTransactionParser:
             print(f"Total SMS count: {root.get('count', 'Unknown')}")
             
             for sms in root.findall('sms'):
-                sms_data = {
-                    'protocol': sms.get('protocol'),
-                    'address': sms.get('address'),
-                    'date': sms.get('date'),
-                    'type': sms.get('type'),
-                    'subject': sms.get('subject'),
-                    'body': sms.get('body'),
-                    'readable_date': sms.get('readable_date'),
-                    'contact_name': sms.get('contact_name')
-                }
-                self.sms_records.append(sms_data)
+                self.sms_records.append(self._sms_element_to_record(sms))
             
             print(f"Parsed {len(self.sms_records)} SMS records")
             return self.sms_records
@@ -46,6 +67,59 @@ class SMSTransactionParser:
             print(f"Error parsing XML: {e}")
             return []
     
+    def iter_sms_records(self) -> Iterator[Dict[str, Any]]:
+        """Stream SMS records one at a time using incremental parsing
+        
+        Each <sms> element is cleared once its record has been yielded, so
+        memory stays flat regardless of the size of the backup file.
+        """
+        count = 0
+        try:
+            context = ET.iterparse(self.xml_file_path, events=('start', 'end'))
+            _, root = next(context)
+            
+            print(f"Root element: {root.tag}")
+            print(f"Total SMS count: {root.get('count', 'Unknown')}")
+            
+            for event, elem in context:
+                if event != 'end' or elem.tag != 'sms':
+                    continue
+                
+                yield self._sms_element_to_record(elem)
+                count += 1
+                
+                # Drop the processed element and its reference from the root
+                elem.clear()
+                root.clear()
+            
+            print(f"Streamed {count} SMS records")
+            self.sms_count = count
+            
+        except Exception as e:
+            print(f"Error parsing XML: {e}")
+    
+    @staticmethod
+    def _sms_element_to_record(sms) -> Dict[str, Any]:
+        """Convert an <sms> element into an SMS record dict"""
+        return {
+            'protocol': sms.get('protocol'),
+            'address': sms.get('address'),
+            'date': sms.get('date'),
+            'type': sms.get('type'),
+            'subject': sms.get('subject'),
+            'body': sms.get('body'),
+            'readable_date': sms.get('readable_date'),
+            'contact_name': sms.get('contact_name')
+        }
+    
+    @staticmethod
+    def classify_message(sms_body: str) -> Optional[str]:
+        """Pick the candidate transaction type from the message prefix"""
+        for prefix, transaction_type in MESSAGE_PREFIXES:
+            if sms_body.startswith(prefix):
+                return transaction_type
+        return None
+    
     def extract_transaction_info(self, sms_body: str) -> Optional[Dict[str, Any]]:
         """Extract transaction information from SMS body text"""
         if not sms_body:
@@ -63,145 +137,361 @@ class SMSTransactionParser:
             'message': sms_body
         }
         
+        transaction_type = self.classify_message(sms_body)
+        
         # Pattern 1: Money received
-        receive_pattern = r"You have received (\d+(?:,\d+)*) (\w+) from ([^(]+) \(\*+(\d+)\).*?Your new balance:(\d+(?:,\d+)*) (\w+).*?Transaction Id: (\d+)"
-        receive_match = re.search(receive_pattern, sms_body)
-        
-        if receive_match:
-            transaction_info.update({
-                'transaction_type': 'receive',
-                'amount': float(receive_match.group(1).replace(',', '')),
-                'currency': receive_match.group(2),
-                'sender': receive_match.group(3).strip(),
-                'balance': float(receive_match.group(5).replace(',', '')),
-                'reference_number': receive_match.group(7)
-            })
-            return transaction_info
+        if transaction_type == 'receive':
+            receive_match = RECEIVE_PATTERN.match(sms_body)
+            
+            if receive_match:
+                transaction_info.update({
+                    'transaction_type': 'receive',
+                    'amount': float(receive_match.group(1).replace(',', '')),
+                    'currency': receive_match.group(2),
+                    'sender': receive_match.group(3).strip(),
+                    'balance': float(receive_match.group(5).replace(',', '')),
+                    'reference_number': receive_match.group(7)
+                })
         
         # Pattern 2: Payment to someone
-        payment_pattern = r"TxId: (\d+)\. Your payment of ([\d,]+) (\w+) to ([^0-9]+)(\d+) has been completed.*?Your new balance: ([\d,]+) (\w+)\. Fee was (\d+) (\w+)"
-        payment_match = re.search(payment_pattern, sms_body)
-        
-        if payment_match:
-            transaction_info.update({
-                'transaction_type': 'payment',
-                'reference_number': payment_match.group(1),
-                'amount': float(payment_match.group(2).replace(',', '')),
-                'currency': payment_match.group(3),
-                'receiver': payment_match.group(4).strip(),
-                'balance': float(payment_match.group(6).replace(',', '')),
-                'fee': float(payment_match.group(8))
-            })
-            return transaction_info
+        elif transaction_type == 'payment':
+            payment_match = PAYMENT_PATTERN.match(sms_body)
+            
+            if payment_match:
+                transaction_info.update({
+                    'transaction_type': 'payment',
+                    'reference_number': payment_match.group(1),
+                    'amount': float(payment_match.group(2).replace(',', '')),
+                    'currency': payment_match.group(3),
+                    'receiver': payment_match.group(4).strip(),
+                    'balance': float(payment_match.group(6).replace(',', '')),
+                    'fee': float(payment_match.group(8))
+                })
         
         # Pattern 3: Money transfer
-        transfer_pattern = r"\*165\*S\*([\d,]+) (\w+) transferred to ([^(]+) \((\d+)\) from (\d+).*?Fee was: (\d+) (\w+)\. New balance: ([\d,]+) (\w+)"
-        transfer_match = re.search(transfer_pattern, sms_body)
-        
-        if transfer_match:
-            transaction_info.update({
-                'transaction_type': 'transfer',
-                'amount': float(transfer_match.group(1).replace(',', '')),
-                'currency': transfer_match.group(2),
-                'receiver': transfer_match.group(3).strip(),
-                'fee': float(transfer_match.group(6)),
-                'balance': float(transfer_match.group(8).replace(',', ''))
-            })
-            return transaction_info
+        elif transaction_type == 'transfer':
+            transfer_match = TRANSFER_PATTERN.match(sms_body)
+            
+            if transfer_match:
+                transaction_info.update({
+                    'transaction_type': 'transfer',
+                    'amount': float(transfer_match.group(1).replace(',', '')),
+                    'currency': transfer_match.group(2),
+                    'receiver': transfer_match.group(3).strip(),
+                    'fee': float(transfer_match.group(6)),
+                    'balance': float(transfer_match.group(8).replace(',', ''))
+                })
         
         # Pattern 4: Bank deposit
-        deposit_pattern = r"\*113\*R\*A bank deposit of ([\d,]+) (\w+) has been added.*?Your NEW BALANCE :([\d,]+) (\w+)"
-        deposit_match = re.search(deposit_pattern, sms_body)
-        
-        if deposit_match:
-            transaction_info.update({
-                'transaction_type': 'deposit',
-                'amount': float(deposit_match.group(1).replace(',', '')),
-                'currency': deposit_match.group(2),
-                'balance': float(deposit_match.group(3).replace(',', '')),
-                'sender': 'Bank',
-                'receiver': 'Self'
-            })
-            return transaction_info
+        elif transaction_type == 'deposit':
+            deposit_match = DEPOSIT_PATTERN.match(sms_body)
+            
+            if deposit_match:
+                transaction_info.update({
+                    'transaction_type': 'deposit',
+                    'amount': float(deposit_match.group(1).replace(',', '')),
+                    'currency': deposit_match.group(2),
+                    'balance': float(deposit_match.group(3).replace(',', '')),
+                    'sender': 'Bank',
+                    'receiver': 'Self'
+                })
         
         return transaction_info
     
-    def process_sms_to_transactions(self) -> List[Dict[str, Any]]:
-        """Convert SMS records to transaction records"""
+    def process_sms_to_transactions(self, sms_records: Optional[Iterable[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Convert SMS records to transaction records
+        
+        Args:
+            sms_records: Iterable of SMS records to process, e.g. the stream from
+                iter_sms_records(). Defaults to the records loaded by parse_xml().
+        """
+        if sms_records is None:
+            sms_records = self.sms_records
+        
         transactions = []
+        ordinals = []
         transaction_id = 1
         
-        for sms in self.sms_records:
-            # Only process M-Money SMS messages
-            if sms.get('address') == 'M-Money':
-                transaction_info = self.extract_transaction_info(sms.get('body', ''))
-                
-                if transaction_info and transaction_info['transaction_type'] != 'unknown':
-                    # Convert timestamp
-                    timestamp = sms.get('date')
-                    if timestamp:
-                        try:
-                            # Convert milliseconds timestamp to readable format
-                            dt = datetime.fromtimestamp(int(timestamp) / 1000)
-                            formatted_timestamp = dt.isoformat()
-                        except:
-                            formatted_timestamp = sms.get('readable_date', timestamp)
-                    else:
-                        formatted_timestamp = sms.get('readable_date', '')
-                    
-                    transaction = {
-                        'id': transaction_id,
-                        'transaction_type': transaction_info['transaction_type'],
-                        'amount': transaction_info['amount'],
-                        'currency': transaction_info.get('currency', 'RWF'),
-                        'sender': transaction_info.get('sender', ''),
-                        'receiver': transaction_info.get('receiver', ''),
-                        'timestamp': formatted_timestamp,
-                        'status': 'completed',
-                        'reference_number': transaction_info.get('reference_number', ''),
-                        'balance': transaction_info.get('balance', 0.0),
-                        'fee': transaction_info.get('fee', 0.0),
-                        'message': transaction_info['message']
-                    }
-                    
-                    transactions.append(transaction)
-                    transaction_id += 1
+        for ordinal, sms in enumerate(sms_records):
+            transaction = self.build_transaction(sms, transaction_id)
+            
+            if transaction:
+                transactions.append(transaction)
+                ordinals.append(ordinal)
+                transaction_id += 1
         
         self.transactions = transactions
+        self.sms_ordinals = ordinals
         print(f"Extracted {len(transactions)} transactions from SMS records")
         return transactions
     
-    def save_to_json(self, output_file: str):
-        """Save transactions to JSON file"""
+    def build_transaction(self, sms: Dict[str, Any], transaction_id: int) -> Optional[Dict[str, Any]]:
+        """Build a transaction record from a single SMS record
+        
+        Returns None for SMS messages that are not M-Money transactions.
+        """
+        # Only process M-Money SMS messages
+        if sms.get('address') != 'M-Money':
+            return None
+        
+        transaction_info = self.extract_transaction_info(sms.get('body', ''))
+        
+        if not transaction_info or transaction_info['transaction_type'] == 'unknown':
+            return None
+        
+        # Convert timestamp
+        timestamp = sms.get('date')
+        if timestamp:
+            try:
+                # Convert milliseconds timestamp to readable format
+                dt = datetime.fromtimestamp(int(timestamp) / 1000)
+                formatted_timestamp = dt.isoformat()
+            except:
+                formatted_timestamp = sms.get('readable_date', timestamp)
+        else:
+            formatted_timestamp = sms.get('readable_date', '')
+        
+        return {
+            'id': transaction_id,
+            'transaction_type': transaction_info['transaction_type'],
+            'amount': transaction_info['amount'],
+            'currency': transaction_info.get('currency', 'RWF'),
+            'sender': transaction_info.get('sender', ''),
+            'receiver': transaction_info.get('receiver', ''),
+            'timestamp': formatted_timestamp,
+            'status': 'completed',
+            'reference_number': transaction_info.get('reference_number', ''),
+            'balance': transaction_info.get('balance', 0.0),
+            'fee': transaction_info.get('fee', 0.0),
+            'message': transaction_info['message']
+        }
+    
+    def process_new_transactions(self, sms_records: Iterable[Dict[str, Any]], checkpoint: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Convert only SMS records newer than the checkpoint watermark
+        
+        Messages dated before the watermark are skipped before any regex runs.
+        Messages at exactly the watermark date are skipped if they were already
+        processed, and any message whose reference number was seen in a recent
+        run (within CHECKPOINT_REFERENCE_WINDOW_MS of the watermark) is dropped.
+        New transactions continue the ID sequence from the checkpoint, and the
+        checkpoint is advanced in place.
+        """
+        last_date = checkpoint['last_date']
+        references = dict(checkpoint['reference_numbers'])
+        boundary_keys = set(checkpoint['boundary_keys'])
+        
+        new_last_date = last_date
+        new_boundary_keys = set(boundary_keys)
+        
+        transactions = []
+        ordinals = []
+        transaction_id = checkpoint['last_id'] + 1
+        
+        for ordinal, sms in enumerate(sms_records):
+            date = self._sms_date_ms(sms)
+            if date < last_date:
+                continue
+            
+            transaction = self.build_transaction(sms, transaction_id)
+            if not transaction:
+                continue
+            
+            reference_number = transaction['reference_number']
+            key = reference_number or transaction['message']
+            
+            if reference_number and reference_number in references:
+                continue
+            if date == last_date and key in boundary_keys:
+                continue
+            
+            transactions.append(transaction)
+            ordinals.append(ordinal)
+            transaction_id += 1
+            
+            if reference_number:
+                references[reference_number] = date
+            
+            if date > new_last_date:
+                new_last_date = date
+                new_boundary_keys = {key}
+            elif date == new_last_date:
+                new_boundary_keys.add(key)
+        
+        window_start = new_last_date - CHECKPOINT_REFERENCE_WINDOW_MS
+        checkpoint.update({
+            'last_date': new_last_date,
+            'last_id': transaction_id - 1,
+            'reference_numbers': {reference_number: date for reference_number, date in references.items()
+                                  if date >= window_start},
+            'boundary_keys': sorted(new_boundary_keys)
+        })
+        
+        self.transactions = transactions
+        self.sms_ordinals = ordinals
+        print(f"Extracted {len(transactions)} new transactions from SMS records")
+        return transactions
+    
+    @staticmethod
+    def _sms_date_ms(sms: Dict[str, Any]) -> int:
+        """SMS date in epoch milliseconds, or -1 if missing or malformed"""
+        try:
+            return int(sms.get('date'))
+        except (TypeError, ValueError):
+            return -1
+    
+    @staticmethod
+    def load_checkpoint(checkpoint_file: Optional[str]) -> Dict[str, Any]:
+        """Load the incremental ETL watermark, or an empty one for a full run
+        
+        reference_numbers maps each recent reference number to its SMS date.
+        """
+        if checkpoint_file and os.path.exists(checkpoint_file):
+            with open(checkpoint_file, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            # Older checkpoints listed every reference number ever seen
+            if isinstance(checkpoint['reference_numbers'], list):
+                checkpoint['reference_numbers'] = dict.fromkeys(checkpoint['reference_numbers'],
+                                                                checkpoint['last_date'])
+            return checkpoint
+        
+        return {
+            'last_date': -1,
+            'last_id': 0,
+            'reference_numbers': {},
+            'boundary_keys': []
+        }
+    
+    @staticmethod
+    def save_checkpoint(checkpoint: Dict[str, Any], checkpoint_file: str):
+        """Save the incremental ETL watermark"""
+        try:
+            with open(checkpoint_file, 'w', encoding='utf-8') as f:
+                json.dump(checkpoint, f, ensure_ascii=False)
+            print(f"Checkpoint saved to {checkpoint_file}")
+        except Exception as e:
+            print(f"Error saving checkpoint: {e}")
+    
+    def save_to_json(self, output_file: str) -> bool:
+        """Save transactions to JSON file; returns whether it was written"""
         try:
             with open(output_file, 'w', encoding='utf-8') as f:
                 json.dump(self.transactions, f, indent=2, ensure_ascii=False)
             print(f"Transactions saved to {output_file}")
+            return True
         except Exception as e:
             print(f"Error saving to JSON: {e}")
+            return False
+    
+    @staticmethod
+    def _last_json_id(f) -> int:
+        """ID of the last record in a JSON array written by save_to_json, or 0"""
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        size = 64 * 1024
+        while True:
+            start = max(end - size, 0)
+            f.seek(start)
+            matches = JSON_RECORD_ID.findall(f.read(end - start))
+            if matches:
+                return int(matches[-1])
+            if start == 0:
+                return 0
+            size *= 4
+    
+    def append_to_json(self, output_file: str) -> bool:
+        """Append transactions to an existing JSON array written by save_to_json
+        
+        Only the closing bracket and the last record are read, so the existing
+        records are never re-read. Transactions at or below the last ID already
+        in the file are skipped, which makes re-applying a batch after a failed
+        run safe. The output is byte-identical to a full save_to_json() of the
+        combined list. Returns whether the transactions were written; the
+        checkpoint must not move past them otherwise.
+        """
+        if not os.path.exists(output_file):
+            return self.save_to_json(output_file)
+        
+        if not self.transactions:
+            return True
+        
+        try:
+            with open(output_file, 'rb') as f:
+                last_id = self._last_json_id(f)
+            transactions = [tx for tx in self.transactions if tx['id'] > last_id]
+            if len(transactions) < len(self.transactions):
+                print(f"Skipped {len(self.transactions) - len(transactions)} transactions already in {output_file}")
+            if not transactions:
+                return True
+            
+            entries = ',\n'.join(
+                '\n'.join('  ' + line for line in json.dumps(tx, indent=2, ensure_ascii=False).split('\n'))
+                for tx in transactions
+            )
+            
+            with open(output_file, 'r+b') as f:
+                # Walk back past the closing bracket to the last record (or the
+                # opening bracket of an empty array)
+                f.seek(0, os.SEEK_END)
+                position = f.tell()
+                last_char = b''
+                while position > 0 and last_char not in (b'}', b'['):
+                    position -= 1
+                    f.seek(position)
+                    last_char = f.read(1)
+                
+                is_empty = last_char == b'['
+                
+                f.seek(position + 1)
+                f.truncate()
+                separator = '\n' if is_empty else ',\n'
+                f.write((separator + entries + '\n]').encode('utf-8'))
+            
+            print(f"Appended {len(transactions)} transactions to {output_file}")
+            return True
+        except Exception as e:
+            print(f"Error appending to JSON: {e}")
+            return False
 
 def main():
-    """Main function to run SMS parsing"""
+    """Main function to run SMS parsing
+    
+    Runs incrementally: only messages newer than the stored watermark are
+    processed and appended to the output file. Delete the checkpoint file to
+    force a full rebuild.
+    """
     xml_file_path = 'data/raw/modified_sms_v2.xml'
     output_file = 'data/processed/transactions.json'
+    checkpoint_file = DEFAULT_CHECKPOINT_FILE
     
     print("SMS Transaction Parser Starting...")
     
     # Initialize parser
     parser = SMSTransactionParser(xml_file_path)
     
-    # Parse XML file
-    sms_records = parser.parse_xml()
+    # A missing checkpoint or output means the output must be rebuilt from scratch
+    full_run = not os.path.exists(checkpoint_file) or not os.path.exists(output_file)
+    checkpoint = parser.load_checkpoint(None if full_run else checkpoint_file)
     
-    if not sms_records:
-        print("No SMS records found")
-        return
+    # Stream SMS records straight into transaction extraction
+    transactions = parser.process_new_transactions(parser.iter_sms_records(), checkpoint)
     
-    # Convert SMS to transactions
-    transactions = parser.process_sms_to_transactions()
+    if full_run:
+        if not transactions:
+            print("No transactions extracted")
+            return
+        written = parser.save_to_json(output_file)
+    else:
+        written = parser.append_to_json(output_file)
+    
+    # Only move the watermark past transactions that were written
+    if not written:
+        print("Checkpoint not saved; the next run will retry these messages")
+        return
     
-    # Save to JSON
-    parser.save_to_json(output_file)
+    # Imported here: the index module builds on this one
+    from etl.sms_index import build_sms_index
+    build_sms_index(parser, merge=not full_run)
+    parser.save_checkpoint(checkpoint, checkpoint_file)
     
     print(f"Processed {len(transactions)} transactions")
     return transactions
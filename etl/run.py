@@ -1,2 +1,233 @@
+#!/usr/bin/env python3
+"""
+ETL Pipeline Runner for MoMo SMS Data
 
+Runs the SMS parser either serially (streaming) or in parallel. The parallel
+mode splits the backup into byte-range chunks aligned on <sms boundaries,
+parses and extracts each chunk in a process pool, and renumbers the results
+in file order so IDs and ordering match the serial run exactly.
+"""
 
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from multiprocessing import Pool
+from typing import List, Dict, Any, Optional, Tuple
+sys.path.append('.')
+from etl.parse_xml import SMSTransactionParser, DEFAULT_CHECKPOINT_FILE
+from etl.export_json import DEFAULT_DASHBOARD_FILE, build_dashboard, update_dashboard
+from etl.sms_index import DEFAULT_SMS_INDEX_FILE, build_sms_index, next_sms_start
+from api.snapshot import DEFAULT_SNAPSHOT_FILE, write_snapshot, append_to_snapshot
+
+DEFAULT_XML_FILE = 'data/raw/modified_sms_v2.xml'
+DEFAULT_OUTPUT_FILE = 'data/processed/transactions.json'
+
+# Target size of a single chunk handed to a worker
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+
+SMSES_END = b'</smses>'
+
+def find_chunk_boundaries(xml_file_path: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> List[Tuple[int, int]]:
+    """
+    Split an SMS backup into byte ranges that each hold whole <sms> elements
+
+    Literal '<' cannot appear inside XML attribute values, so every '<sms'
+    outside comments, CDATA sections, processing instructions and the
+    DOCTYPE is the start of an element and a safe cut point.
+
+    Returns:
+        List of (start, end) byte offsets covering every <sms> element in order
+    """
+    if os.path.getsize(xml_file_path) == 0:
+        return []
+
+    with open(xml_file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        first = next_sms_start(data, 0)
+
+        # Locate the closing root tag by scanning the tail of the file
+        end_pos = data.rfind(SMSES_END, max(len(data) - 4096, first))
+        body_end = end_pos if end_pos != -1 else len(data)
+
+        cuts = [first]
+        offset = first + chunk_bytes
+        while offset < body_end:
+            cut = next_sms_start(data, offset, cuts[-1])
+            if cut >= body_end:
+                break
+            cuts.append(cut)
+            offset = cut + chunk_bytes
+
+    cuts.append(body_end)
+    return [(cuts[i], cuts[i + 1]) for i in range(len(cuts) - 1) if cuts[i] < cuts[i + 1]]
+
+def parse_chunk(task: Tuple[str, int, int]) -> Tuple[int, List[Dict[str, Any]], List[int]]:
+    """
+    Worker: parse one byte range of the backup and extract its transactions
+
+    Transactions are returned with a placeholder ID of 0, and SMS ordinals
+    relative to the chunk; the parent process assigns final IDs and ordinals
+    once chunk results are stitched back together in order.
+
+    Returns:
+        (SMS elements in the chunk, transactions, chunk-relative SMS ordinals)
+    """
+    xml_file_path, start, end = task
+
+    with open(xml_file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    root = ET.fromstring(b'<smses>' + data + SMSES_END)
+    parser = SMSTransactionParser(xml_file_path)
+
+    transactions = []
+    ordinals = []
+    sms_count = 0
+    for sms in root.iter('sms'):
+        transaction = parser.build_transaction(parser._sms_element_to_record(sms), 0)
+        if transaction:
+            transactions.append(transaction)
+            ordinals.append(sms_count)
+        sms_count += 1
+
+    return sms_count, transactions, ordinals
+
+def run_parallel(xml_file_path: str, workers: int = None,
+                 chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> Tuple[List[Dict[str, Any]], List[int], int]:
+    """
+    Parse and extract an SMS backup across a process pool
+
+    Args:
+        xml_file_path: Path to the SMS backup XML file
+        workers: Number of worker processes (default: CPU count)
+        chunk_bytes: Target chunk size in bytes
+
+    Returns:
+        Transactions with the same IDs and order as the serial parser, the
+        SMS ordinal each one came from, and the number of SMS elements
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = find_chunk_boundaries(xml_file_path, chunk_bytes)
+    tasks = [(xml_file_path, start, end) for start, end in chunks]
+
+    print(f"Parsing {len(tasks)} chunks with {workers} workers")
+
+    transactions = []
+    ordinals = []
+    transaction_id = 1
+    first_ordinal = 0
+
+    with Pool(processes=workers) as pool:
+        # imap yields chunk results in submission order, preserving file order
+        for sms_count, chunk_transactions, chunk_ordinals in pool.imap(parse_chunk, tasks):
+            for transaction, ordinal in zip(chunk_transactions, chunk_ordinals):
+                transaction['id'] = transaction_id
+                transactions.append(transaction)
+                ordinals.append(first_ordinal + ordinal)
+                transaction_id += 1
+            first_ordinal += sms_count
+
+    print(f"Extracted {len(transactions)} transactions from SMS records")
+    return transactions, ordinals, first_ordinal
+
+def run_serial(xml_file_path: str) -> Tuple[List[Dict[str, Any]], List[int], Optional[int]]:
+    """Parse and extract an SMS backup in a single streaming pass (returns as run_parallel)"""
+    parser = SMSTransactionParser(xml_file_path)
+    transactions = parser.process_sms_to_transactions(parser.iter_sms_records())
+    return transactions, parser.sms_ordinals, parser.sms_count
+
+def save_snapshot(transactions: List[Dict[str, Any]], snapshot_file: str):
+    """Write the binary snapshot the API starts from with --store snapshot"""
+    count = write_snapshot(transactions, snapshot_file)
+    print(f"Snapshot of {count} transactions saved to {snapshot_file}")
+
+def update_snapshot(new_transactions: List[Dict[str, Any]], snapshot_file: str, all_transactions_file: str):
+    """Add new transactions to the snapshot, rebuilding it from the JSON output if it is missing"""
+    if os.path.exists(snapshot_file):
+        count = append_to_snapshot(new_transactions, snapshot_file)
+        print(f"Snapshot updated to {count} transactions")
+    else:
+        with open(all_transactions_file, 'r', encoding='utf-8') as f:
+            save_snapshot(json.load(f), snapshot_file)
+
+def run_incremental(xml_file_path: str, output_file: str, checkpoint_file: str = DEFAULT_CHECKPOINT_FILE,
+                    dashboard_file: str = DEFAULT_DASHBOARD_FILE, snapshot_file: str = DEFAULT_SNAPSHOT_FILE,
+                    sms_index_file: str = DEFAULT_SMS_INDEX_FILE) -> List[Dict[str, Any]]:
+    """Process only messages newer than the checkpoint, append them to the output
+    and snapshot, fold them into the dashboard aggregates and index their SMS offsets"""
+    parser = SMSTransactionParser(xml_file_path)
+
+    full_run = not os.path.exists(checkpoint_file) or not os.path.exists(output_file)
+    checkpoint = parser.load_checkpoint(None if full_run else checkpoint_file)
+    transactions = parser.process_new_transactions(parser.iter_sms_records(), checkpoint)
+
+    written = parser.save_to_json(output_file) if full_run else parser.append_to_json(output_file)
+    if not written:
+        # The watermark stays put, so the next run retries these messages
+        raise OSError(f"Could not write {output_file}; checkpoint not saved")
+
+    if full_run:
+        save_snapshot(transactions, snapshot_file)
+        build_dashboard(transactions, dashboard_file)
+    else:
+        update_snapshot(transactions, snapshot_file, output_file)
+        update_dashboard(transactions, dashboard_file, output_file)
+    build_sms_index(parser, sms_index_file, merge=not full_run)
+
+    # Saved last: any failure above leaves the watermark before these messages.
+    # The retry extracts them again with the same IDs, and the JSON, snapshot,
+    # dashboard and index each skip the IDs they already hold
+    parser.save_checkpoint(checkpoint, checkpoint_file)
+    return transactions
+
+def main():
+    """Main function to run the ETL pipeline"""
+    arg_parser = argparse.ArgumentParser(description='Run the MoMo SMS ETL pipeline')
+    arg_parser.add_argument('--input', default=DEFAULT_XML_FILE, help='SMS backup XML file')
+    arg_parser.add_argument('--output', default=DEFAULT_OUTPUT_FILE, help='Transactions JSON output file')
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes; 1 runs serially, 0 uses every CPU')
+    arg_parser.add_argument('--chunk-mb', type=float, default=DEFAULT_CHUNK_BYTES / (1024 * 1024),
+                            help='Target chunk size in MB for parallel mode')
+    arg_parser.add_argument('--incremental', action='store_true',
+                            help='Only process messages newer than the checkpoint watermark')
+    arg_parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_FILE, help='Incremental checkpoint file')
+    arg_parser.add_argument('--dashboard', default=DEFAULT_DASHBOARD_FILE, help='Dashboard aggregates output file')
+    arg_parser.add_argument('--snapshot', default=DEFAULT_SNAPSHOT_FILE,
+                            help='Binary snapshot output file (loaded by the API at startup)')
+    arg_parser.add_argument('--sms-index', default=DEFAULT_SMS_INDEX_FILE,
+                            help='SMS offset index output file (byte range of each message in the input)')
+    args = arg_parser.parse_args()
+
+    print("ETL Pipeline Starting...")
+    start_time = time.perf_counter()
+
+    if args.incremental:
+        transactions = run_incremental(args.input, args.output, args.checkpoint, args.dashboard, args.snapshot,
+                                       args.sms_index)
+    else:
+        if args.workers == 1:
+            transactions, ordinals, sms_count = run_serial(args.input)
+        else:
+            transactions, ordinals, sms_count = run_parallel(args.input, args.workers or None,
+                                                             int(args.chunk_mb * 1024 * 1024))
+
+        parser = SMSTransactionParser(args.input)
+        parser.transactions = transactions
+        parser.sms_ordinals = ordinals
+        parser.sms_count = sms_count
+        parser.save_to_json(args.output)
+        save_snapshot(transactions, args.snapshot)
+        build_dashboard(transactions, args.dashboard)
+        build_sms_index(parser, args.sms_index)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Processed {len(transactions)} transactions in {elapsed:.2f}s")
+    return transactions
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+SMS Offset Index for MoMo SMS Data
+
+A sidecar file, written by the ETL, that records where every <sms> element
+sits in the XML backup, so a single message can be read back without
+parsing the whole file:
+
+    header        magic, version, table sizes, and the size and mtime of
+                  the backup it describes
+    ranges        one (start, end) byte range per SMS, by ordinal (the
+                  position of the <sms> element in the backup, from 0)
+    references    (reference number, ordinal) pairs sorted by reference
+    transactions  (transaction ID, ordinal) pairs sorted by ID
+
+RawSMSReader memory-maps the backup and the index, and decodes one element
+on demand: "show the raw message" for a transaction, or re-running
+extraction on it after the patterns change, costs one small read instead of
+a full parse.
+
+The ranges come from a byte scan of the backup rather than from the parse
+itself: ElementTree's iterparse does not report byte offsets, and moving
+the parse onto expat callbacks to get them would slow every reader of
+iter_sms_records, not just the runs that write an index. The scan skips comments, CDATA sections, processing instructions and the
+DOCTYPE, and the index is only written when it finds exactly as many <sms>
+elements as the parser yielded records, so ordinals always agree.
+"""
+
+import mmap
+import os
+import re
+import struct
+import sys
+import xml.etree.ElementTree as ET
+from bisect import bisect_left
+from typing import Dict, Any, Optional, List, Tuple
+sys.path.append('.')
+from etl.parse_xml import SMSTransactionParser
+
+DEFAULT_SMS_INDEX_FILE = 'data/processed/sms_offsets.idx'
+
+SMS_INDEX_MAGIC = b'MOMOSMSI'
+SMS_INDEX_VERSION = 1
+
+# magic, version, reserved, reserved, SMS count, reference count,
+# transaction count, backup size, backup mtime (ns)
+HEADER = struct.Struct('<8sHHI5Q')
+
+# (start, end) byte range, and (key, ordinal) lookup entries
+RANGE = struct.Struct('<QQ')
+KEY = struct.Struct('<QQ')
+
+# Start of an <sms> element (but not the <smses> root)
+SMS_START = re.compile(rb'<sms[\s/>]')
+SMS_END = re.compile(rb'</sms\s*>')
+
+# An <sms> element start, or markup whose content is not elements
+MARKUP_START = re.compile(rb'<(?:(sms)[\s/>]|!--|!\[CDATA\[|\?|!DOCTYPE)')
+
+# Where each kind of skipped markup ends
+MARKUP_END = {b'<!--': b'-->', b'<![C': b']]>', b'<!DO': b'>'}
+
+# Start of markup that scan_sms_ranges skips
+SKIPPED_MARKUP_START = re.compile(rb'<(?:!--|!\[CDATA\[|\?|!DOCTYPE)')
+
+def _skipped_markup_end(data, match) -> int:
+    """Offset just past the comment, CDATA section, PI or DOCTYPE match opens"""
+    start = match.start()
+    if data[start:start + 4] == b'<!DO' and data.find(b'[', start, data.find(b'>', start)) != -1:
+        closer = b']>'
+    else:
+        closer = MARKUP_END.get(data[start:start + 4], b'?>')
+    end = data.find(closer, match.end())
+    return len(data) if end == -1 else end + len(closer)
+
+def next_sms_start(data, position: int, outside: int = 0) -> int:
+    """
+    Offset of the first <sms> element at or after position (len(data) if none)
+
+    outside is an offset no later than position that is known not to be
+    inside skipped markup (0, or an earlier result); only the markup opened
+    between outside and a candidate '<sms' is examined, so successive calls
+    with the previous result as outside read the file once between them.
+    """
+    while True:
+        match = SMS_START.search(data, position)
+        if match is None:
+            return len(data)
+        candidate = match.start()
+        while True:
+            markup = SKIPPED_MARKUP_START.search(data, outside, candidate)
+            if markup is None:
+                return candidate
+            outside = _skipped_markup_end(data, markup)
+            if outside > candidate:
+                # The candidate is inside the markup: look again after it
+                position = outside
+                break
+
+def scan_sms_ranges(data) -> List[Tuple[int, int]]:
+    """
+    Byte range of every <sms> element in a backup, in document order
+
+    Literal '<' cannot appear inside XML attribute values, so an element
+    runs from its '<sms' to just before the next '<' (or through its
+    '</sms>' when it is not self-closing). '<sms' inside comments, CDATA
+    sections, processing instructions and the DOCTYPE is not an element.
+    """
+    ranges = []
+    position = 0
+    while True:
+        match = MARKUP_START.search(data, position)
+        if match is None:
+            return ranges
+        start = match.start()
+
+        if match.group(1) is None:
+            position = _skipped_markup_end(data, match)
+            continue
+
+        end = data.find(b'<', start + 1)
+        end_tag = SMS_END.match(data, end) if end != -1 else None
+        if end == -1:
+            end = len(data)
+        elif end_tag:
+            end = end_tag.end()
+        else:
+            while end > start and data[end - 1:end].isspace():
+                end -= 1
+        ranges.append((start, end))
+        position = end
+
+def _source_stat(xml_file_path: str) -> Tuple[int, int]:
+    stat = os.stat(xml_file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def _file_identity(path: str) -> Tuple[int, int, int, int]:
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+def _key_table(keys: Dict[int, int]) -> bytes:
+    return b''.join(KEY.pack(key, ordinal) for key, ordinal in sorted(keys.items()))
+
+def _scan_file(xml_file_path: str) -> List[Tuple[int, int]]:
+    with open(xml_file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return scan_sms_ranges(data)
+
+def write_sms_index(xml_file_path: str, index_file: str, ranges: List[Tuple[int, int]],
+                    references: Dict[int, int], transaction_ids: Dict[int, int]) -> int:
+    """
+    Write the index for a backup
+
+    Args:
+        ranges: (start, end) byte range of every SMS, by ordinal
+        references: reference number -> SMS ordinal
+        transaction_ids: transaction ID -> SMS ordinal
+
+    Returns:
+        Number of SMS elements indexed
+    """
+    size, mtime_ns = _source_stat(xml_file_path)
+    header = HEADER.pack(SMS_INDEX_MAGIC, SMS_INDEX_VERSION, 0, 0, len(ranges), len(references),
+                         len(transaction_ids), size, mtime_ns)
+
+    temporary_file = index_file + '.tmp'
+    with open(temporary_file, 'wb') as f:
+        f.write(header)
+        f.write(b''.join(RANGE.pack(start, end) for start, end in ranges))
+        f.write(_key_table(references))
+        f.write(_key_table(transaction_ids))
+    os.replace(temporary_file, index_file)
+    return len(ranges)
+
+def build_sms_index(parser: SMSTransactionParser, index_file: str = DEFAULT_SMS_INDEX_FILE,
+                    merge: bool = False) -> int:
+    """
+    Write the index for the transactions a parser just extracted
+
+    The parser must have streamed the whole backup (parser.sms_count set).
+    If the scan finds a different number of <sms> elements, the ordinals
+    would point at the wrong messages, so no index is written.
+
+    With merge (incremental runs), lookups from the existing index are kept
+    as long as the backup only grew: every range it recorded must still be
+    at the same place.
+
+    Returns:
+        Number of SMS elements indexed (0 if the index was not written)
+    """
+    ranges = _scan_file(parser.xml_file_path)
+    if len(ranges) != parser.sms_count:
+        print(f"Error: found {len(ranges)} <sms> elements in {parser.xml_file_path} but parsed "
+              f"{parser.sms_count}; SMS offset index not written")
+        return 0
+
+    references, transaction_ids = {}, {}
+    if merge and os.path.exists(index_file):
+        try:
+            with SMSOffsetIndex(index_file) as previous:
+                if ranges[:len(previous)] == [previous.range_of(i) for i in range(len(previous))]:
+                    references = previous.references()
+                    transaction_ids = previous.transaction_ids()
+        except ValueError:
+            pass
+
+    for tx, ordinal in zip(parser.transactions, parser.sms_ordinals):
+        transaction_ids[tx['id']] = ordinal
+        reference_number = tx.get('reference_number')
+        if reference_number and reference_number.isdigit() and int(reference_number) < 2 ** 64:
+            references[int(reference_number)] = ordinal
+
+    count = write_sms_index(parser.xml_file_path, index_file, ranges, references, transaction_ids)
+    print(f"SMS offset index of {count} messages saved to {index_file}")
+    return count
+
+class SMSOffsetIndex:
+    """Memory-mapped offset index file"""
+
+    def __init__(self, index_file: str):
+        self.index_file = index_file
+        with open(index_file, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, _, _, self.count, self._reference_count, self._transaction_count,
+         self.source_size, self.source_mtime_ns) = HEADER.unpack_from(self._map)
+        if magic != SMS_INDEX_MAGIC or version != SMS_INDEX_VERSION:
+            self._map.close()
+            raise ValueError(f"Not a version {SMS_INDEX_VERSION} SMS offset index: {index_file}")
+
+        self._references_offset = HEADER.size + self.count * RANGE.size
+        self._transactions_offset = self._references_offset + self._reference_count * KEY.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmap the index"""
+        self._map.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def range_of(self, ordinal: int) -> Tuple[int, int]:
+        """(start, end) byte range of an SMS ordinal"""
+        if not 0 <= ordinal < self.count:
+            raise IndexError(f"SMS ordinal out of range: {ordinal}")
+        return RANGE.unpack_from(self._map, HEADER.size + ordinal * RANGE.size)
+
+    def _lookup(self, offset: int, count: int, key: int) -> Optional[int]:
+        """Binary search a (key, ordinal) table for key"""
+        keys = _KeyView(self._map, offset, count)
+        position = bisect_left(keys, key)
+        if position < count and keys[position] == key:
+            return KEY.unpack_from(self._map, offset + position * KEY.size)[1]
+        return None
+
+    def ordinal_for_reference(self, reference_number: str) -> Optional[int]:
+        """SMS ordinal of a transaction reference number"""
+        if not reference_number.isdigit():
+            return None
+        return self._lookup(self._references_offset, self._reference_count, int(reference_number))
+
+    def ordinal_for_transaction(self, transaction_id: int) -> Optional[int]:
+        """SMS ordinal a transaction ID was extracted from"""
+        return self._lookup(self._transactions_offset, self._transaction_count, transaction_id)
+
+    def _table(self, offset: int, count: int) -> Dict[int, int]:
+        return dict(KEY.iter_unpack(self._map[offset:offset + count * KEY.size]))
+
+    def references(self) -> Dict[int, int]:
+        """Every reference number -> ordinal entry"""
+        return self._table(self._references_offset, self._reference_count)
+
+    def transaction_ids(self) -> Dict[int, int]:
+        """Every transaction ID -> ordinal entry"""
+        return self._table(self._transactions_offset, self._transaction_count)
+
+class _KeyView:
+    """Read-only sequence of the keys of a (key, ordinal) table, for bisecting"""
+
+    def __init__(self, data, offset: int, count: int):
+        self._data = data
+        self._offset = offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, position: int) -> int:
+        return KEY.unpack_from(self._data, self._offset + position * KEY.size)[0]
+
+class RawSMSReader:
+    """Reads single <sms> elements from a memory-mapped backup through its offset index"""
+
+    def __init__(self, xml_file_path: str, index_file: str = DEFAULT_SMS_INDEX_FILE):
+        self.xml_file_path = xml_file_path
+        self.index_file = index_file
+        self._index_identity = _file_identity(index_file)
+        self.index = SMSOffsetIndex(index_file)
+        if (self.index.source_size, self.index.source_mtime_ns) != _source_stat(xml_file_path):
+            self.index.close()
+            raise ValueError(f"SMS offset index {index_file} is out of date for {xml_file_path}; rerun the ETL")
+
+        with open(xml_file_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.parser = SMSTransactionParser(xml_file_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmap the backup and the index"""
+        self._map.close()
+        self.index.close()
+
+    def is_current(self) -> bool:
+        """Whether the index file is the one opened and still describes the backup
+
+        The ETL replaces the index rather than rewriting it, so a reader left
+        open after a rerun keeps serving the old mapping until reopened.
+        """
+        try:
+            return (_file_identity(self.index_file) == self._index_identity and
+                    _source_stat(self.xml_file_path) == (self.index.source_size, self.index.source_mtime_ns))
+        except OSError:
+            return False
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def raw(self, ordinal: int) -> memoryview:
+        """The bytes of one <sms> element, as a view of the mapping (release it before close())"""
+        start, end = self.index.range_of(ordinal)
+        return memoryview(self._map)[start:end]
+
+    def record(self, ordinal: int) -> Dict[str, Any]:
+        """One SMS record, as yielded by SMSTransactionParser.iter_sms_records()"""
+        with self.raw(ordinal) as element:
+            return self.parser._sms_element_to_record(ET.fromstring(element))
+
+    def transaction(self, ordinal: int, transaction_id: int = 0) -> Optional[Dict[str, Any]]:
+        """Re-run extraction on one SMS (None if it is not a transaction)"""
+        return self.parser.build_transaction(self.record(ordinal), transaction_id)
+
+    def record_for_reference(self, reference_number: str) -> Optional[Dict[str, Any]]:
+        """The SMS record a reference number was extracted from"""
+        ordinal = self.index.ordinal_for_reference(reference_number)
+        return self.record(ordinal) if ordinal is not None else None
+
+    def record_for_transaction(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        """The SMS record a transaction ID was extracted from"""
+        ordinal = self.index.ordinal_for_transaction(transaction_id)
+        return self.record(ordinal) if ordinal is not None else None
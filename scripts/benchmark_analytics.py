@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Analytics Benchmark for MoMo SMS Data Processing System
+Compares the vectorized NumPy analytics in etl/analytics.py with the
+equivalent pure-Python loops over lists of transaction dicts, checks that
+both give the same answers, and reports the time of each.
+
+Usage: python scripts/benchmark_analytics.py [rows]
+"""
+
+import math
+import sys
+import time
+from collections import defaultdict
+sys.path.append('.')
+from etl.analytics import (TransactionArrays, sums_by_type, sums_by_period, sums_by_type_and_period,
+                           closing_balance_by_period, percentiles_by_type, histograms_by_type)
+
+DEFAULT_ROWS = 1_000_000
+PERCENTILES = (50, 90, 99)
+BINS = 20
+
+def synthetic_transactions(count):
+    """Generate transactions shaped like the ETL output, spread over two years"""
+    types = ['payment', 'transfer', 'deposit', 'receive']
+    for i in range(1, count + 1):
+        seconds = i * 63_072_000 // count
+        day, second = divmod(seconds, 86_400)
+        year, day_of_year = divmod(day, 365)
+        month, day_of_month = min(day_of_year // 30, 11), day_of_year % 28
+        yield {
+            'id': i,
+            'transaction_type': types[i % 4],
+            'amount': float((i * 7919) % 50_000 + 100),
+            'currency': 'RWF',
+            'sender': 'Self',
+            'receiver': f'Customer {i % 500}',
+            'timestamp': f'{2023 + year}-{month + 1:02d}-{day_of_month + 1:02d}T'
+                         f'{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}',
+            'status': 'completed',
+            'reference_number': str(70_000_000_000 + i),
+            'balance': float((i * 104_729) % 1_000_000),
+            'fee': float(i % 3 * 50),
+            'message': ''
+        }
+
+# Dict-loop reference implementations
+
+def loop_sums_by_type(transactions):
+    totals = {}
+    for tx in transactions:
+        bucket = totals.setdefault(tx['transaction_type'], {'count': 0, 'amount': 0.0, 'fees': 0.0})
+        bucket['count'] += 1
+        bucket['amount'] += tx['amount']
+        bucket['fees'] += tx['fee']
+    return totals
+
+def loop_sums_by_month(transactions):
+    totals = {}
+    for tx in transactions:
+        bucket = totals.setdefault(tx['timestamp'][:7], {'count': 0, 'amount': 0.0, 'fees': 0.0})
+        bucket['count'] += 1
+        bucket['amount'] += tx['amount']
+        bucket['fees'] += tx['fee']
+    return dict(sorted(totals.items()))
+
+def loop_sums_by_type_and_month(transactions):
+    totals = defaultdict(dict)
+    for tx in transactions:
+        bucket = totals[tx['transaction_type']].setdefault(
+            tx['timestamp'][:7], {'count': 0, 'amount': 0.0, 'fees': 0.0})
+        bucket['count'] += 1
+        bucket['amount'] += tx['amount']
+        bucket['fees'] += tx['fee']
+    return {name: dict(sorted(months.items())) for name, months in totals.items()}
+
+def loop_closing_balance_by_day(transactions):
+    closing = {}
+    for tx in sorted(transactions, key=lambda tx: tx['timestamp']):
+        closing[tx['timestamp'][:10]] = tx['balance']
+    return closing
+
+def loop_percentile(sorted_values, p):
+    position = (len(sorted_values) - 1) * p / 100
+    low = math.floor(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+def loop_percentiles_by_type(transactions):
+    amounts = defaultdict(list)
+    for tx in transactions:
+        amounts[tx['transaction_type']].append(tx['amount'])
+    result = {}
+    for name, values in amounts.items():
+        values.sort()
+        result[name] = {f'p{p}': loop_percentile(values, p) for p in PERCENTILES}
+    return result
+
+def loop_histograms_by_type(transactions):
+    low = min(tx['amount'] for tx in transactions)
+    high = max(tx['amount'] for tx in transactions)
+    width = (high - low) / BINS
+    counts = {}
+    for tx in transactions:
+        index = min(int((tx['amount'] - low) / width), BINS - 1)
+        counts.setdefault(tx['transaction_type'], [0] * BINS)[index] += 1
+    return counts
+
+def close(a, b):
+    """Recursive equality allowing float rounding differences"""
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(close(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(close(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+    return a == b
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+def main():
+    """Run the analytics benchmark"""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    transactions = list(synthetic_transactions(rows))
+
+    arrays, convert_ms = timed(TransactionArrays.from_transactions, transactions)
+
+    cases = [
+        ('sums by type', lambda: loop_sums_by_type(transactions), lambda: sums_by_type(arrays)),
+        ('sums by month', lambda: loop_sums_by_month(transactions), lambda: sums_by_period(arrays, 'month')),
+        ('sums by type+month', lambda: loop_sums_by_type_and_month(transactions),
+         lambda: sums_by_type_and_period(arrays, 'month')),
+        ('closing balance/day', lambda: loop_closing_balance_by_day(transactions),
+         lambda: closing_balance_by_period(arrays, 'day')),
+        ('percentiles by type', lambda: loop_percentiles_by_type(transactions),
+         lambda: percentiles_by_type(arrays, PERCENTILES)),
+        ('histograms by type', lambda: loop_histograms_by_type(transactions),
+         lambda: histograms_by_type(arrays, BINS)['counts']),
+    ]
+
+    print(f"\nAnalytics over {rows:,} transactions (ms)")
+    print("=" * 62)
+    print(f"one-time conversion to arrays: {convert_ms:,.1f} ms")
+    print(f"{'analytic':<22} {'dict loop':>12} {'numpy':>10} {'speedup':>9} {'same':>6}")
+
+    loop_total = numpy_total = 0.0
+    for name, loop_version, numpy_version in cases:
+        expected, loop_ms = timed(loop_version)
+        actual, numpy_ms = timed(numpy_version)
+        loop_total += loop_ms
+        numpy_total += numpy_ms
+        print(f"{name:<22} {loop_ms:>12,.1f} {numpy_ms:>10,.1f} {loop_ms / numpy_ms:>8.1f}x "
+              f"{'yes' if close(expected, actual) else 'NO':>6}")
+
+    print(f"{'total':<22} {loop_total:>12,.1f} {numpy_total:>10,.1f} {loop_total / numpy_total:>8.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Authentication Benchmark for MoMo SMS Data Processing System
+Measures the authentication cost per request: the previous plaintext
+comparison, salted hash verification on every request, the cached path
+taken by repeat Basic Auth clients, and HMAC bearer tokens.
+
+Usage: python scripts/benchmark_auth.py [requests]
+"""
+
+import base64
+import sys
+import time
+sys.path.append('.')
+from api.auth import Authenticator, CredentialStore, DEFAULT_CREDENTIALS_FILE
+
+DEFAULT_REQUESTS = 100_000
+
+# Slow paths are timed on fewer requests
+HASHED_REQUESTS = 20
+
+CLIENTS = [('admin', 'password123'), ('user', 'momo2024'), ('api', 'sms_data')]
+
+def basic_header(username, password):
+    return 'Basic ' + base64.b64encode(f'{username}:{password}'.encode()).decode()
+
+def plaintext_authenticate(header):
+    """The previous check: credentials dict built per connection, plaintext compare"""
+    valid_credentials = {
+        'admin': 'password123',
+        'user': 'momo2024',
+        'api': 'sms_data'
+    }
+    username, password = base64.b64decode(header.split(' ')[1]).decode('utf-8').split(':', 1)
+    return username if valid_credentials.get(username) == password else None
+
+def time_per_request(authenticate, headers, requests):
+    """Mean seconds per call over requests calls cycling through headers"""
+    start = time.perf_counter()
+    for i in range(requests):
+        if authenticate(headers[i % len(headers)]) is None:
+            raise RuntimeError("Authentication failed")
+    return (time.perf_counter() - start) / requests
+
+def main():
+    """Run the authentication benchmark"""
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REQUESTS
+    credentials = CredentialStore.load(DEFAULT_CREDENTIALS_FILE)
+    basic_headers = [basic_header(username, password) for username, password in CLIENTS]
+
+    uncached = Authenticator(credentials)
+    uncached.cache.max_entries = 0
+    cached = Authenticator(credentials)
+    bearer_headers = ['Bearer ' + cached.issue_token(username) for username, _ in CLIENTS]
+
+    cases = [
+        ('plaintext compare (previous)', plaintext_authenticate, basic_headers, requests),
+        ('salted hash, every request', uncached.authenticate, basic_headers, HASHED_REQUESTS),
+        ('salted hash + header cache', cached.authenticate, basic_headers, requests),
+        ('HMAC bearer token', cached.authenticate, bearer_headers, requests),
+    ]
+
+    print(f"\nAuthentication cost per request ({len(CLIENTS)} clients)")
+    print("=" * 62)
+    print(f"{'method':<32} {'us/request':>12} {'max req/s/core':>15}")
+    for name, authenticate, headers, count in cases:
+        seconds = time_per_request(authenticate, headers, count)
+        print(f"{name:<32} {seconds * 1e6:>12,.1f} {1 / seconds:>15,.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+SQLite Load Benchmark for MoMo SMS Data Processing System
+Measures rows/sec when loading transactions into the SQLite database: the
+bulk loader (one executemany per table inside a single WAL transaction)
+against inserting one row per transaction through SQLiteTransactionStore.add,
+which commits after every row.
+
+Usage: python scripts/benchmark_db_load.py [rows] [row_by_row_rows]
+"""
+
+import os
+import sys
+import tempfile
+import time
+sys.path.append('.')
+from api.db import SQLiteTransactionStore
+from etl.load_db import connect, create_schema, bulk_load_transactions
+
+DEFAULT_ROWS = 1_000_000
+DEFAULT_ROW_BY_ROW_ROWS = 10_000
+
+def synthetic_transactions(count):
+    """Generate transactions shaped like the ETL output"""
+    types = ['payment', 'transfer', 'deposit', 'receive']
+    for i in range(1, count + 1):
+        yield {
+            'id': i,
+            'transaction_type': types[i % 4],
+            'amount': float(i % 50_000),
+            'currency': 'RWF',
+            'sender': 'Self',
+            'receiver': f'Customer {i % 500}',
+            'timestamp': '2024-05-10T16:30:58',
+            'status': 'completed',
+            'reference_number': str(70_000_000_000 + i),
+            'balance': 1000.0,
+            'fee': 0.0,
+            'message': f'TxId: {70_000_000_000 + i}. Your payment of 1,000 RWF to Jane Smith 12845 has been completed.'
+        }
+
+def bulk_rows_per_second(db_path, rows):
+    """Rows/sec for the bulk loader (transactions are generated up front)"""
+    transactions = list(synthetic_transactions(rows))
+    conn = connect(db_path)
+    try:
+        create_schema(conn)
+        start = time.perf_counter()
+        bulk_load_transactions(conn, transactions)
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+    return rows / elapsed, elapsed
+
+def row_by_row_rows_per_second(db_path, rows):
+    """Rows/sec inserting through the API store, one committed row at a time"""
+    transactions = list(synthetic_transactions(rows))
+    store = SQLiteTransactionStore(db_path, pool_size=1)
+    try:
+        start = time.perf_counter()
+        for tx in transactions:
+            store.add(tx)
+        elapsed = time.perf_counter() - start
+    finally:
+        store.close()
+    return rows / elapsed, elapsed
+
+def main():
+    """Run the SQLite load benchmark"""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    row_by_row_rows = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_ROW_BY_ROW_ROWS
+
+    print("\nSQLite load throughput")
+    print("=" * 50)
+    with tempfile.TemporaryDirectory() as tmp:
+        rate, elapsed = bulk_rows_per_second(os.path.join(tmp, 'bulk.db'), rows)
+        print(f"bulk load       {rows:>10,} rows  {elapsed:>7.2f}s  {rate:>10,.0f} rows/s")
+
+        rate, elapsed = row_by_row_rows_per_second(os.path.join(tmp, 'rows.db'), row_by_row_rows)
+        print(f"row by row      {row_by_row_rows:>10,} rows  {elapsed:>7.2f}s  {rate:>10,.0f} rows/s")
+
+if __name__ == '__main__':
+    main()
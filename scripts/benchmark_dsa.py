@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+DSA Lookup Benchmark Suite for MoMo SMS Data Processing System
+Benchmarks the DSAPerformanceAnalyzer lookups on synthetic datasets of 1k to
+10M rows, for three workloads:
+
+    hit           IDs that exist
+    miss          IDs that do not (gaps left in the ID sequence, and IDs past the end)
+    random        IDs drawn uniformly from the whole ID range (about 90% hits)
+    insert_delete insert then delete of absent IDs, for the dict and the
+                  open-addressing hash index (a sorted list would need O(n) moves)
+    range         amount range queries of about RANGE_ROWS rows: sorted index
+                  against a linear scan
+    top_k         the TOP_K largest amounts: sorted index against a heap scan
+    sorted_insert insert then remove of an (amount, ID) entry: sorted blocks
+                  against one flat sorted list
+
+Bulk build times of the dict and the hash index are printed per size.
+
+Timing follows dsa/timing.py (calibration, warmup, repeated perf_counter_ns
+samples, median and 95% confidence intervals). The suite runs --runs times,
+each in a separate process, and keeps every run's median: medians of the
+same code differ by tens of percent between processes, far more than the
+in-process confidence interval shows. Results are written as JSON, tagged
+with the git commit, so two result files can be compared:
+
+    python scripts/benchmark_dsa.py --output before.json
+    ... change something ...
+    python scripts/benchmark_dsa.py --output after.json
+    python scripts/benchmark_dsa.py --compare before.json after.json
+
+--compare exits with status 1 when any result regressed: its median moved
+beyond --threshold and all its runs were slower than all baseline runs.
+Runs made at different times also differ by the machine's slow drifts
+(other load, thermal state), so the most reliable check runs a baseline
+revision and this tree alternately, in the same session:
+
+    python scripts/benchmark_dsa.py --against HEAD~1 --sizes 1000,100000
+
+The 10M row dataset needs about 3 GB of memory; pass --sizes to stop
+earlier.
+"""
+
+import argparse
+import bisect
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.append('.')
+from dsa.algorithms import DSAPerformanceAnalyzer, OpenAddressingHashIndex, ALGORITHMS
+from dsa.timing import (measure, call_overhead_ns, combine_runs, compare_results, DEFAULT_REPEATS,
+                        DEFAULT_WARMUP, DEFAULT_REGRESSION_THRESHOLD, MIN_COMPARE_RUNS)
+
+# 2: results combine independent runs (run_medians_ns); p95_ns became p95_pass_ns
+RESULTS_SCHEMA = 2
+
+# Independent runs (processes) per suite
+DEFAULT_RUNS = 5
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+WORKLOADS = ('hit', 'miss', 'random')
+
+# Algorithms whose structure supports single inserts and deletes
+UPDATE_ALGORITHMS = ('dictionary_lookup', 'hash_table_search')
+
+# IDs per workload
+WORKLOAD_SIZE = 1_000
+
+# Distinct synthetic amounts, rows aimed for per range query, and k of top_k
+AMOUNT_VALUES = 50_000
+RANGE_ROWS = 100
+TOP_K = 10
+
+# O(n) lookups are skipped on larger datasets, where one lookup takes milliseconds
+SCAN_MAX_ROWS = 100_000
+SCAN_ALGORITHMS = ('linear_search',)
+
+# Every GAP_EVERY-th ID is left out, like deleted transactions
+GAP_EVERY = 10
+
+def synthetic_id(position):
+    """ID of the row at a position: 1..9, 11..19, ... (multiples of GAP_EVERY are gaps)"""
+    return position + position // (GAP_EVERY - 1) + 1
+
+def synthetic_transactions(count):
+    """Rows with the fields the lookups use, in ID order like the ETL output"""
+    return [{'id': synthetic_id(position), 'amount': float(position % AMOUNT_VALUES)} for position in range(count)]
+
+def workload_ids(workload, count, seed=0):
+    """Lookup IDs for a workload on a dataset of count rows"""
+    rng = random.Random(seed)
+    max_id = synthetic_id(count - 1)
+    if workload == 'hit':
+        return [synthetic_id(rng.randrange(count)) for _ in range(WORKLOAD_SIZE)]
+    if workload == 'miss':
+        gaps = max_id // GAP_EVERY
+        # Half in the gaps, half past the end
+        return [rng.randint(1, gaps) * GAP_EVERY if i % 2 and gaps else max_id + rng.randint(1, count)
+                for i in range(WORKLOAD_SIZE)]
+    return [rng.randint(1, max_id) for _ in range(WORKLOAD_SIZE)]
+
+def range_workload(count, seed=0):
+    """(low, high) amount ranges holding about RANGE_ROWS rows each on a dataset of count rows"""
+    rng = random.Random(seed)
+    values = min(count, AMOUNT_VALUES)
+    width = max(1, RANGE_ROWS * values // count)
+    return [(float(low), float(low + width - 1)) for low in (rng.randrange(values) for _ in range(WORKLOAD_SIZE))]
+
+def git_commit():
+    """Current commit hash ('-dirty' with uncommitted changes), or None outside a git checkout"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        changes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                                 text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + '-dirty' if changes else commit
+
+def run_suite(sizes, warmup, repeats, scan_max_rows):
+    """Benchmark every algorithm, workload and dataset size; returns the result records"""
+    results = []
+    for rows in sizes:
+        build_start = time.perf_counter()
+        analyzer = DSAPerformanceAnalyzer(transactions=synthetic_transactions(rows))
+        print(f"\n{rows:,} rows (built in {time.perf_counter() - build_start:.1f}s)")
+        print(f"{'workload':<8} {'algorithm':<20} {'median ns':>12} {'95% CI':>21} {'p95 pass':>12} {'hits':>6}")
+
+        for workload in WORKLOADS:
+            ids = workload_ids(workload, rows)
+            expected = [analyzer.find_in_dict(tx_id) for tx_id in ids]
+
+            for algorithm in ALGORITHMS:
+                if algorithm in SCAN_ALGORITHMS and rows > scan_max_rows:
+                    continue
+                find = analyzer.lookup(algorithm)
+                if [find(tx_id) for tx_id in ids] != expected:
+                    raise AssertionError(f"{algorithm} disagrees with the dictionary on {workload} at {rows} rows")
+
+                stats = measure(find, ids, warmup=warmup, repeats=repeats)
+                hits = sum(1 for tx in expected if tx is not None)
+                results.append({'rows': rows, 'workload': workload, 'algorithm': algorithm,
+                                'hit_rate': hits / len(ids), **stats})
+                ci = f"{stats['ci95_low_ns']:,.0f}-{stats['ci95_high_ns']:,.0f}"
+                print(f"{workload:<8} {algorithm:<20} {stats['median_ns']:>12,.0f} {ci:>21} "
+                      f"{stats['p95_pass_ns']:>12,.0f} {hits / len(ids):>6.0%}")
+        
+        # Insert then delete an absent ID: the table stays the same size, while
+        # the hash index accumulates tombstones and is periodically rebuilt
+        ids = workload_ids('miss', rows)
+        placeholder = {'id': 0}
+        transaction_dict = analyzer.transaction_dict
+        hash_index = analyzer.hash_index
+        
+        def dict_insert_delete(tx_id):
+            transaction_dict[tx_id] = placeholder
+            del transaction_dict[tx_id]
+        
+        def hash_insert_delete(tx_id):
+            hash_index.insert(tx_id, placeholder)
+            hash_index.delete(tx_id)
+        
+        for algorithm, update in zip(UPDATE_ALGORITHMS, (dict_insert_delete, hash_insert_delete)):
+            stats = measure(update, ids, warmup=warmup, repeats=repeats)
+            results.append({'rows': rows, 'workload': 'insert_delete', 'algorithm': algorithm,
+                            'hit_rate': 0.0, **stats})
+            ci = f"{stats['ci95_low_ns']:,.0f}-{stats['ci95_high_ns']:,.0f}"
+            print(f"{'ins+del':<8} {algorithm:<20} {stats['median_ns']:>12,.0f} {ci:>21} "
+                  f"{stats['p95_pass_ns']:>12,.0f} {'-':>6}")
+        
+        results += run_sorted_workloads(analyzer, rows, warmup, repeats, scan_max_rows)
+        
+        transactions = analyzer.transactions
+        del analyzer, transaction_dict, hash_index
+        print_build_times(transactions)
+    return results
+
+def run_sorted_workloads(analyzer, rows, warmup, repeats, scan_max_rows):
+    """Range, top-k and ordered insert timings of the amount index against the flat alternatives"""
+    results = []
+    
+    def record(workload, algorithm, operation, items):
+        stats = measure(operation, items, warmup=warmup, repeats=repeats)
+        results.append({'rows': rows, 'workload': workload, 'algorithm': algorithm, 'hit_rate': 0.0, **stats})
+        ci = f"{stats['ci95_low_ns']:,.0f}-{stats['ci95_high_ns']:,.0f}"
+        print(f"{workload[:8]:<8} {algorithm:<20} {stats['median_ns']:>12,.0f} {ci:>21} "
+              f"{stats['p95_pass_ns']:>12,.0f} {'-':>6}")
+    
+    ranges = range_workload(rows)
+    scan = rows <= scan_max_rows
+    for low, high in ranges[:10] if scan else ():
+        if analyzer.find_amount_range(low, high) != analyzer.scan_amount_range(low, high):
+            raise AssertionError(f"sorted index disagrees with the scan on amounts {low}-{high} at {rows} rows")
+    record('range', 'sorted_index', lambda bounds: analyzer.find_amount_range(*bounds), ranges)
+    if scan:
+        record('range', 'linear_scan', lambda bounds: analyzer.scan_amount_range(*bounds), ranges)
+    
+    if scan and analyzer.top_transactions('amount', TOP_K) != analyzer.scan_top_transactions('amount', TOP_K):
+        raise AssertionError(f"sorted index disagrees with the scan on the top {TOP_K} amounts at {rows} rows")
+    record('top_k', 'sorted_index', lambda count: analyzer.top_transactions('amount', count), [TOP_K])
+    if scan:
+        record('top_k', 'linear_scan', lambda count: analyzer.scan_top_transactions('amount', count), [TOP_K])
+    
+    # New entries at random amounts with IDs past the end, removed again so the size stays the same
+    rng = random.Random(0)
+    entries = [(float(rng.randrange(AMOUNT_VALUES)), synthetic_id(rows) + i) for i in range(WORKLOAD_SIZE)]
+    amount_index = analyzer.sorted_indexes['amount']
+    flat = list(amount_index)
+    
+    def index_insert_remove(entry):
+        amount_index.add(*entry)
+        amount_index.remove(*entry)
+    
+    def flat_insert_remove(entry):
+        bisect.insort(flat, entry)
+        del flat[bisect.bisect_left(flat, entry)]
+    
+    record('sorted_insert', 'sorted_index', index_insert_remove, entries)
+    record('sorted_insert', 'sorted_list', flat_insert_remove, entries)
+    return results
+
+def print_build_times(transactions):
+    """Print the bulk build time per row of the dict and the hash index"""
+    start = time.perf_counter_ns()
+    built = {tx['id']: tx for tx in transactions}
+    dict_ns = (time.perf_counter_ns() - start) / len(transactions)
+    del built
+    
+    start = time.perf_counter_ns()
+    built = OpenAddressingHashIndex.build(((tx['id'], tx) for tx in transactions), len(transactions))
+    index_ns = (time.perf_counter_ns() - start) / len(transactions)
+    print(f"build: dict {dict_ns:,.0f} ns/row, hash index {index_ns:,.0f} ns/row "
+          f"(capacity {built.capacity:,}, load factor {built.load_factor:.2f})")
+
+def compare(baseline_file, current_file, threshold):
+    """Print the changes between two result files; returns True if none regressed"""
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    with open(current_file) as f:
+        current = json.load(f)
+
+    print(f"\n{baseline.get('commit') or baseline_file} -> {current.get('commit') or current_file}")
+    return print_changes(baseline['results'], current['results'], threshold)
+
+def print_changes(baseline, current, threshold):
+    """Print the changes between two result lists; returns True if none regressed"""
+    print(f"{'rows':>10} {'workload':<8} {'algorithm':<20} {'before ns':>11} {'after ns':>11} {'ratio':>7}  verdict")
+    changes = compare_results(baseline, current, threshold)
+    for change in changes:
+        print(f"{change['rows']:>10,} {change['workload'][:8]:<8} {change['algorithm']:<20} "
+              f"{change['baseline_median_ns']:>11,.0f} {change['median_ns']:>11,.0f} {change['ratio']:>6.2f}x  "
+              f"{change['verdict']}")
+
+    regressions = sum(1 for change in changes if change['verdict'] == 'regression')
+    inconclusive = sum(1 for change in changes if change['verdict'] == 'inconclusive')
+    print(f"\n{regressions} regression(s) beyond {threshold:.0%} in {len(changes)} compared results")
+    if inconclusive:
+        print(f"{inconclusive} result(s) inconclusive: rerun with --runs {MIN_COMPARE_RUNS} or more")
+    return regressions == 0
+
+def run_rounds(trees, runs, child_args):
+    """
+    Run the suite runs times per source tree, each run in its own process
+
+    trees maps a name to a checkout; each round runs every tree once, so
+    trees are interleaved in time and share the machine's slow drifts.
+    Every tree runs its own copy of this script. Returns the combined
+    results per tree.
+    """
+    run_results = {name: [] for name in trees}
+    with tempfile.TemporaryDirectory() as tmp:
+        for run in range(runs):
+            for name, root in trees.items():
+                print(f"\n=== Run {run + 1} of {runs}: {name} ===", flush=True)
+                script = os.path.join(root, 'scripts', 'benchmark_dsa.py')
+                output = os.path.join(tmp, f'{name}{run}.json')
+                with open(script) as f:
+                    # Scripts before independent runs existed always ran once
+                    single_run = ['--runs', '1'] if "'--runs'" in f.read() else []
+                subprocess.run([sys.executable, script, *single_run, '--output', output, *child_args],
+                               cwd=root, check=True)
+                with open(output) as f:
+                    run_results[name].append(json.load(f)['results'])
+    return {name: combine_runs(results) for name, results in run_results.items()}
+
+def run_against(revision, runs, child_args):
+    """Run the suite on a git revision and on this tree, alternating; returns (baseline, current) results"""
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline_tree = os.path.join(tmp, 'baseline')
+        subprocess.run(['git', 'worktree', 'add', '--detach', baseline_tree, revision], cwd=REPO_ROOT,
+                       check=True, capture_output=True)
+        try:
+            results = run_rounds({'baseline': baseline_tree, 'current': REPO_ROOT}, runs, child_args)
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', baseline_tree], cwd=REPO_ROOT,
+                           capture_output=True)
+    return results['baseline'], results['current']
+
+def print_combined(results):
+    """Print the median of each result over the runs, with the range of run medians"""
+    print(f"\n{'rows':>10} {'workload':<8} {'algorithm':<20} {'median ns':>12} {'run range':>23}")
+    for result in results:
+        run_range = f"{result['run_low_ns']:,.0f}-{result['run_high_ns']:,.0f}"
+        print(f"{result['rows']:>10,} {result['workload'][:8]:<8} {result['algorithm']:<20} "
+              f"{result['median_ns']:>12,.0f} {run_range:>23}")
+
+def main():
+    """Run the benchmark suite, or compare two result files"""
+    arg_parser = argparse.ArgumentParser(description='Benchmark the DSA lookups on synthetic data')
+    arg_parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')],
+                            default=DEFAULT_SIZES, help='Comma-separated dataset sizes in rows')
+    arg_parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP, help='Discarded samples per result')
+    arg_parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help='Timed samples per result')
+    arg_parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+                            help='Independent runs of the suite, each in its own process')
+    arg_parser.add_argument('--scan-max-rows', type=int, default=SCAN_MAX_ROWS,
+                            help='Largest dataset on which O(n) lookups are run')
+    arg_parser.add_argument('--output', default='dsa/benchmark_results.json', help='Results file to write')
+    arg_parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                            help='Compare two results files instead of running')
+    arg_parser.add_argument('--against', metavar='REVISION',
+                            help='Also run a git revision, alternating runs with this tree, and compare')
+    arg_parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                            help='Median slowdown that counts as a regression (0.1 = 10%%)')
+    args = arg_parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare(args.compare[0], args.compare[1], args.threshold) else 1)
+
+    overhead = call_overhead_ns(args.repeats)
+    print(f"Timing loop and call overhead: {overhead:.0f} ns per lookup (included in every result)")
+    child_args = ['--sizes', ','.join(str(size) for size in args.sizes), '--warmup', str(args.warmup),
+                  '--repeats', str(args.repeats), '--scan-max-rows', str(args.scan_max_rows)]
+    baseline = None
+    if args.against:
+        baseline, results = run_against(args.against, args.runs, child_args)
+        print_combined(results)
+    elif args.runs > 1:
+        results = run_rounds({'current': REPO_ROOT}, args.runs, child_args)['current']
+        print_combined(results)
+    else:
+        # One run keeps its samples and in-process confidence intervals (and compares as inconclusive)
+        results = run_suite(args.sizes, args.warmup, args.repeats, args.scan_max_rows)
+
+    report = {
+        'schema': RESULTS_SCHEMA,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parameters': {'sizes': args.sizes, 'workload_size': WORKLOAD_SIZE, 'warmup': args.warmup,
+                       'repeats': args.repeats, 'runs': args.runs, 'scan_max_rows': args.scan_max_rows},
+        'call_overhead_ns': overhead,
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if baseline is not None:
+        print(f"\n{args.against} -> {report['commit']} ({args.runs} alternating runs each)")
+        sys.exit(0 if print_changes(baseline, results, args.threshold) else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Response Encoding Benchmark for MoMo SMS Data Processing System
+Measures bytes on the wire and encoding time for the GET /transactions
+listing body: the old pretty-printed JSON against compact JSON, with and
+without the message field (?fields=), each sent as is or gzip compressed.
+Pages are encoded exactly as the API streams them.
+
+Usage: python scripts/benchmark_encoding.py [rows]
+"""
+
+import sys
+import time
+sys.path.append('.')
+from api.encoding import CompressingWriter, encode_stream_batch, dumps
+from api.rest_api import STREAM_BATCH_SIZE
+
+DEFAULT_ROWS = 100_000
+
+LIST_FIELDS = ['id', 'transaction_type', 'amount', 'currency', 'sender', 'receiver',
+               'timestamp', 'status', 'reference_number', 'balance', 'fee']
+
+def synthetic_transactions(count):
+    """Generate transactions shaped like the ETL output, with full SMS message text"""
+    types = ['payment', 'transfer', 'deposit', 'receive']
+    for i in range(1, count + 1):
+        yield {
+            'id': i,
+            'transaction_type': types[i % 4],
+            'amount': float(i % 50_000),
+            'currency': 'RWF',
+            'sender': 'Self',
+            'receiver': f'Customer {i % 500}',
+            'timestamp': f'2024-05-{i % 28 + 1:02d}T16:30:58',
+            'status': 'completed',
+            'reference_number': str(70_000_000_000 + i),
+            'balance': float((i * 104_729) % 1_000_000),
+            'fee': float(i % 3 * 50),
+            'message': f'TxId: {70_000_000_000 + i}. Your payment of {i % 50_000:,} RWF to Customer {i % 500} '
+                       f'{12845 + i % 500} has been completed at 2024-05-{i % 28 + 1:02d} 16:30:51. Your new '
+                       f'balance: {(i * 104_729) % 1_000_000:,} RWF. Fee was {i % 3 * 50} RWF.Kanda*182*16# '
+                       f'wiyandikishe muri poromosiyo ya BivaMoMotima, ugire amahirwe yo gutsindira ibihembo.'
+        }
+
+class ByteCounter:
+    """Write sink that only counts bytes"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+def encode_listing(transactions, pretty, fields, encoding):
+    """Encode a full listing the way the API streams it; returns bytes written"""
+    sink = ByteCounter()
+    out = CompressingWriter(sink, encoding) if encoding else sink
+    out.write(b'{\n  "status": "success",\n  "transactions": [' if pretty
+              else b'{"status":"success","transactions":[')
+    for start in range(0, len(transactions), STREAM_BATCH_SIZE):
+        out.write(encode_stream_batch(transactions[start:start + STREAM_BATCH_SIZE], False, start == 0,
+                                      pretty, fields))
+    out.write(('],' + dumps({'count': len(transactions)})[1:]).encode())
+    if encoding:
+        out.finish()
+    return sink.size
+
+def main():
+    """Run the encoding benchmark"""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    transactions = list(synthetic_transactions(rows))
+
+    cases = [
+        ('pretty (previous default)', True, None, None),
+        ('pretty + gzip', True, None, 'gzip'),
+        ('compact', False, None, None),
+        ('compact + gzip', False, None, 'gzip'),
+        ('compact, no message', False, LIST_FIELDS, None),
+        ('compact, no message + gzip', False, LIST_FIELDS, 'gzip'),
+    ]
+
+    print(f"\nGET /transactions body for {rows:,} transactions")
+    print("=" * 66)
+    print(f"{'encoding':<28} {'MB on wire':>11} {'vs pretty':>10} {'encode ms':>11}")
+
+    baseline = None
+    for name, pretty, fields, encoding in cases:
+        start = time.perf_counter()
+        size = encode_listing(transactions, pretty, fields, encoding)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        baseline = baseline or size
+        print(f"{name:<28} {size / 1e6:>11.2f} {size / baseline:>9.0%} {elapsed_ms:>11,.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Extraction Micro-Benchmark for MoMo SMS Data Processing System
+Compares messages per second of the original four-pattern extractor against
+the precompiled prefix classifier in etl/parse_xml.py
+"""
+
+import re
+import sys
+import time
+sys.path.append('.')
+from etl.parse_xml import SMSTransactionParser
+
+XML_FILE_PATH = 'data/raw/modified_sms_v2.xml'
+
+def legacy_extract_transaction_info(sms_body):
+    """Original extractor: up to four re.search calls with raw pattern strings"""
+    if not sms_body:
+        return None
+
+    transaction_info = {
+        'transaction_type': 'unknown',
+        'amount': 0.0,
+        'currency': 'RWF',
+        'sender': '',
+        'receiver': '',
+        'reference_number': '',
+        'balance': 0.0,
+        'fee': 0.0,
+        'message': sms_body
+    }
+
+    receive_pattern = r"You have received (\d+(?:,\d+)*) (\w+) from ([^(]+) \(\*+(\d+)\).*?Your new balance:(\d+(?:,\d+)*) (\w+).*?Transaction Id: (\d+)"
+    receive_match = re.search(receive_pattern, sms_body)
+    if receive_match:
+        transaction_info.update({
+            'transaction_type': 'receive',
+            'amount': float(receive_match.group(1).replace(',', '')),
+            'currency': receive_match.group(2),
+            'sender': receive_match.group(3).strip(),
+            'balance': float(receive_match.group(5).replace(',', '')),
+            'reference_number': receive_match.group(7)
+        })
+        return transaction_info
+
+    payment_pattern = r"TxId: (\d+)\. Your payment of ([\d,]+) (\w+) to ([^0-9]+)(\d+) has been completed.*?Your new balance: ([\d,]+) (\w+)\. Fee was (\d+) (\w+)"
+    payment_match = re.search(payment_pattern, sms_body)
+    if payment_match:
+        transaction_info.update({
+            'transaction_type': 'payment',
+            'reference_number': payment_match.group(1),
+            'amount': float(payment_match.group(2).replace(',', '')),
+            'currency': payment_match.group(3),
+            'receiver': payment_match.group(4).strip(),
+            'balance': float(payment_match.group(6).replace(',', '')),
+            'fee': float(payment_match.group(8))
+        })
+        return transaction_info
+
+    transfer_pattern = r"\*165\*S\*([\d,]+) (\w+) transferred to ([^(]+) \((\d+)\) from (\d+).*?Fee was: (\d+) (\w+)\. New balance: ([\d,]+) (\w+)"
+    transfer_match = re.search(transfer_pattern, sms_body)
+    if transfer_match:
+        transaction_info.update({
+            'transaction_type': 'transfer',
+            'amount': float(transfer_match.group(1).replace(',', '')),
+            'currency': transfer_match.group(2),
+            'receiver': transfer_match.group(3).strip(),
+            'fee': float(transfer_match.group(6)),
+            'balance': float(transfer_match.group(8).replace(',', ''))
+        })
+        return transaction_info
+
+    deposit_pattern = r"\*113\*R\*A bank deposit of ([\d,]+) (\w+) has been added.*?Your NEW BALANCE :([\d,]+) (\w+)"
+    deposit_match = re.search(deposit_pattern, sms_body)
+    if deposit_match:
+        transaction_info.update({
+            'transaction_type': 'deposit',
+            'amount': float(deposit_match.group(1).replace(',', '')),
+            'currency': deposit_match.group(2),
+            'balance': float(deposit_match.group(3).replace(',', '')),
+            'sender': 'Bank',
+            'receiver': 'Self'
+        })
+        return transaction_info
+
+    return transaction_info
+
+def measure(extract, bodies, repeat):
+    """Return the best messages-per-second rate over several passes"""
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for body in bodies:
+            extract(body)
+        elapsed = time.perf_counter() - start
+        best = max(best, len(bodies) / elapsed)
+    return best
+
+def main():
+    """Run the extraction benchmark"""
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    parser = SMSTransactionParser(XML_FILE_PATH)
+    bodies = [sms['body'] for sms in parser.iter_sms_records() if sms.get('address') == 'M-Money']
+
+    # Both extractors must agree before their speed is worth comparing
+    for body in bodies:
+        if legacy_extract_transaction_info(body) != parser.extract_transaction_info(body):
+            print(f"❌ Extractors disagree on: {body[:60]}")
+            return
+
+    print(f"\nExtraction benchmark ({len(bodies)} M-Money messages, best of {repeat})")
+    print("=" * 50)
+    before = measure(legacy_extract_transaction_info, bodies, repeat)
+    after = measure(parser.extract_transaction_info, bodies, repeat)
+    print(f"Before (4x re.search):        {before:12,.0f} msg/s")
+    print(f"After (prefix + compiled):    {after:12,.0f} msg/s")
+    print(f"Speedup:                      {after / before:12.2f}x")
+
+if __name__ == '__main__':
+    main()
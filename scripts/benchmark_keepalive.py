@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Keep-Alive Benchmark for MoMo SMS Data Processing System
+Measures requests per second for many small GET /transactions/{id} calls
+against an in-process API server: opening a new connection for every
+request against reusing persistent HTTP/1.1 connections (closed by the
+server every max_keep_alive_requests requests). The keep-alive run is
+repeated with more idle connections open than the server has workers,
+which must not slow it down.
+
+Usage: python scripts/benchmark_keepalive.py [requests] [clients] [workers]
+"""
+
+import base64
+import http.client
+import sys
+import threading
+import time
+sys.path.append('.')
+from api.rest_api import AuthenticatedHTTPRequestHandler, ThreadPoolSMSAPIServer
+from api.store import DictTransactionStore
+
+DEFAULT_REQUESTS = 5_000
+DEFAULT_CLIENTS = 4
+DEFAULT_WORKERS = 2
+
+# Idle keep-alive connections held open per worker in the last run
+IDLE_PER_WORKER = 4
+
+HEADERS = {'Authorization': 'Basic ' + base64.b64encode(b'admin:password123').decode()}
+
+def client(port, paths, keep_alive, failures):
+    """Issue GET requests for paths back to back"""
+    connection = http.client.HTTPConnection('localhost', port, timeout=30)
+    for path in paths:
+        try:
+            connection.request('GET', path, headers=HEADERS)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                failures.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            failures.append(type(e).__name__)
+            connection.close()
+        if not keep_alive:
+            connection.close()
+    connection.close()
+
+def run(port, ids, requests, clients, keep_alive):
+    """Run the clients over requests GETs in total; returns (requests per second, failures)"""
+    per_client = requests // clients
+    failures = []
+    threads = [
+        threading.Thread(target=client, args=(port, [f'/transactions/{ids[(c + i) % len(ids)]}'
+                                                     for i in range(per_client)], keep_alive, failures))
+        for c in range(clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return per_client * clients / elapsed, len(failures)
+
+def open_idle_connections(port, count):
+    """Connections that make one request and then sit idle"""
+    connections = []
+    for _ in range(count):
+        connection = http.client.HTTPConnection('localhost', port, timeout=30)
+        connection.request('GET', '/transactions', headers=HEADERS)
+        connection.getresponse().read()
+        connections.append(connection)
+    return connections
+
+def main():
+    """Run the keep-alive benchmark"""
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REQUESTS
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CLIENTS
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_WORKERS
+
+    server = ThreadPoolSMSAPIServer(('localhost', 0), AuthenticatedHTTPRequestHandler,
+                                    'data/raw/modified_sms_v2.xml', DictTransactionStore(), workers=workers)
+    server.access_log.sample_rate = 0
+    # Longer than the benchmark, so idle connections stay open throughout
+    server.keep_alive_timeout = 60.0
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ids = list(server.sms_processor.store.ids())
+
+    # Warm the response cache so both runs measure connection handling
+    run(port, ids, len(ids) * clients, clients, True)
+
+    print(f"\n{requests:,} GET /transactions/{{id}} requests, {clients} clients, {workers} workers")
+    print("=" * 60)
+    print(f"{'connections':<32} {'req/s':>10} {'speedup':>8} {'errors':>7}")
+
+    baseline = None
+    for name, keep_alive in [('new connection per request', False),
+                             (f'keep-alive (max {server.max_keep_alive_requests}/conn)', True)]:
+        rate, failures = run(port, ids, requests, clients, keep_alive)
+        baseline = baseline or rate
+        print(f"{name:<32} {rate:>10,.0f} {rate / baseline:>7.1f}x {failures:>7}")
+
+    idle = open_idle_connections(port, workers * IDLE_PER_WORKER)
+    rate, failures = run(port, ids, requests, clients, True)
+    print(f"{f'keep-alive, {len(idle)} idle conns open':<32} {rate:>10,.0f} {rate / baseline:>7.1f}x {failures:>7}")
+    for connection in idle:
+        connection.close()
+
+    server.shutdown()
+    server.server_close()
+
+if __name__ == '__main__':
+    main()
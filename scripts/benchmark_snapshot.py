@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark for MoMo SMS Data Processing System
+Compares the time until the API can answer its first requests when starting
+from transactions.json (parse the file, load every dict into the store) and
+from the binary snapshot (map the file and decode records on demand), along
+with the size of each file.
+
+Usage: python scripts/benchmark_snapshot.py [rows]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.append('.')
+from itertools import islice
+from api.store import DictTransactionStore
+from api.snapshot import SnapshotTransactionStore, write_snapshot
+
+DEFAULT_ROWS = 1_000_000
+LOOKUPS = 1000
+
+def synthetic_transactions(count):
+    """Generate transactions shaped like the ETL output"""
+    types = ['payment', 'transfer', 'deposit', 'receive']
+    for i in range(1, count + 1):
+        yield {
+            'id': i,
+            'transaction_type': types[i % 4],
+            'amount': float(i % 50_000),
+            'currency': 'RWF',
+            'sender': 'Self',
+            'receiver': f'Customer {i % 500}',
+            'timestamp': f'2024-05-{i % 28 + 1:02d}T16:30:58',
+            'status': 'completed',
+            'reference_number': str(70_000_000_000 + i),
+            'balance': 1000.0,
+            'fee': 0.0,
+            'message': f'TxId: {70_000_000_000 + i}. Your payment of 1,000 RWF to Jane Smith 12845 has been completed.'
+        }
+
+def start_from_json(json_file):
+    store = DictTransactionStore()
+    with open(json_file, 'r', encoding='utf-8') as f:
+        store.load(json.load(f))
+    return store
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+def main():
+    """Run the startup benchmark"""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    transactions = list(synthetic_transactions(rows))
+    lookup_ids = random.Random(42).sample(range(1, rows + 1), min(LOOKUPS, rows))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_file = os.path.join(tmp, 'transactions.json')
+        snapshot_file = os.path.join(tmp, 'transactions.snapshot')
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(transactions, f, indent=2, ensure_ascii=False)
+        _, write_ms = timed(write_snapshot, transactions, snapshot_file)
+        del transactions
+
+        print(f"\nStartup with {rows:,} transactions")
+        print("=" * 62)
+        print(f"snapshot written in {write_ms:,.0f} ms")
+        print(f"{'format':<10} {'size MB':>9} {'startup ms':>12} {'first page ms':>14} {'get us':>8}")
+
+        for name, path, start in (('json', json_file, start_from_json),
+                                  ('snapshot', snapshot_file, SnapshotTransactionStore)):
+            store, startup_ms = timed(start, path)
+            _, page_ms = timed(lambda: list(islice(store.iter_after(0), 500)))
+            _, lookups_ms = timed(lambda: [store.get(tx_id) for tx_id in lookup_ids])
+            print(f"{name:<10} {os.path.getsize(path) / 1e6:>9.1f} {startup_ms:>12,.1f} {page_ms:>14,.2f} "
+                  f"{lookups_ms * 1000 / len(lookup_ids):>8.1f}")
+            if hasattr(store, 'close'):
+                store.close()
+            del store
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Transaction Store Write Benchmark for MoMo SMS Data Processing System
+Measures per-operation create/update/delete latency of the SMSDataProcessor
+stores as the dataset grows from 10k to 1M rows. O(1) operations should show
+flat latency across sizes.
+
+Usage: python scripts/benchmark_store.py [dict|columnar] [sizes...]
+"""
+
+import random
+import sys
+import time
+sys.path.append('.')
+from api.store import DictTransactionStore, ColumnarTransactionStore
+
+STORES = {
+    'dict': DictTransactionStore,
+    'columnar': ColumnarTransactionStore
+}
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+OPERATIONS = 2_000
+
+def synthetic_transactions(count):
+    """Generate transactions shaped like the ETL output"""
+    types = ['payment', 'transfer', 'deposit', 'receive']
+    message = 'TxId: 00000000000. Your payment of 1,000 RWF to Jane Smith 12845 has been completed.'
+    for i in range(1, count + 1):
+        yield {
+            'id': i,
+            'transaction_type': types[i % 4],
+            'amount': float(i % 50_000),
+            'currency': 'RWF',
+            'sender': 'Self',
+            'receiver': f'Customer {i % 500}',
+            'timestamp': '2024-05-10T16:30:58',
+            'status': 'completed',
+            'reference_number': str(70_000_000_000 + i),
+            'balance': 1000.0,
+            'fee': 0.0,
+            'message': message
+        }
+
+def time_per_op(operation, arguments):
+    """Average microseconds per call of operation over arguments"""
+    start = time.perf_counter()
+    for argument in arguments:
+        operation(argument)
+    return (time.perf_counter() - start) / len(arguments) * 1_000_000
+
+def benchmark(store_class, size):
+    """Return per-operation latency (µs) for create, update and delete"""
+    store = store_class(synthetic_transactions(size))
+
+    new_transaction = {
+        'transaction_type': 'send', 'amount': 2500.0, 'currency': 'RWF',
+        'sender': 'Benchmark', 'receiver': 'Jane Doe'
+    }
+    create = time_per_op(lambda _: store.add(dict(new_transaction)), range(OPERATIONS))
+
+    update_ids = random.sample(range(1, size + 1), OPERATIONS)
+    update = time_per_op(lambda tx_id: store.update(tx_id, {'status': 'failed'}), update_ids)
+
+    delete_ids = random.sample(range(1, size + 1), OPERATIONS)
+    delete = time_per_op(store.delete, delete_ids)
+
+    return create, update, delete
+
+def main():
+    """Run the store write benchmark"""
+    store_name = sys.argv[1] if len(sys.argv) > 1 else 'dict'
+    sizes = [int(size) for size in sys.argv[2:]] or DEFAULT_SIZES
+
+    print(f"\n{store_name} store write latency ({OPERATIONS} ops each, µs/op)")
+    print("=" * 50)
+    print(f"{'rows':>10} {'create':>10} {'update':>10} {'delete':>10}")
+    for size in sizes:
+        create, update, delete = benchmark(STORES[store_name], size)
+        print(f"{size:>10,} {create:>10.2f} {update:>10.2f} {delete:>10.2f}")
+
+if __name__ == '__main__':
+    main()
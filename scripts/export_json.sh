@@ -1,2 +1,5 @@
+#!/bin/bash
+# MoMo Dashboard Export
+# Usage: scripts/export_json.sh [--input FILE] [--output FILE]
 
-
+python etl/export_json.py "$@"
@@ -1,2 +1,5 @@
+#!/bin/bash
+# MoMo SMS Database Loader
+# Usage: scripts/init_db.sh [--input FILE] [--db FILE | --mysql [DATABASE]]
 
-
+python etl/load_db.py "$@"
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Load Testing Script for MoMo SMS Data Processing System
+Drives a local API instance with concurrent clients and reports latency
+percentiles (p50/p99) and requests per second.
+
+Start the server first, e.g.: python api/rest_api.py --workers 8
+Then run: python scripts/load_test.py --clients 16 --duration 10
+"""
+
+import argparse
+import base64
+import http.client
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class LoadTester:
+    """Runs concurrent GET clients against the API"""
+
+    def __init__(self, base_url, credentials, paths):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.paths = paths
+        encoded = base64.b64encode(credentials.encode()).decode()
+        self.headers = {'Authorization': f'Basic {encoded}'}
+
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.status_counts = Counter()
+
+    def client(self, deadline):
+        """One client: issue requests back to back until the deadline"""
+        latencies = []
+        statuses = Counter()
+
+        while time.perf_counter() < deadline:
+            path = random.choice(self.paths)
+            start = time.perf_counter()
+            try:
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+                connection.request('GET', path, headers=self.headers)
+                response = connection.getresponse()
+                response.read()
+                statuses[response.status] += 1
+                connection.close()
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+        with self.lock:
+            self.latencies.extend(latencies)
+            self.status_counts.update(statuses)
+
+    def run(self, clients, duration):
+        """Run all clients for the given duration and return a results dict"""
+        deadline = time.perf_counter() + duration
+        threads = [threading.Thread(target=self.client, args=(deadline,)) for _ in range(clients)]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(self.latencies)
+        return {
+            'clients': clients,
+            'requests': len(latencies),
+            'elapsed_s': elapsed,
+            'rps': len(latencies) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'max_ms': (latencies[-1] * 1000) if latencies else 0.0,
+            'status_counts': dict(self.status_counts)
+        }
+
+def main():
+    """Main function to run the load test"""
+    arg_parser = argparse.ArgumentParser(description='Load test the MoMo SMS API')
+    arg_parser.add_argument('--url', default='http://localhost:8000', help='API base URL')
+    arg_parser.add_argument('--credentials', default='admin:password123', help='Basic Auth user:password')
+    arg_parser.add_argument('--clients', type=int, default=16, help='Concurrent clients')
+    arg_parser.add_argument('--duration', type=float, default=10.0, help='Test duration in seconds')
+    arg_parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request (repeatable; default mixes list and single-ID GETs)')
+    args = arg_parser.parse_args()
+
+    paths = args.paths or ['/transactions'] + [f'/transactions/{i}' for i in range(1, 9)]
+
+    print(f"Load testing {args.url} with {args.clients} clients for {args.duration:.0f}s")
+    print("=" * 50)
+
+    results = LoadTester(args.url, args.credentials, paths).run(args.clients, args.duration)
+
+    print(f"Requests:      {results['requests']}")
+    print(f"Throughput:    {results['rps']:.1f} req/s")
+    print(f"Latency p50:   {results['p50_ms']:.2f} ms")
+    print(f"Latency p99:   {results['p99_ms']:.2f} ms")
+    print(f"Latency max:   {results['max_ms']:.2f} ms")
+    print(f"Status codes:  {results['status_counts']}")
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,5 @@
+#!/bin/bash
+# MoMo SMS ETL Runner
+# Usage: scripts/run_etl.sh [--workers N] [--input FILE] [--output FILE]
 
-
+python etl/run.py "$@"
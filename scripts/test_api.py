@@ -52,7 +52,7 @@ class APITester:
         print("-" * 50)
         
         try:
-            response = requests.get(f"{self.base_url}/transactions/{transaction_id}", headers=self.valid_headers)
+            response = requests.get(f"{self.base_url}/transactions/{transaction_id}?compare=1", headers=self.valid_headers)
             print(f"Status Code: {response.status_code}")
             
             if response.status_code == 200:
@@ -0,0 +1,16 @@
+"""
+Shared fixtures
+"""
+
+import pytest
+from tests.sms_backup import sms_element, backup_text
+
+@pytest.fixture
+def write_backup(tmp_path):
+    """write_backup(count or elements, name='backup.xml') -> path of an SMS backup"""
+    def write(messages, name='backup.xml'):
+        elements = [sms_element(n) for n in range(messages)] if isinstance(messages, int) else messages
+        path = tmp_path / name
+        path.write_text(backup_text(elements), encoding='utf-8')
+        return str(path)
+    return write
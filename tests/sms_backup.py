@@ -0,0 +1,75 @@
+"""
+Small SMS backups in the format of data/raw/modified_sms_v2.xml, for tests
+"""
+
+from xml.sax.saxutils import quoteattr
+
+BACKUP_HEADER = ("<?xml version='1.0' encoding='utf-8'?>\n"
+                 '<smses backup_set="test" backup_date="1737023646162" type="full">\n')
+BACKUP_FOOTER = '</smses>\n'
+
+# 2024-05-10 16:30:58 UTC
+FIRST_DATE = 1715358658724
+
+def receive_body(n):
+    return (f'You have received {1000 + n} RWF from Jane Smith (*********013) on your mobile money account at '
+            f'2024-05-10 16:30:51. Message from sender: . Your new balance:{2000 + n} RWF. '
+            f'Financial Transaction Id: {76662021700 + n}.')
+
+def payment_body(n):
+    return (f'TxId: {73214484437 + n}. Your payment of 1,{n % 1000:03d} RWF to Samuel Carter 12845 has been '
+            f'completed at 2024-05-10 16:31:39. Your new balance: 1,000 RWF. Fee was 0 RWF.Kanda*182*16# & more')
+
+def transfer_body(n):
+    return (f'*165*S*{10000 + n} RWF transferred to Samuel Carter (250791666666) from 36521838 at '
+            f'2024-05-11 20:34:47 . Fee was: 100 RWF. New balance: {28300 + n} RWF.')
+
+def deposit_body(n):
+    return (f'*113*R*A bank deposit of {40000 + n} RWF has been added to your mobile money account at '
+            f'2024-05-11 18:43:49. Your NEW BALANCE :{40400 + n} RWF. Cash Deposit::CASH::::0::250795963036.')
+
+# Cycle of message kinds: the four transaction types, an M-Money message no
+# pattern matches, a payment-prefixed body the pattern rejects, and a message
+# from another sender
+MESSAGE_KINDS = (
+    ('M-Money', receive_body),
+    ('M-Money', payment_body),
+    ('M-Money', transfer_body),
+    ('M-Money', deposit_body),
+    ('M-Money', lambda n: f'Y\'ello! Your airtime bundle <{n}> expires soon.'),
+    ('M-Money', lambda n: f'TxId: {n}. Your payment could not be completed.'),
+    ('MTN', lambda n: f'Welcome to MTN, message {n}'),
+)
+
+def sms_element(n, address=None, body=None, date=None):
+    """One <sms> element line, as the backup app writes it"""
+    kind_address, make_body = MESSAGE_KINDS[n % len(MESSAGE_KINDS)]
+    attributes = {
+        'protocol': '0',
+        'address': address or kind_address,
+        'date': str(date if date is not None else FIRST_DATE + n * 60000),
+        'type': '1',
+        'subject': 'null',
+        'body': body if body is not None else make_body(n),
+        'readable_date': f'10 May 2024 {n % 24}:30:58 PM',
+        'contact_name': '(Unknown)'
+    }
+    return '  <sms ' + ' '.join(f'{name}={quoteattr(value)}' for name, value in attributes.items()) + ' />\n'
+
+# '<sms' that is not an element, between real ones
+NOT_ELEMENTS = [
+    '  <!-- <sms body="commented out" /> -->\n',
+    '  <![CDATA[ <sms body="character data" /> ]]>\n',
+    '  <?note <sms body="processing instruction" /> ?>\n',
+]
+
+def with_markup(elements):
+    """Interleave the non-element markup with the elements"""
+    mixed = []
+    for n, element in enumerate(elements):
+        mixed.append(NOT_ELEMENTS[n % len(NOT_ELEMENTS)])
+        mixed.append(element)
+    return mixed
+
+def backup_text(elements):
+    return BACKUP_HEADER + ''.join(elements) + BACKUP_FOOTER
@@ -1,2 +1,416 @@
-#This file bellongs to test_api.py
+"""
+Tests for the REST API, against a server on an ephemeral port
 
+The server loads data/processed/transactions.json into the in-memory dict
+store, so changes made by a test are not saved.
+"""
+
+import base64
+import http.client
+import json
+import socket
+import threading
+import zlib
+import pytest
+from api.auth import Authenticator, CredentialStore, hash_password
+from api.rest_api import AuthenticatedHTTPRequestHandler, ThreadPoolSMSAPIServer
+from api.store import DictTransactionStore
+
+XML_FILE = 'data/raw/modified_sms_v2.xml'
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'admin:password123').decode()}
+
+@pytest.fixture
+def server():
+    authenticator = Authenticator(CredentialStore({'admin': hash_password('password123', iterations=1000)}))
+    server = ThreadPoolSMSAPIServer(('127.0.0.1', 0), AuthenticatedHTTPRequestHandler, XML_FILE,
+                                    DictTransactionStore(), workers=2, authenticator=authenticator)
+    server.access_log.sample_rate = 0
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+@pytest.fixture
+def client(server):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=10)
+    yield conn
+    conn.close()
+
+def request(conn, method, path, body=None, **headers):
+    """Send a request and read the whole response: (response, body)"""
+    headers = {**AUTH, **{name.replace('_', '-'): value for name, value in headers.items()}}
+    if body is not None:
+        body = json.dumps(body)
+        headers['Content-Type'] = 'application/json'
+    conn.request(method, path, body, headers)
+    response = conn.getresponse()
+    return response, response.read()
+
+# Conditional GET and the response cache
+
+def test_etag_round_trip(client):
+    response, body = request(client, 'GET', '/transactions/1')
+    etag = response.getheader('ETag')
+    assert response.status == 200 and etag
+
+    response, body = request(client, 'GET', '/transactions/1', If_None_Match=etag)
+
+    assert response.status == 304
+    assert body == b''
+    assert response.getheader('ETag') == etag
+
+def test_etag_is_per_path(client):
+    response, _ = request(client, 'GET', '/transactions/1')
+    etag = response.getheader('ETag')
+
+    response, _ = request(client, 'GET', '/transactions/2', If_None_Match=etag)
+
+    assert response.status == 200
+    assert response.getheader('ETag') != etag
+
+@pytest.mark.parametrize('path, status', [
+    ('/transactions/999999', 404),
+    ('/no-such-path', 404),
+    ('/transactions/1?fields=,', 400),
+    ('/transactions/top?limit=abc', 400),
+    ('/transactions/999999/raw', 404),
+])
+def test_if_none_match_does_not_hide_errors(client, path, status):
+    response, _ = request(client, 'GET', '/transactions/1')
+    etag = response.getheader('ETag')
+
+    for if_none_match in ('*', etag):
+        response, body = request(client, 'GET', path, If_None_Match=if_none_match)
+        assert response.status == status
+        assert body
+
+def test_if_none_match_star_on_existing_resource(client):
+    # Not cached yet: the route runs and its 200 becomes a 304
+    response, body = request(client, 'GET', '/transactions/1?fields=id', If_None_Match='*')
+    assert response.status == 304
+    assert body == b''
+
+    # Cached now
+    request(client, 'GET', '/transactions/2')
+    response, body = request(client, 'GET', '/transactions/2', If_None_Match='*')
+    assert response.status == 304
+    assert body == b''
+
+def test_304_for_streamed_listing(client):
+    # Streamed by the route (not cached yet), then replayed from the cache
+    for if_none_match in ('*', '*'):
+        response, body = request(client, 'GET', '/transactions?limit=3', If_None_Match=if_none_match)
+
+        assert response.status == 304
+        assert response.getheader('Transfer-Encoding') is None
+        assert body == b''
+        # The connection is still in step
+        response, body = request(client, 'GET', '/transactions/1')
+        assert response.status == 200 and json.loads(body)['transaction']['id'] == 1
+
+def test_repeat_get_served_from_cache(server, client):
+    cache = server.response_cache
+    _, first = request(client, 'GET', '/transactions/1')
+    hits = cache.hits
+
+    _, second = request(client, 'GET', '/transactions/1')
+
+    assert second == first
+    assert cache.hits == hits + 1
+
+def test_writes_invalidate_cache_and_etags(client):
+    response, _ = request(client, 'GET', '/transactions/1')
+    etag = response.getheader('ETag')
+
+    response, _ = request(client, 'PUT', '/transactions/1', {'amount': 1234.0})
+    assert response.status == 200
+
+    response, body = request(client, 'GET', '/transactions/1', If_None_Match=etag)
+    assert response.status == 200
+    assert json.loads(body)['transaction']['amount'] == 1234.0
+    assert response.getheader('ETag') != etag
+
+    request(client, 'DELETE', '/transactions/1')
+    response, _ = request(client, 'GET', '/transactions/1', If_None_Match='*')
+    assert response.status == 404
+
+# Content negotiation and the fields= projection
+
+def decode(response, body):
+    encoding = response.getheader('Content-Encoding')
+    if encoding is None:
+        return body
+    return zlib.decompress(body, {'gzip': 31, 'deflate': 15}[encoding])
+
+@pytest.mark.parametrize('path', ['/transactions/top?limit=20', '/transactions?limit=20'])
+@pytest.mark.parametrize('accept_encoding, expected', [
+    (None, None),
+    ('gzip', 'gzip'),
+    ('deflate', 'deflate'),
+    ('gzip, deflate', 'gzip'),
+    ('gzip;q=0.5, deflate', 'deflate'),
+    ('GZIP; Q=0.8, deflate;q=0.3', 'gzip'),
+    ('gzip;q=0', None),
+    ('gzip;q=0, deflate;q=0', None),
+    ('*', 'gzip'),
+    ('*;q=0.5, gzip;q=0', 'deflate'),
+    ('gzip;q=0.5, identity', None),
+    ('br', None),
+])
+def test_accept_encoding_q_values(client, path, accept_encoding, expected):
+    _, plain = request(client, 'GET', path)
+    headers = {} if accept_encoding is None else {'Accept_Encoding': accept_encoding}
+
+    response, body = request(client, 'GET', path, **headers)
+
+    assert response.status == 200
+    assert response.getheader('Content-Encoding') == expected
+    assert decode(response, body) == plain
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip, identity;q=0', 'gzip'),
+    ('deflate, *;q=0', 'deflate'),
+    ('gzip;q=0.1, identity;q=0', 'gzip'),
+    # Nothing acceptable: sent uncompressed all the same
+    ('identity;q=0', None),
+    ('*;q=0', None),
+])
+def test_identity_refused_compresses_small_bodies(client, accept_encoding, expected):
+    # Small enough to go out uncompressed to a client that takes identity
+    response, plain = request(client, 'GET', '/transactions/1?fields=id', Accept_Encoding='gzip')
+    assert response.getheader('Content-Encoding') is None
+    etag = response.getheader('ETag')
+
+    response, body = request(client, 'GET', '/transactions/1?fields=id', Accept_Encoding=accept_encoding)
+
+    assert response.status == 200
+    assert response.getheader('Content-Encoding') == expected
+    assert decode(response, body) == plain
+    if expected:
+        assert response.getheader('ETag') != etag
+
+def test_fields_projection(client):
+    response, body = request(client, 'GET', '/transactions/1?fields=id,amount')
+
+    assert response.status == 200
+    assert set(json.loads(body)['transaction']) == {'id', 'amount'}
+
+@pytest.mark.parametrize('path', [
+    '/transactions/1?fields=id,no_such_field',
+    '/transactions?fields=amount,Amount',
+    '/transactions/top?fields=no_such_field',
+])
+def test_unknown_field_is_rejected(client, path):
+    response, _ = request(client, 'GET', path)
+
+    assert response.status == 400
+
+# Persistent connections: chunked bodies and pipelining
+
+class SharedReader:
+    """One buffered reader for a socket, handed to every http.client.HTTPResponse
+    read from it, so pipelined responses are not lost in a discarded buffer"""
+
+    def __init__(self, sock):
+        self.stream = sock.makefile('rb')
+
+    def makefile(self, mode):
+        return self
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def raw_request(method, path, body=b'', **headers):
+    """A request as bytes, with Content-Length unless the headers say otherwise"""
+    headers = {'Host': 'localhost', **AUTH, **{name.replace('_', '-'): value for name, value in headers.items()}}
+    if body and 'Transfer-Encoding' not in headers:
+        headers['Content-Length'] = str(len(body))
+    head = f'{method} {path} HTTP/1.1\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+    return head.encode() + b'\r\n' + body
+
+def chunked(body, size):
+    """A body in chunked transfer coding, in chunks of size bytes and with a trailer field"""
+    chunks = [body[n:n + size] for n in range(0, len(body), size)]
+    return b''.join(b'%x;ext=1\r\n%s\r\n' % (len(chunk), chunk) for chunk in chunks) + b'0\r\nX-Trailer: 1\r\n\r\n'
+
+def read_responses(sock, methods):
+    """Read one response per request method from a socket, in order: [(response, body)]"""
+    reader = SharedReader(sock)
+    responses = []
+    for method in methods:
+        response = http.client.HTTPResponse(reader, method=method)
+        response.begin()
+        responses.append((response, response.read()))
+    return responses
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr('api.rest_api.STREAM_BATCH_SIZE', 3)
+
+@pytest.mark.parametrize('accept_encoding', ['identity', 'gzip', 'deflate'])
+def test_chunked_listing_decodes(client, small_batches, accept_encoding):
+    transactions = [json.loads(request(client, 'GET', f'/transactions/{tx_id}')[1])['transaction']
+                    for tx_id in range(1, 9)]
+
+    response, body = request(client, 'GET', '/transactions', Accept_Encoding=accept_encoding)
+    assert response.getheader('Transfer-Encoding') == 'chunked'
+    assert json.loads(decode(response, body)) == {'status': 'success', 'transactions': transactions, 'count': 8}
+
+    response, body = request(client, 'GET', '/transactions?format=ndjson&cursor=2',
+                             Accept_Encoding=accept_encoding)
+    assert response.getheader('Transfer-Encoding') == 'chunked'
+    assert [json.loads(line) for line in decode(response, body).splitlines()] == transactions[2:]
+
+    # The connection is still in step after the last chunk
+    response, body = request(client, 'GET', '/transactions/1')
+    assert json.loads(body)['transaction'] == transactions[0]
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+def test_chunked_request_body(client, chunk_size):
+    body = json.dumps({'transaction_type': 'payment', 'amount': 2500.0, 'currency': 'RWF',
+                       'sender': 'Self', 'receiver': 'Shop'}).encode()
+    chunks = (body[n:n + chunk_size] for n in range(0, len(body), chunk_size))
+
+    client.request('POST', '/transactions', chunks, {**AUTH, 'Content-Type': 'application/json'},
+                   encode_chunked=True)
+    response = client.getresponse()
+    created = json.loads(response.read())
+
+    assert response.status == 201
+    assert created['transaction']['amount'] == 2500.0
+    response, body = request(client, 'GET', f"/transactions/{created['transaction']['id']}")
+    assert json.loads(body)['transaction'] == created['transaction']
+
+@pytest.mark.parametrize('body', [
+    b'zz\r\n{}\r\n0\r\n\r\n',
+    b'-1\r\n{}\r\n0\r\n\r\n',
+    b'5\r\n{}\r\n0\r\n\r\n',
+])
+def test_broken_chunked_body_closes_connection(server, body):
+    with socket.create_connection(server.server_address, timeout=10) as sock:
+        sock.sendall(raw_request('PUT', '/transactions/1', body, Transfer_Encoding='chunked')
+                     + raw_request('GET', '/transactions/1'))
+        (response, _), = read_responses(sock, ['PUT'])
+
+        assert response.status == 400
+        assert response.getheader('Connection') == 'close'
+        assert sock.recv(1) == b''
+
+def test_pipelined_requests(server):
+    update = json.dumps({'amount': 999999.0}).encode()
+    requests = [
+        ('GET', raw_request('GET', '/transactions/1?fields=id')),
+        ('GET', raw_request('GET', '/transactions?limit=2&fields=id')),
+        ('PUT', raw_request('PUT', '/transactions/2', update, Content_Type='application/json')),
+        ('PUT', raw_request('PUT', '/transactions/3', chunked(update, 5), Content_Type='application/json',
+                            Transfer_Encoding='chunked')),
+        ('GET', raw_request('GET', '/transactions/top?limit=2&fields=id')),
+        ('HEAD', raw_request('GET', '/transactions/2?fields=id,amount').replace(b'GET', b'HEAD', 1)),
+        ('GET', raw_request('GET', '/transactions/2?fields=id,amount')),
+    ]
+
+    with socket.create_connection(server.server_address, timeout=10) as sock:
+        # Every request goes out before any response is read
+        sock.sendall(b''.join(data for _, data in requests))
+        responses = read_responses(sock, [method for method, _ in requests])
+
+    statuses = [response.status for response, _ in responses]
+    bodies = [json.loads(body) if body else None for _, body in responses]
+    assert statuses == [200] * len(requests)
+    assert bodies[0]['transaction'] == {'id': 1}
+    assert bodies[1]['transactions'] == [{'id': 1}, {'id': 2}]
+    assert bodies[2]['transaction']['amount'] == bodies[3]['transaction']['amount'] == 999999.0
+    assert {tx['id'] for tx in bodies[4]['transactions']} == {2, 3}
+    assert bodies[5] is None
+    assert bodies[6]['transaction'] == {'id': 2, 'amount': 999999.0}
+
+# Writes
+
+POSTED = {'transaction_type': 'payment', 'amount': 2500.0, 'currency': 'RWF', 'sender': 'Self', 'receiver': 'Shop'}
+
+def listed_ids(client, query=''):
+    _, body = request(client, 'GET', f'/transactions?fields=id{query}')
+    return [tx['id'] for tx in json.loads(body)['transactions']]
+
+def test_ids_are_never_reused(client):
+    ids = listed_ids(client)
+    response, _ = request(client, 'DELETE', f'/transactions/{ids[-1]}')
+    assert response.status == 200
+
+    response, body = request(client, 'POST', '/transactions', POSTED)
+
+    assert response.status == 201
+    new_id = json.loads(body)['transaction']['id']
+    assert new_id == ids[-1] + 1
+    assert listed_ids(client) == ids[:-1] + [new_id]
+
+def test_writes_show_in_listings_filters_and_top(client):
+    ids = listed_ids(client)
+    _, body = request(client, 'POST', '/transactions', {**POSTED, 'transaction_type': 'refund', 'amount': 5e6})
+    new_id = json.loads(body)['transaction']['id']
+    request(client, 'PUT', f'/transactions/{ids[0]}', {'transaction_type': 'refund'})
+    request(client, 'DELETE', f'/transactions/{ids[1]}')
+
+    assert listed_ids(client) == [ids[0]] + ids[2:] + [new_id]
+    assert listed_ids(client, '&transaction_type=refund') == [ids[0], new_id]
+    _, body = request(client, 'GET', '/transactions/top?by=amount&limit=1&fields=id')
+    assert json.loads(body)['transactions'] == [{'id': new_id}]
+
+    request(client, 'PUT', f'/transactions/{new_id}', {'amount': 1.0})
+    _, body = request(client, 'GET', '/transactions/top?by=amount&order=asc&limit=1&fields=id')
+    assert json.loads(body)['transactions'] == [{'id': new_id}]
+
+# Concurrency on the worker pool (the fixture server has 2 workers)
+
+def test_stalled_client_does_not_block_others(server, client):
+    with socket.create_connection(server.server_address, timeout=10) as stalled:
+        # Holds a worker until the keep-alive timeout: half a request line
+        stalled.sendall(b'GET /transactions HT')
+
+        for tx_id in range(1, 9):
+            response, _ = request(client, 'GET', f'/transactions/{tx_id}')
+            assert response.status == 200
+
+def test_concurrent_writes_and_reads(server):
+    clients, posts_per_client = 4, 25
+    created = [[] for _ in range(clients)]
+    errors = []
+
+    def write(n):
+        conn = http.client.HTTPConnection(*server.server_address, timeout=10)
+        try:
+            for m in range(posts_per_client):
+                response, body = request(conn, 'POST', '/transactions', {**POSTED, 'amount': float(n * 1000 + m)})
+                created[n].append(json.loads(body)['transaction'])
+                response, body = request(conn, 'GET', '/transactions?fields=id')
+                if response.status != 200:
+                    errors.append(response.status)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    new_ids = sorted(tx['id'] for transactions in created for tx in transactions)
+    assert new_ids == list(range(9, 9 + clients * posts_per_client))
+    conn = http.client.HTTPConnection(*server.server_address, timeout=10)
+    try:
+        assert listed_ids(conn) == list(range(1, 9)) + new_ids
+        for transactions in created:
+            for tx in transactions:
+                _, body = request(conn, 'GET', f"/transactions/{tx['id']}")
+                assert json.loads(body)['transaction'] == tx
+    finally:
+        conn.close()
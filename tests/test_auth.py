@@ -0,0 +1,160 @@
+"""
+Tests for API authentication: Basic credentials, the header caches, the
+failure limiter and bearer tokens
+"""
+
+import base64
+import pytest
+import api.auth
+from api.auth import (Authenticator, AuthCache, CredentialStore, FailureLimiter, TokenSigner, TooManyFailures,
+                      hash_password)
+
+# Few iterations keep the tests fast; the format is the same
+ITERATIONS = 1000
+
+def basic(username, password):
+    return 'Basic ' + base64.b64encode(f'{username}:{password}'.encode()).decode()
+
+class Clock:
+    """Stand-in for time.monotonic and time.time"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(api.auth.time, 'monotonic', clock)
+    monkeypatch.setattr(api.auth.time, 'time', clock)
+    return clock
+
+@pytest.fixture
+def credentials():
+    return CredentialStore({'admin': hash_password('password123', iterations=ITERATIONS)})
+
+@pytest.fixture
+def authenticator(credentials):
+    return Authenticator(credentials, TokenSigner(b'secret', ttl=60))
+
+def count_verifications(monkeypatch, credentials):
+    calls = []
+    verify = credentials.verify
+    def counting_verify(username, password):
+        calls.append(username)
+        return verify(username, password)
+    monkeypatch.setattr(credentials, 'verify', counting_verify)
+    return calls
+
+def test_basic(authenticator):
+    assert authenticator.authenticate(basic('admin', 'password123')) == 'admin'
+    assert authenticator.authenticate(basic('admin', 'wrong')) is None
+    assert authenticator.authenticate(basic('nobody', 'password123')) is None
+    assert authenticator.authenticate('Basic not-base64!') is None
+    assert authenticator.authenticate('Digest abc') is None
+    assert authenticator.authenticate(None) is None
+
+def test_verified_header_cached_until_ttl(authenticator, credentials, clock, monkeypatch):
+    calls = count_verifications(monkeypatch, credentials)
+    header = basic('admin', 'password123')
+
+    assert authenticator.authenticate(header) == 'admin'
+    clock.now += authenticator.cache.ttl - 1
+    assert authenticator.authenticate(header) == 'admin'
+    assert len(calls) == 1
+
+    clock.now += 2
+    assert authenticator.authenticate(header) == 'admin'
+    assert len(calls) == 2
+
+def test_cache_evicts_least_recently_used():
+    cache = AuthCache(max_entries=2)
+    for name in ('a', 'b', 'c'):
+        cache.put(cache.key(name), name)
+    assert cache.get(cache.key('a')) is None
+    assert cache.get(cache.key('c')) == 'c'
+    assert len(cache) == 2
+
+def test_rejected_header_cached(authenticator, credentials, monkeypatch):
+    calls = count_verifications(monkeypatch, credentials)
+    header = basic('admin', 'wrong')
+
+    for _ in range(3):
+        assert authenticator.authenticate(header, '10.0.0.1') is None
+    assert len(calls) == 1
+
+def test_failed_checks_limited_per_client(authenticator, credentials, clock, monkeypatch):
+    calls = count_verifications(monkeypatch, credentials)
+    limiter = authenticator.limiter
+    for attempt in range(limiter.max_failures):
+        assert authenticator.authenticate(basic('admin', f'guess{attempt}'), '10.0.0.1') is None
+
+    with pytest.raises(TooManyFailures) as error:
+        authenticator.authenticate(basic('admin', 'password123'), '10.0.0.1')
+    assert 0 < error.value.retry_after <= limiter.window
+    assert len(calls) == limiter.max_failures
+    # Other clients, and headers already verified, are not affected
+    assert authenticator.authenticate(basic('admin', 'password123'), '10.0.0.2') == 'admin'
+    assert authenticator.authenticate(basic('admin', 'password123'), '10.0.0.1') == 'admin'
+
+    clock.now += limiter.window
+    assert authenticator.authenticate(basic('admin', 'guess-again'), '10.0.0.1') is None
+
+def test_limiter_forgets_least_recent_clients():
+    limiter = FailureLimiter(max_failures=1, max_clients=2)
+    for client in ('a', 'b', 'c'):
+        limiter.failed(client)
+    assert limiter.retry_after('a') == 0
+    assert limiter.retry_after('c') > 0
+
+def test_bearer(authenticator):
+    token = authenticator.issue_token('admin')
+
+    assert authenticator.authenticate('Bearer ' + token) == 'admin'
+    assert authenticator.authenticate('bearer  ' + token + ' ') == 'admin'
+
+def test_bearer_not_accepted_to_issue_tokens(authenticator):
+    token = authenticator.issue_token('admin')
+
+    assert authenticator.authenticate('Bearer ' + token, allow_bearer=False) is None
+    assert authenticator.authenticate(basic('admin', 'password123'), allow_bearer=False) == 'admin'
+
+def test_expired_token(authenticator, clock):
+    token = authenticator.issue_token('admin')
+
+    clock.now += authenticator.tokens.ttl
+    assert authenticator.authenticate('Bearer ' + token) == 'admin'
+    clock.now += 1
+    assert authenticator.authenticate('Bearer ' + token) is None
+
+def test_bad_signature(authenticator, credentials):
+    token = authenticator.issue_token('admin')
+    payload, _, signature = token.rpartition('.')
+    user, _, expires = payload.partition('.')
+
+    forged_signature = ('A' if signature[0] != 'A' else 'B') + signature[1:]
+    assert authenticator.authenticate(f'Bearer {payload}.{forged_signature}') is None
+    # A later expiry under the old signature
+    assert authenticator.authenticate(f'Bearer {user}.{int(expires) + 3600}.{signature}') is None
+    # Signed with another secret
+    other = Authenticator(credentials, TokenSigner(b'other secret'))
+    assert authenticator.authenticate('Bearer ' + other.issue_token('admin')) is None
+    assert authenticator.authenticate('Bearer not-a-token') is None
+    assert authenticator.authenticate('Bearer tökén') is None
+
+def test_password_change_revokes_tokens(authenticator, credentials):
+    token = authenticator.issue_token('admin')
+
+    credentials.users['admin'] = hash_password('new password', iterations=ITERATIONS)
+
+    assert authenticator.authenticate('Bearer ' + token) is None
+    assert authenticator.authenticate('Bearer ' + authenticator.issue_token('admin')) == 'admin'
+
+def test_deleted_user_tokens_rejected(authenticator, credentials):
+    token = authenticator.issue_token('admin')
+
+    del credentials.users['admin']
+
+    assert authenticator.authenticate('Bearer ' + token) is None
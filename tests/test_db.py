@@ -0,0 +1,88 @@
+"""
+Tests for SQLiteTransactionStore
+"""
+
+import json
+import pytest
+from api.db import SQLiteTransactionStore
+from api.rest_api import SMSDataProcessor
+from api.store import DictTransactionStore
+
+with open('data/processed/transactions.json', encoding='utf-8') as f:
+    SAMPLE = json.load(f)
+
+# The fields POST /transactions requires
+POSTED = {'transaction_type': 'payment', 'amount': 2500.0, 'currency': 'RWF',
+          'sender': 'Self', 'receiver': 'Shop'}
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'momo.db')
+
+@pytest.fixture
+def store(db_path):
+    store = SQLiteTransactionStore(db_path, pool_size=2)
+    store.load(SAMPLE)
+    yield store
+    store.close()
+
+def test_loaded_transactions_round_trip(store):
+    assert list(store) == SAMPLE
+
+@pytest.mark.parametrize('transaction', [
+    POSTED,
+    {**POSTED, 'amount': -100.0},
+    {**POSTED, 'amount': None},
+    {**POSTED, 'timestamp': '2024-06-01T10:00:00', 'status': 'completed', 'balance': 10.0, 'fee': 0.0},
+])
+def test_add_returns_same_fields_as_dict_store(store, transaction):
+    expected = DictTransactionStore(SAMPLE).add(dict(transaction))
+
+    added = store.add(dict(transaction))
+
+    # Names, reference numbers and messages come back as empty strings
+    assert added == {'reference_number': '', 'message': '', **expected}
+    assert store.get(added['id']) == added
+
+def test_update_keeps_missing_fields_missing(store):
+    added = store.add(dict(POSTED))
+
+    updated = store.update(added['id'], {'amount': -5.0})
+
+    assert updated == {**added, 'amount': -5.0}
+
+def test_reused_reference_number_is_value_error(store):
+    with pytest.raises(ValueError):
+        store.add({**POSTED, 'reference_number': SAMPLE[0]['reference_number']})
+    # Rolled back: the store still takes writes
+    assert store.add(dict(POSTED))['id'] == len(SAMPLE) + 1
+
+def test_changed_elsewhere_sees_only_other_writers(store, db_path):
+    assert not store.changed_elsewhere()
+    store.add(dict(POSTED))
+    assert not store.changed_elsewhere()
+
+    other = SQLiteTransactionStore(db_path, pool_size=1)
+    try:
+        other.delete(1)
+    finally:
+        other.close()
+
+    assert store.changed_elsewhere()
+    assert not store.changed_elsewhere()
+
+def test_processor_rebuilds_derived_data_after_outside_write(store, db_path):
+    processor = SMSDataProcessor('unused.xml', store)
+    payments = [tx['id'] for tx in SAMPLE if tx['transaction_type'] == 'payment']
+    assert processor.query_transaction_ids({'transaction_type': 'payment'}) == payments
+    version = processor.current_version()
+
+    other = SQLiteTransactionStore(db_path, pool_size=1)
+    try:
+        new_id = other.add(dict(POSTED))['id']
+        other.delete(payments[0])
+    finally:
+        other.close()
+
+    assert processor.current_version() > version
+    assert processor.query_transaction_ids({'transaction_type': 'payment'}) == payments[1:] + [new_id]
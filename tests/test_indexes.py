@@ -0,0 +1,66 @@
+"""
+Tests for the sorted indexes behind range filters and top-k queries
+"""
+
+import random
+from bisect import insort
+import pytest
+from api.indexes import SortedIndex, TransactionIndexes
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Tiny blocks so a few hundred entries exercise splits and emptied blocks
+    monkeypatch.setattr(SortedIndex, 'BLOCK_SIZE', 4)
+
+def expected_ids(entries, low, high, high_inclusive):
+    return [tx_id for key, tx_id in entries
+            if (low is None or key >= low) and (high is None or (key <= high if high_inclusive else key < high))]
+
+def test_empty_index_queries():
+    index = SortedIndex()
+
+    assert list(index.range()) == []
+    assert list(index.range(1.0, 5.0, reverse=True)) == []
+    assert index.top(3) == []
+    assert index.count_range(1.0, 5.0) == 0
+    assert TransactionIndexes().query({'min_amount': 5.0}) == []
+    assert TransactionIndexes().top('amount', 5) == []
+
+def test_emptied_index_queries(small_blocks):
+    index = SortedIndex()
+    entries = [(float(tx_id % 7), tx_id) for tx_id in range(1, 30)]
+    index.build(entries)
+    for key, tx_id in entries:
+        index.remove(key, tx_id)
+
+    assert len(index) == 0
+    assert list(index.range(0.0, 10.0)) == []
+    assert index.top(3, largest=False) == []
+    assert index.count_range() == 0
+
+    index.add(2.0, 99)
+    assert index.top(3) == [99]
+
+def test_matches_sorted_list(small_blocks):
+    rng = random.Random(0)
+    index = SortedIndex()
+    reference = []
+    for tx_id in range(2000):
+        if reference and rng.random() < 0.4:
+            entry = reference.pop(rng.randrange(len(reference)))
+            index.remove(*entry)
+        else:
+            entry = (float(rng.randint(0, 50)), tx_id)
+            index.add(*entry)
+            insort(reference, entry)
+
+        if tx_id % 50 == 0:
+            low, high = sorted(rng.sample(range(-5, 56), 2))
+            high_inclusive = rng.random() < 0.5
+            expected = expected_ids(reference, low, high, high_inclusive)
+            assert list(index.range(low, high, high_inclusive)) == expected
+            assert list(index.range(low, high, high_inclusive, reverse=True)) == expected[::-1]
+            assert index.count_range(low, high, high_inclusive) == len(expected)
+            assert index.top(5, True, low, high, high_inclusive) == expected[::-1][:5]
+
+    assert list(index) == reference
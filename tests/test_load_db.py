@@ -1,2 +1,169 @@
-#This file belongs to test_load_db.py
+"""
+Tests for SchemaBulkLoader, run against SQLite standing in for MySQL
+"""
 
+import os
+import re
+import sqlite3
+import pytest
+from etl.load_db import SchemaBulkLoader
+
+MYSQL_SCHEMA_FILE = os.path.join(os.path.dirname(__file__), '..', 'database', 'database_setup.sql')
+
+TRANSFER_MESSAGE = ('*165*S*10000 RWF transferred to Samuel Carter (250791666666) from 36521838 at '
+                    '2024-05-11 20:34:47 . Fee was: 100 RWF. New balance: 28300 RWF.')
+
+def make_transaction(tx_id, transaction_type='payment', receiver='Samuel Carter', reference=None, message=None):
+    return {
+        'id': tx_id,
+        'transaction_type': transaction_type,
+        'amount': 1000.0 * tx_id,
+        'currency': 'RWF',
+        'sender': 'Self',
+        'receiver': receiver,
+        'timestamp': f'2024-05-1{tx_id % 10}T16:30:58.724000',
+        'status': 'completed',
+        'reference_number': reference or '',
+        'balance': 5000.0,
+        'fee': 0.0,
+        'message': message if message is not None else f'TxId: {reference}. Your payment to {receiver}.'
+    }
+
+def sqlite_schema(mysql_schema):
+    """
+    SQLite translation of the tables, indexes and categories in database_setup.sql
+
+    Every constraint is kept: ENUM columns become CHECK constraints and
+    VARCHAR lengths are checked as MySQL's strict mode would. Comments and
+    table options are dropped; sample data other than the categories is left out.
+    """
+    mysql_schema = re.sub(r'--[^\n]*', '', mysql_schema)
+    statements = []
+    for statement in mysql_schema.split(';'):
+        statement = statement.strip()
+        if not statement.startswith(('CREATE TABLE', 'CREATE INDEX', 'INSERT INTO Transaction_Categories')):
+            continue
+        statement = re.sub(r"\s+COMMENT\s*=?\s*'(?:[^']|'')*'", '', statement)
+        statement = re.sub(r'\)\s*ENGINE=\w+$', ')', statement)
+        statement = statement.replace('INT AUTO_INCREMENT PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT')
+        statement = re.sub(r'(\w+) ENUM\(([^)]*)\)', r'\1 TEXT CHECK (\1 IN (\2))', statement)
+        statement = re.sub(r'(\w+) VARCHAR\((\d+)\)', r'\1 VARCHAR(\2) CHECK (length(\1) <= \2)', statement)
+        statements.append(statement + ';')
+    return '\n'.join(statements)
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('PRAGMA foreign_keys = ON')
+    with open(MYSQL_SCHEMA_FILE, encoding='utf-8') as f:
+        conn.executescript(sqlite_schema(f.read()))
+    yield conn
+    conn.close()
+
+def test_loads_all_tables_with_resolved_keys(conn):
+    transactions = [
+        make_transaction(1, 'payment', reference='111'),
+        make_transaction(2, 'transfer', message=TRANSFER_MESSAGE),
+        make_transaction(3, 'deposit', receiver='Self', message='')
+    ]
+    counts = SchemaBulkLoader(conn).load(transactions)
+
+    assert counts == {'messages': 2, 'users': 2, 'transactions': 3, 'skipped': 0}
+    rows = conn.execute(
+        'SELECT t.transaction_type, c.category_name, s.full_name, r.full_name, m.raw_content, '
+        't.timestamp, t.reference_number '
+        'FROM Transactions t JOIN Transaction_Categories c ON c.category_id = t.category_id '
+        'LEFT JOIN Users s ON s.user_id = t.sender_id LEFT JOIN Users r ON r.user_id = t.receiver_id '
+        'LEFT JOIN Raw_Messages m ON m.message_id = t.message_id ORDER BY t.transaction_id'
+    ).fetchall()
+
+    assert rows[0] == ('pay', 'Payment', 'Self', 'Samuel Carter', transactions[0]['message'],
+                       '2024-05-11 16:30:58', '111')
+    assert rows[1][:4] == ('transfer', 'Transfer', 'Self', 'Samuel Carter')
+    assert rows[1][6] is None
+    # chk_sender_receiver: a deposit to yourself comes from an external sender
+    assert rows[2][:5] == ('deposit', 'Deposit', None, 'Self', None)
+
+def test_users_deduplicated_by_phone_and_name(conn):
+    SchemaBulkLoader(conn).load([
+        make_transaction(1, 'payment', reference='111'),
+        make_transaction(2, 'transfer', message=TRANSFER_MESSAGE),
+        make_transaction(3, 'payment', reference='333')
+    ])
+
+    users = dict(conn.execute('SELECT full_name, phone_number FROM Users'))
+    assert users['Samuel Carter'] == '+250791666666'
+    assert users['Self'] == SchemaBulkLoader.placeholder_phone('Self')
+    assert len(users) == 2
+
+@pytest.mark.parametrize('sender_id, receiver_id, currency, transaction_type', [
+    (1, 1, 'RWF', 'pay'),          # chk_sender_receiver
+    (1, None, 'XYZ', 'pay'),       # chk_currency
+    (1, None, 'RWF', 'airtime'),   # transaction_type ENUM
+])
+def test_schema_constraints_enforced(conn, sender_id, receiver_id, currency, transaction_type):
+    conn.execute("INSERT INTO Users (user_id, phone_number) VALUES (1, '+250788000001')")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute('INSERT INTO Transactions (sender_id, receiver_id, category_id, amount, currency, '
+                     'timestamp, transaction_type) VALUES (?, ?, 1, 5.0, ?, ?, ?)',
+                     (sender_id, receiver_id, currency, '2024-05-11 16:30:58', transaction_type))
+
+def test_other_etl_types_mapped_to_schema_types(conn):
+    SchemaBulkLoader(conn).load([make_transaction(1, 'airtime', receiver='Airtime', reference='111')])
+
+    assert conn.execute(
+        'SELECT t.transaction_type, c.category_name FROM Transactions t '
+        'JOIN Transaction_Categories c ON c.category_id = t.category_id'
+    ).fetchall() == [('pay', 'Airtime')]
+
+    with pytest.raises(ValueError):
+        SchemaBulkLoader(conn).load([make_transaction(2, 'refund', reference='222')])
+    assert conn.execute('SELECT COUNT(*) FROM Transactions').fetchone()[0] == 1
+
+def test_rerun_skips_loaded_messages_without_reference(conn):
+    transactions = [make_transaction(1, 'transfer', message=TRANSFER_MESSAGE)]
+    SchemaBulkLoader(conn).load(transactions)
+
+    counts = SchemaBulkLoader(conn).load(transactions + [
+        make_transaction(2, 'transfer', message=TRANSFER_MESSAGE),
+        make_transaction(3, 'transfer', message=TRANSFER_MESSAGE.replace('10000 RWF', '20000 RWF'))
+    ])
+
+    assert counts['transactions'] == 1
+    assert counts['skipped'] == 2
+
+def test_rerun_skips_loaded_references_and_reuses_users(conn):
+    first = [make_transaction(1, reference='111'), make_transaction(2, reference='222')]
+    SchemaBulkLoader(conn).load(first)
+
+    counts = SchemaBulkLoader(conn).load(first + [make_transaction(3, reference='333', receiver='Jane Smith')])
+
+    assert counts == {'messages': 1, 'users': 1, 'transactions': 1, 'skipped': 2}
+    assert conn.execute('SELECT COUNT(*) FROM Transactions').fetchone()[0] == 3
+    assert conn.execute('SELECT MAX(transaction_id) FROM Transactions').fetchone()[0] == 3
+
+def test_multi_row_batches(conn):
+    transactions = [make_transaction(i, reference=str(i)) for i in range(1, 8)]
+    statements = []
+    conn.set_trace_callback(statements.append)
+
+    SchemaBulkLoader(conn, batch_size=3).load(transactions)
+
+    inserts = [sql for sql in statements if sql.startswith('INSERT INTO Transactions')]
+    assert len(inserts) == 3
+    assert conn.execute('SELECT COUNT(*) FROM Transactions').fetchone()[0] == 7
+
+def test_failed_load_is_rolled_back(conn):
+    bad = make_transaction(2, reference='222')
+    bad['amount'] = -5.0
+
+    with pytest.raises(sqlite3.IntegrityError):
+        SchemaBulkLoader(conn).load([make_transaction(1, reference='111'), bad])
+
+    assert conn.execute('SELECT COUNT(*) FROM Transactions').fetchone()[0] == 0
+    assert conn.execute('SELECT COUNT(*) FROM Users').fetchone()[0] == 0
+
+def test_paramstyle_from_driver(conn):
+    assert SchemaBulkLoader(conn).placeholder == '?'
+    assert SchemaBulkLoader(conn, paramstyle='format').placeholder == '%s'
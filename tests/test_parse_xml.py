@@ -1,2 +1,193 @@
-#This file belongs to test_parse_xml.py
+"""
+Tests for SMSTransactionParser and the incremental ETL
+"""
 
+import json
+import os
+import pytest
+import etl.run
+from etl.parse_xml import (SMSTransactionParser, CHECKPOINT_REFERENCE_WINDOW_MS, RECEIVE_PATTERN,
+                           PAYMENT_PATTERN, TRANSFER_PATTERN, DEPOSIT_PATTERN)
+from etl.run import run_incremental
+from etl.sms_index import SMSOffsetIndex
+from api.snapshot import SnapshotReader
+from tests.sms_backup import FIRST_DATE, MESSAGE_KINDS, sms_element, backup_text
+
+XML_FILE = 'data/raw/modified_sms_v2.xml'
+
+# How the original parser typed a body: the first pattern found anywhere in it
+BASELINE_PATTERNS = (('receive', RECEIVE_PATTERN), ('payment', PAYMENT_PATTERN),
+                     ('transfer', TRANSFER_PATTERN), ('deposit', DEPOSIT_PATTERN))
+
+def baseline_type(body):
+    for transaction_type, pattern in BASELINE_PATTERNS:
+        if pattern.search(body):
+            return transaction_type
+    return 'unknown'
+
+# Streaming parse and prefix classification against the original DOM parse
+# and try-every-pattern extraction
+
+@pytest.fixture(params=['mixed', 'sample'])
+def xml_file(request, write_backup):
+    """A backup with every message kind, markup-significant characters and an
+    empty body; then the sample backup shipped with the repo"""
+    if request.param == 'sample':
+        return XML_FILE
+    elements = [sms_element(n) for n in range(4 * len(MESSAGE_KINDS))]
+    elements.append(sms_element(0, body=''))
+    elements.append(sms_element(1, body='TxId: 12. Your payment of <1,000> RWF "quoted" & more'))
+    elements.append(sms_element(2, body='*165*S* unreadable transfer'))
+    elements.append(sms_element(3, address='MTN'))
+    return write_backup(elements)
+
+def test_streamed_records_equal_dom_records(xml_file):
+    streamed = list(SMSTransactionParser(xml_file).iter_sms_records())
+
+    assert streamed == SMSTransactionParser(xml_file).parse_xml()
+
+def test_streamed_transactions_equal_dom_transactions(xml_file):
+    dom = SMSTransactionParser(xml_file)
+    expected = dom.process_sms_to_transactions(dom.parse_xml())
+
+    streaming = SMSTransactionParser(xml_file)
+    transactions = streaming.process_sms_to_transactions(streaming.iter_sms_records())
+
+    assert transactions == expected
+    assert streaming.sms_ordinals == dom.sms_ordinals
+
+def test_prefix_classification_matches_trying_every_pattern(xml_file):
+    parser = SMSTransactionParser(xml_file)
+    bodies = [record['body'] for record in parser.iter_sms_records() if record['address'] == 'M-Money']
+    types = [baseline_type(body) for body in bodies]
+
+    assert [(parser.extract_transaction_info(body) or {'transaction_type': 'unknown'})['transaction_type']
+            for body in bodies] == types
+    # Unknown and malformed messages are among them
+    assert 'unknown' in types and len(set(types)) == 5
+
+def output_files(directory):
+    os.makedirs(directory, exist_ok=True)
+    return {name: os.path.join(directory, file_name) for name, file_name in (
+        ('output_file', 'transactions.json'), ('checkpoint_file', 'checkpoint.json'),
+        ('dashboard_file', 'dashboard.json'), ('snapshot_file', 'transactions.snapshot'),
+        ('sms_index_file', 'sms_offsets.idx'))}
+
+def read_outputs(files):
+    """Everything an ETL run leaves behind, comparable across runs"""
+    with open(files['output_file'], 'rb') as f:
+        output = f.read()
+    with open(files['dashboard_file'], encoding='utf-8') as f:
+        dashboard = json.load(f)
+    del dashboard['generated_at']
+    snapshot = SnapshotReader(files['snapshot_file'])
+    try:
+        snapshot_transactions = list(snapshot)
+    finally:
+        snapshot.close()
+    with SMSOffsetIndex(files['sms_index_file']) as index:
+        sms_index = (len(index), index.transaction_ids(), index.references())
+    with open(files['checkpoint_file'], encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    return output, dashboard, snapshot_transactions, sms_index, checkpoint
+
+def grow_backup(path, elements):
+    """Rewrite a backup with more messages, as the backup app does"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(backup_text(elements))
+
+@pytest.fixture
+def full_run(tmp_path, write_backup):
+    """Outputs of a single incremental run over 60 messages"""
+    elements = [sms_element(n) for n in range(60)]
+    files = output_files(tmp_path / 'full')
+    run_incremental(write_backup(elements, 'full.xml'), **files)
+    return elements, read_outputs(files)
+
+def test_half_then_all_equals_one_full_run(tmp_path, full_run):
+    elements, expected = full_run
+    backup = str(tmp_path / 'backup.xml')
+    files = output_files(tmp_path / 'incremental')
+
+    grow_backup(backup, elements[:30])
+    first = run_incremental(backup, **files)
+    grow_backup(backup, elements)
+    second = run_incremental(backup, **files)
+
+    assert first and second
+    assert [tx['id'] for tx in first + second] == list(range(1, len(first) + len(second) + 1))
+    assert read_outputs(files) == expected
+
+def test_retry_after_failed_step_equals_one_full_run(tmp_path, full_run, monkeypatch):
+    elements, expected = full_run
+    backup = str(tmp_path / 'backup.xml')
+    files = output_files(tmp_path / 'incremental')
+
+    grow_backup(backup, elements[:30])
+    run_incremental(backup, **files)
+    grow_backup(backup, elements)
+
+    # The JSON and snapshot are appended, then the dashboard update fails
+    def fail(*args):
+        raise OSError('disk full')
+    monkeypatch.setattr(etl.run, 'update_dashboard', fail)
+    with pytest.raises(OSError):
+        run_incremental(backup, **files)
+    monkeypatch.undo()
+
+    run_incremental(backup, **files)
+    assert read_outputs(files) == expected
+
+def test_rerun_without_new_messages_changes_nothing(tmp_path, write_backup):
+    backup = write_backup(30)
+    files = output_files(tmp_path / 'out')
+    run_incremental(backup, **files)
+    before = read_outputs(files)
+
+    assert run_incremental(backup, **files) == []
+    assert read_outputs(files) == before
+
+def test_checkpoint_round_trip(tmp_path, write_backup):
+    parser = SMSTransactionParser(write_backup(10))
+    checkpoint = parser.load_checkpoint(None)
+    parser.process_new_transactions(parser.iter_sms_records(), checkpoint)
+    checkpoint_file = str(tmp_path / 'checkpoint.json')
+
+    parser.save_checkpoint(checkpoint, checkpoint_file)
+
+    assert parser.load_checkpoint(checkpoint_file) == checkpoint
+    assert parser.load_checkpoint(str(tmp_path / 'missing.json'))['last_id'] == 0
+
+def test_checkpoint_keeps_only_recent_references(write_backup):
+    day = 24 * 60 * 60 * 1000
+    window_days = CHECKPOINT_REFERENCE_WINDOW_MS // day
+    # Payments (message kind 1) a day apart, spanning twice the window
+    elements = [sms_element(1 + 7 * n, date=FIRST_DATE + n * day) for n in range(2 * window_days)]
+    parser = SMSTransactionParser(write_backup(elements))
+    checkpoint = parser.load_checkpoint(None)
+
+    transactions = parser.process_new_transactions(parser.iter_sms_records(), checkpoint)
+
+    assert len(transactions) == len(elements)
+    assert sorted(checkpoint['reference_numbers']) == sorted(
+        tx['reference_number'] for tx in transactions[-window_days - 1:])
+    assert checkpoint['last_id'] == len(elements)
+
+def test_recent_reference_redelivered_later_is_skipped(write_backup):
+    first = sms_element(1)
+    redelivered = sms_element(1, date=FIRST_DATE + 60 * 60 * 1000)
+    parser = SMSTransactionParser(write_backup([first]))
+    checkpoint = parser.load_checkpoint(None)
+    parser.process_new_transactions(parser.iter_sms_records(), checkpoint)
+
+    parser = SMSTransactionParser(write_backup([first, redelivered]))
+    assert parser.process_new_transactions(parser.iter_sms_records(), checkpoint) == []
+
+def test_old_checkpoint_reference_list_is_converted(tmp_path):
+    checkpoint_file = tmp_path / 'checkpoint.json'
+    checkpoint_file.write_text(json.dumps({'last_date': 5, 'last_id': 2, 'reference_numbers': ['1', '2'],
+                                           'boundary_keys': ['2']}))
+
+    checkpoint = SMSTransactionParser.load_checkpoint(str(checkpoint_file))
+
+    assert checkpoint['reference_numbers'] == {'1': 5, '2': 5}
@@ -0,0 +1,91 @@
+"""
+Tests for the serialized GET response cache and ETag matching
+"""
+
+from api.response_cache import ResponseCache, CapturingWriter, etag_matches
+
+HEADERS = [('Content-type', 'application/json')]
+
+def test_lru_eviction_by_bytes():
+    cache = ResponseCache(max_bytes=10)
+    cache.put('a', 1, HEADERS, b'aaaa')
+    cache.put('b', 1, HEADERS, b'bbbb')
+    # 'a' becomes the most recently used
+    assert cache.get('a', 1) == (HEADERS, b'aaaa')
+
+    cache.put('c', 1, HEADERS, b'cccc')
+
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) is not None
+    assert cache.get('c', 1) is not None
+    assert cache.size == 8
+    assert len(cache) == 2
+
+def test_replacing_entry_keeps_size():
+    cache = ResponseCache(max_bytes=100)
+    cache.put('a', 1, HEADERS, b'a' * 10)
+    cache.put('a', 1, HEADERS, b'a' * 30)
+
+    assert cache.size == 30
+    assert len(cache) == 1
+
+def test_body_larger_than_cache_not_kept():
+    cache = ResponseCache(max_bytes=10)
+    cache.put('a', 1, HEADERS, b'a' * 11)
+
+    assert cache.get('a', 1) is None
+    assert cache.size == 0
+
+def test_newer_version_drops_entries():
+    cache = ResponseCache()
+    cache.put('a', 1, HEADERS, b'old')
+
+    assert cache.get('a', 2) is None
+    assert cache.size == 0
+    # A response built under the old version arrives late
+    cache.put('a', 1, HEADERS, b'old')
+    assert cache.get('a', 2) is None
+
+def test_hit_and_miss_counts():
+    cache = ResponseCache()
+    cache.get('a', 1)
+    cache.put('a', 1, HEADERS, b'body')
+    cache.get('a', 1)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_etag_per_resource_version_and_encoding():
+    cache = ResponseCache()
+    etag = cache.etag(1, '/transactions/1')
+
+    assert etag == cache.etag(1, '/transactions/1')
+    assert etag != cache.etag(1, '/transactions/2')
+    assert etag != cache.etag(1, '/transactions/1?fields=id')
+    assert etag != cache.etag(2, '/transactions/1')
+    assert etag != cache.etag(1, '/transactions/1', 'gzip')
+    assert etag != ResponseCache().etag(1, '/transactions/1')
+
+def test_etag_matches():
+    assert etag_matches('"x"', '"x"')
+    assert etag_matches('W/"x"', '"x"')
+    assert etag_matches('"y", "x"', '"x"')
+    assert etag_matches('*', '"x"')
+    assert not etag_matches('"y"', '"x"')
+    assert not etag_matches(None, '"x"')
+
+def test_capturing_writer_overflow():
+    class Sink:
+        def __init__(self):
+            self.data = b''
+        def write(self, data):
+            self.data += data
+            return len(data)
+
+    sink = Sink()
+    capture = CapturingWriter(sink, limit=5)
+    capture.write(b'abc')
+    assert capture.getvalue() == b'abc'
+    capture.write(b'def')
+
+    assert capture.getvalue() is None
+    assert sink.data == b'abcdef'
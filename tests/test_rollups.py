@@ -0,0 +1,90 @@
+"""
+Tests for the /stats rollups, against a scan of every transaction
+"""
+
+import random
+import pytest
+from api.rest_api import SMSDataProcessor
+from api.rollups import HOUR_MICROS, TIME_BUCKET_FORMATS, TransactionRollups
+from api.store import DictTransactionStore, micros_to_timestamp, timestamp_to_micros
+
+# 2024-05-10 00:00 UTC
+FIRST_MICROS = timestamp_to_micros('2024-05-10T00:00:00')
+
+def random_transactions(count, seed=7):
+    rng = random.Random(seed)
+    transactions = []
+    for tx_id in range(1, count + 1):
+        micros = FIRST_MICROS + rng.randrange(72) * HOUR_MICROS + rng.randrange(HOUR_MICROS)
+        transactions.append({
+            'id': tx_id,
+            'transaction_type': rng.choice(('receive', 'payment', 'transfer')),
+            'currency': rng.choice(('RWF', 'USD')),
+            'amount': float(rng.randrange(1, 500)),
+            'timestamp': micros_to_timestamp(micros - micros % 1_000_000),
+        })
+    transactions.append({'id': count + 1, 'transaction_type': 'payment', 'currency': 'RWF', 'amount': 7.0})
+    return transactions
+
+def scanned_stats(transactions, bucket, start, end):
+    """What the rollups should report, from a scan of every transaction"""
+    rollups = TransactionRollups()
+    for tx in transactions:
+        micros = timestamp_to_micros(tx.get('timestamp'))
+        if start is None and end is None or (
+                micros is not None and (start is None or micros >= start) and (end is None or micros < end)):
+            rollups.add(tx)
+    return rollups.query(bucket)
+
+@pytest.fixture
+def processor():
+    processor = SMSDataProcessor('unused.xml', DictTransactionStore())
+    processor.store.load(random_transactions(400))
+    processor.derived_ready = False
+    return processor
+
+def window_bounds():
+    rng = random.Random(11)
+    bounds = [(None, None), (FIRST_MICROS, None), (None, FIRST_MICROS + 5 * HOUR_MICROS),
+              (FIRST_MICROS + 90 * 60_000_000, FIRST_MICROS + 100 * 60_000_000)]
+    for _ in range(20):
+        start = FIRST_MICROS + rng.randrange(-HOUR_MICROS, 75 * HOUR_MICROS)
+        bounds.append((start, start + rng.randrange(0, 30 * HOUR_MICROS)))
+    return bounds
+
+@pytest.mark.parametrize('bucket', sorted(TIME_BUCKET_FORMATS))
+@pytest.mark.parametrize('start, end', window_bounds())
+def test_stats_equal_a_scan(processor, bucket, start, end):
+    assert processor.get_stats(bucket, start, end) == scanned_stats(list(processor.store), bucket, start, end)
+
+def test_stats_follow_writes(processor):
+    start, end = FIRST_MICROS + 30 * 60_000_000, FIRST_MICROS + 150 * 60_000_000
+    processor.get_stats('hour', start, end)
+
+    processor.add_transaction({'transaction_type': 'payment', 'currency': 'RWF', 'amount': 1000.0,
+                               'timestamp': micros_to_timestamp(start + 60_000_000)})
+    processor.update_transaction(1, {'timestamp': micros_to_timestamp(end - 1_000_000)})
+    processor.delete_transaction(2)
+
+    assert processor.get_stats('hour', start, end) == scanned_stats(list(processor.store), 'hour', start, end)
+
+def test_partial_hours():
+    hour = FIRST_MICROS
+    minute = 60_000_000
+
+    assert TransactionRollups.partial_hours(hour, hour + 2 * HOUR_MICROS) == []
+    assert TransactionRollups.partial_hours(hour + minute, None) == [(hour + minute, hour + HOUR_MICROS)]
+    assert TransactionRollups.partial_hours(None, hour + minute) == [(hour, hour + minute)]
+    assert TransactionRollups.partial_hours(hour + minute, hour + 2 * minute) == [(hour + minute, hour + 2 * minute)]
+    assert TransactionRollups.partial_hours(hour + minute, hour + HOUR_MICROS + minute) == [
+        (hour + minute, hour + HOUR_MICROS), (hour + HOUR_MICROS, hour + HOUR_MICROS + minute)]
+    assert TransactionRollups.partial_hours(hour + 2 * minute, hour + minute) == []
+
+def test_hour_labels():
+    rollups = TransactionRollups()
+    rollups.add({'id': 1, 'transaction_type': 'payment', 'currency': 'RWF', 'amount': 5.0,
+                 'timestamp': '2024-05-10T13:45:00'})
+
+    stats = rollups.query('hour')
+
+    assert list(stats['by_hour']) == ['2024-05-10T13:00']
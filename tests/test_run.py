@@ -0,0 +1,45 @@
+"""
+Tests for the parallel ETL run, against the serial parse
+"""
+
+import pytest
+from etl.run import find_chunk_boundaries, run_parallel, run_serial
+from etl.sms_index import scan_sms_ranges
+from tests.sms_backup import sms_element, with_markup
+
+XML_FILE = 'data/raw/modified_sms_v2.xml'
+
+CHUNK_SIZES = [1000, 4096, 50000]
+
+@pytest.fixture(params=['sample', 'markup'])
+def xml_file(request, write_backup):
+    if request.param == 'sample':
+        return XML_FILE
+    # '<sms' in comments, CDATA and PIs, often right where a chunk would be cut
+    return write_backup(with_markup([sms_element(n) for n in range(300)]))
+
+@pytest.mark.parametrize('chunk_bytes', CHUNK_SIZES)
+def test_parallel_equals_serial(xml_file, chunk_bytes):
+    assert run_parallel(xml_file, workers=2, chunk_bytes=chunk_bytes) == run_serial(xml_file)
+
+@pytest.mark.parametrize('chunk_bytes', CHUNK_SIZES + [1])
+def test_chunks_hold_whole_elements(xml_file, chunk_bytes):
+    with open(xml_file, 'rb') as f:
+        data = f.read()
+    ranges = scan_sms_ranges(data)
+
+    chunks = find_chunk_boundaries(xml_file, chunk_bytes)
+
+    assert len(chunks) > 1
+    assert chunks[0][0] == ranges[0][0]
+    assert all(end == next_start for (_, end), (next_start, _) in zip(chunks, chunks[1:]))
+    # Every chunk starts at an element, so no element straddles two chunks
+    starts = {start for start, _ in ranges}
+    assert all(start in starts for start, _ in chunks)
+    assert chunks[-1][1] >= ranges[-1][1]
+
+def test_backup_without_elements(write_backup):
+    path = write_backup([])
+
+    assert find_chunk_boundaries(path, 1000) == []
+    assert run_parallel(path, workers=2, chunk_bytes=1000) == ([], [], 0)
@@ -0,0 +1,83 @@
+"""
+Tests for the SMS offset index and RawSMSReader
+"""
+
+import os
+import pytest
+from api.rest_api import SMSDataProcessor
+from api.store import DictTransactionStore
+from etl.parse_xml import SMSTransactionParser
+from etl.run import run_incremental
+from etl.sms_index import RawSMSReader, build_sms_index, scan_sms_ranges
+from tests.sms_backup import BACKUP_FOOTER, sms_element, backup_text, with_markup
+
+def index_files(directory):
+    return {'output_file': str(directory / 'transactions.json'),
+            'checkpoint_file': str(directory / 'checkpoint.json'),
+            'dashboard_file': str(directory / 'dashboard.json'),
+            'snapshot_file': str(directory / 'transactions.snapshot'),
+            'sms_index_file': str(directory / 'sms_offsets.idx')}
+
+def test_scan_skips_markup_that_is_not_elements():
+    elements = [sms_element(n) for n in range(3)] + ['<sms body="text">with content</sms >\n', '<sms></sms>']
+    data = backup_text(with_markup(elements)).encode()
+    data = data.replace(b'<smses', b'<!DOCTYPE smses [<!ENTITY note "<sms/>">]>\n<smses', 1)
+
+    ranges = scan_sms_ranges(data)
+
+    assert [data[start:end].decode() for start, end in ranges] == [element.strip() for element in elements]
+
+def test_reader_round_trips_every_record(tmp_path, write_backup):
+    backup = write_backup(with_markup([sms_element(n) for n in range(30)]))
+    files = index_files(tmp_path)
+    transactions = run_incremental(backup, **files)
+    records = list(SMSTransactionParser(backup).iter_sms_records())
+
+    with RawSMSReader(backup, files['sms_index_file']) as reader:
+        assert len(reader) == len(records) == 30
+        assert [reader.record(ordinal) for ordinal in range(len(reader))] == records
+        for tx in transactions:
+            assert reader.record_for_transaction(tx['id'])['body'] == tx['message']
+            if tx['reference_number']:
+                assert reader.record_for_reference(tx['reference_number'])['body'] == tx['message']
+
+def test_index_not_written_unless_whole_backup_parsed(tmp_path, write_backup):
+    parser = SMSTransactionParser(write_backup(10))
+    records = parser.iter_sms_records()
+    parser.process_sms_to_transactions(record for _, record in zip(range(5), records))
+    index_file = str(tmp_path / 'sms_offsets.idx')
+
+    assert build_sms_index(parser, index_file) == 0
+    assert not os.path.exists(index_file)
+
+def test_truncated_backup_not_indexed(tmp_path, write_backup):
+    backup = write_backup(10)
+    with open(backup, 'r+', encoding='utf-8') as f:
+        text = f.read()
+        f.seek(0)
+        f.write(text[:-len(BACKUP_FOOTER) - 40])
+        f.truncate()
+    parser = SMSTransactionParser(backup)
+    parser.process_sms_to_transactions(parser.iter_sms_records())
+    index_file = str(tmp_path / 'sms_offsets.idx')
+
+    assert build_sms_index(parser, index_file) == 0
+    assert not os.path.exists(index_file)
+
+def test_processor_reopens_rebuilt_index(tmp_path, write_backup):
+    backup = write_backup([sms_element(0)])
+    files = index_files(tmp_path)
+    run_incremental(backup, **files)
+    processor = SMSDataProcessor(backup, DictTransactionStore())
+    processor.sms_index_file = files['sms_index_file']
+    first = processor.get_raw_sms(1)
+    assert first == next(SMSTransactionParser(backup).iter_sms_records())
+
+    # The ETL is rerun from scratch over a new backup
+    write_backup([sms_element(7), sms_element(0)])
+    os.remove(files['checkpoint_file'])
+    run_incremental(backup, **files)
+
+    rebuilt = processor.get_raw_sms(1)
+    assert rebuilt != first
+    assert rebuilt == next(SMSTransactionParser(backup).iter_sms_records())
@@ -0,0 +1,73 @@
+"""
+Tests for the in-memory and snapshot transaction stores
+"""
+
+import pytest
+from api.snapshot import SnapshotTransactionStore
+from api.store import CategoryColumn, ColumnarTransactionStore, DictTransactionStore
+
+TRANSACTIONS = [
+    {'id': 1, 'transaction_type': 'receive', 'amount': 2000.0, 'currency': 'RWF', 'sender': 'Jane Smith',
+     'receiver': 'Self', 'timestamp': '2024-05-10T16:30:58', 'status': 'completed',
+     'reference_number': '76662021700', 'balance': 2000.0, 'fee': 0.0, 'message': 'You have received 2000 RWF'},
+    # Integer amounts, as a client may have POSTed them
+    {'id': 2, 'transaction_type': 'payment', 'amount': 5, 'currency': 'RWF', 'sender': 'Self',
+     'receiver': 'Shop', 'balance': 1995, 'fee': 0},
+]
+
+@pytest.fixture(params=['dict', 'columnar', 'snapshot'])
+def store(request, tmp_path):
+    if request.param == 'dict':
+        yield DictTransactionStore([dict(tx) for tx in TRANSACTIONS])
+    elif request.param == 'columnar':
+        yield ColumnarTransactionStore([dict(tx) for tx in TRANSACTIONS])
+    else:
+        store = SnapshotTransactionStore(str(tmp_path / 'transactions.snapshot'))
+        store.load([dict(tx) for tx in TRANSACTIONS])
+        yield store
+        store.close()
+
+def same_types(a, b):
+    return a == b and {key: type(value) for key, value in a.items()} == {key: type(value) for key, value in b.items()}
+
+def test_loaded_numbers_keep_their_type(store):
+    for tx in TRANSACTIONS:
+        assert same_types(store.get(tx['id']), tx)
+
+def test_written_numbers_keep_their_type(store):
+    added = store.add({'transaction_type': 'payment', 'amount': 5, 'currency': 'RWF',
+                       'sender': 'a', 'receiver': 'b', 'fee': 1.0})
+    assert same_types(added, {'id': 3, 'transaction_type': 'payment', 'amount': 5, 'currency': 'RWF',
+                              'sender': 'a', 'receiver': 'b', 'fee': 1.0})
+    assert same_types(store.get(3), added)
+
+    assert same_types(store.update(1, {'amount': 7}), {**TRANSACTIONS[0], 'amount': 7})
+    assert same_types(store.update(2, {'amount': 7.0}), {**TRANSACTIONS[1], 'amount': 7.0})
+    assert same_types(store.get(1), {**TRANSACTIONS[0], 'amount': 7})
+
+def test_category_codes_past_16_bits():
+    column = CategoryColumn()
+    for n in range(70_000):
+        column.codes.append(column.code_for(f'status {n}'))
+
+    assert column.values[column.codes[-1]] == 'status 69999'
+
+def test_updates_reclaim_string_pool(monkeypatch):
+    monkeypatch.setattr(ColumnarTransactionStore, 'COMPACT_MIN_DEAD_BYTES', 10_000)
+    store = ColumnarTransactionStore([dict(tx) for tx in TRANSACTIONS])
+    message = 'x' * 1000
+
+    for n in range(100):
+        store.update(1, {'message': f'{n:04d}{message}'})
+
+    assert store._strings.dead_bytes <= store._strings.live_bytes + 10_000
+    assert store.nbytes < 30_000
+    assert store.get(1) == {**TRANSACTIONS[0], 'message': f'0099{message}'}
+    assert store.get(2) == TRANSACTIONS[1]
+
+def test_string_pool_bytes_of_deleted_rows_count_as_dead():
+    store = ColumnarTransactionStore([dict(tx) for tx in TRANSACTIONS])
+
+    store.delete(1)
+
+    assert store._strings.dead_bytes == len(TRANSACTIONS[0]['message']) + len(TRANSACTIONS[0]['reference_number'])